@@ -16,6 +16,7 @@ from datetime import datetime
 from app.database.manager import get_db
 from app.services.botconversa_service import BotconversaService
 from app.database.models import Atendimento, StatusConfirmacao
+from app.utils.executor import executar_bloqueante
 
 router = APIRouter(prefix="/test", tags=["Teste Botconversa"])
 
@@ -30,7 +31,7 @@ async def testar_conexao(db: Session = Depends(get_db)) -> Dict[str, Any]:
     """
     try:
         service = BotconversaService(db)
-        resultado = service.testar_conexao()
+        resultado = await executar_bloqueante("api", service.testar_conexao)
         return resultado
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao testar conexão: {str(e)}")
@@ -53,7 +54,7 @@ async def criar_subscriber(
     """
     try:
         service = BotconversaService(db)
-        subscriber = service.criar_subscriber(telefone, nome, sobrenome)
+        subscriber = await executar_bloqueante("api", service.criar_subscriber, telefone, nome, sobrenome)
 
         if subscriber:
             return {
@@ -85,7 +86,7 @@ async def buscar_subscriber(
     """
     try:
         service = BotconversaService(db)
-        subscriber = service.buscar_subscriber(telefone)
+        subscriber = await executar_bloqueante("api", service.buscar_subscriber, telefone)
 
         if subscriber:
             return {
@@ -121,7 +122,7 @@ async def criar_atendimento(
     """
     try:
         service = BotconversaService(db)
-        atendimento = service.criar_atendimento(dados)
+        atendimento = await executar_bloqueante("api", service.criar_atendimento, dados)
 
         if atendimento:
             return {
@@ -160,7 +161,7 @@ async def listar_atendimentos_pendentes(
     """
     try:
         service = BotconversaService(db)
-        atendimentos = service.listar_atendimentos_pendentes()
+        atendimentos = await executar_bloqueante("api", service.listar_atendimentos_pendentes)
 
         return {
             "success": True,
@@ -202,7 +203,7 @@ async def buscar_atendimento_por_telefone(
     """
     try:
         service = BotconversaService(db)
-        atendimento = service.buscar_atendimento_por_telefone(telefone)
+        atendimento = await executar_bloqueante("api", service.buscar_atendimento_por_telefone, telefone)
 
         if atendimento:
             return {
@@ -252,7 +253,7 @@ async def atualizar_status_atendimento(
     """
     try:
         service = BotconversaService(db)
-        success = service.atualizar_status_atendimento(atendimento_id, status)
+        success = await executar_bloqueante("api", service.atualizar_status_atendimento, atendimento_id, status)
 
         if success:
             return {
@@ -282,7 +283,7 @@ async def listar_campanhas(db: Session = Depends(get_db)) -> Dict[str, Any]:
     """
     try:
         service = BotconversaService(db)
-        campanhas = service.listar_campanhas()
+        campanhas = await executar_bloqueante("api", service.listar_campanhas)
 
         if campanhas is not None:
             return {
@@ -309,7 +310,7 @@ async def listar_fluxos(db: Session = Depends(get_db)) -> Dict[str, Any]:
     """
     try:
         service = BotconversaService(db)
-        fluxos = service.listar_fluxos()
+        fluxos = await executar_bloqueante("api", service.listar_fluxos)
 
         if fluxos is not None:
             return {
@@ -340,7 +341,7 @@ async def adicionar_subscriber_campanha(
     """
     try:
         service = BotconversaService(db)
-        sucesso = service.adicionar_subscriber_campanha(subscriber_id, campaign_id)
+        sucesso = await executar_bloqueante("api", service.adicionar_subscriber_campanha, subscriber_id, campaign_id)
 
         if sucesso:
             return {
@@ -374,7 +375,7 @@ async def enviar_fluxo(
     """
     try:
         service = BotconversaService(db)
-        sucesso = service.enviar_fluxo(subscriber_id, flow_id)
+        sucesso = await executar_bloqueante("api", service.enviar_fluxo, subscriber_id, flow_id)
 
         if sucesso:
             return {
@@ -408,7 +409,7 @@ async def executar_workflow_consulta(
     """
     try:
         service = BotconversaService(db)
-        resultado = service.executar_workflow_consulta(atendimento_id)
+        resultado = await executar_bloqueante("api", service.executar_workflow_consulta, atendimento_id)
 
         if resultado.get("success"):
             return {
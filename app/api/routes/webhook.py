@@ -7,16 +7,24 @@ enviados pelo Botconversa quando pacientes respondem às mensagens.
 
 import hmac
 import json
+from datetime import datetime
 from typing import Any, Dict
 
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
 from loguru import logger
 from sqlalchemy.orm import Session
 
 from app.config.config import settings
 from app.database.manager import get_db
 from app.schemas.schemas import BotconversaWebhook
-from app.services.webhook_service import WebhookService
+from app.services.webhook_inbox_service import (
+    chave_ordem_webhook,
+    pool_webhook,
+    registrar_webhook,
+)
+from app.services.webhook_service import processar_payload_webhook
+from app.utils.executor import executar_bloqueante
 
 router = APIRouter(prefix="/webhook", tags=["webhook"])
 
@@ -47,9 +55,13 @@ async def botconversa_webhook(
 
     Este endpoint detecta automaticamente se são dados do N8N ou webhook tradicional
     e processa adequadamente cada tipo de dados.
+
+    Com WEBHOOK_INBOX_HABILITADA, só valida a assinatura e o JSON, grava o payload
+    na inbox SQLite e responde 202; o processamento fica com os workers da inbox.
     """
     try:
         logger.info("=== INÍCIO DO PROCESSAMENTO DO WEBHOOK ===")
+        recebido_em = datetime.now()
 
         # Lê o corpo bruto (necessário para validar assinatura e depois parsear JSON)
         body = await request.body()
@@ -75,71 +87,52 @@ async def botconversa_webhook(
                 raise HTTPException(status_code=400, detail="Body JSON inválido")
         logger.info(f"Webhook recebido: {webhook_data}")
 
-        # Cria instância do serviço
-        logger.info("Criando instância do WebhookService...")
-        webhook_service = WebhookService(db)
-        logger.info("WebhookService criado com sucesso")
-
-        # Detecta automaticamente se são dados do N8N
-        # Dados do N8N têm: telefone, subscriber_id, resposta
-        logger.info("Verificando tipo de dados...")
-        if all(
-            key in webhook_data for key in ["telefone", "subscriber_id", "resposta"]
-        ):
-            logger.info(
-                "Detectados dados do N8N - processando com processar_n8n_webhook"
+        # ACK rápido: persiste na inbox e deixa o processamento para os workers
+        if settings.webhook_inbox_habilitada:
+            inbox_id = await executar_bloqueante(
+                "webhook",
+                registrar_webhook,
+                body.decode("utf-8") if body else "{}",
+                chave_ordem_webhook(webhook_data),
             )
-            resultado = webhook_service.processar_n8n_webhook(webhook_data)
-            logger.info(f"Resultado do processar_n8n_webhook: {resultado}")
-        else:
-            logger.info(
-                "Dados tradicionais de webhook - processando com processar_webhook"
+            pool_webhook.notificar()
+            logger.info(f"Webhook {inbox_id} gravado na inbox para processamento")
+            return JSONResponse(
+                status_code=202,
+                content={
+                    "success": True,
+                    "message": "Webhook recebido para processamento",
+                    "inbox_id": inbox_id,
+                },
             )
-            resultado = webhook_service.processar_webhook(webhook_data)
-            logger.info(f"Resultado do processar_webhook: {resultado}")
 
-        logger.info("Verificando resultado...")
-        logger.info(f"Resultado completo: {resultado}")
-        logger.info(f"Tipo do resultado: {type(resultado)}")
-        logger.info(f"Resultado.get('success'): {resultado.get('success')}")
-        
-        if resultado and resultado.get("success"):
+        # Trabalho síncrono no banco fora do event loop (executor dedicado ao webhook)
+        resultado = await executar_bloqueante(
+            "webhook", processar_payload_webhook, db, webhook_data, recebido_em
+        )
+
+        if resultado.get("success"):
             logger.info(f"Webhook processado com sucesso: {resultado}")
-            
-            # Força o commit final para garantir que não haja rollback
-            try:
-                db.commit()
-                logger.info("Commit final realizado com sucesso no webhook!")
-            except Exception as commit_error:
-                logger.error(f"Erro no commit final: {str(commit_error)}")
-                db.rollback()
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Erro ao finalizar processamento: {str(commit_error)}",
-                )
-            
             return {
                 "success": True,
                 "message": "Webhook processado com sucesso",
                 "data": resultado,
             }
+        elif resultado.get("em_processamento"):
+            # Mesma entrega ainda em processamento: o provedor deve reenviar depois
+            logger.info(f"Webhook duplicado em processamento: {resultado}")
+            return JSONResponse(status_code=409, content=resultado)
         else:
-            error_msg = resultado.get('error', 'Erro desconhecido') if resultado else 'Resultado vazio ou None'
+            error_msg = resultado.get("error", "Erro desconhecido")
             logger.error(f"Erro ao processar webhook: {resultado}")
             logger.error(f"Mensagem de erro: {error_msg}")
-            
-            # Rollback em caso de erro
-            try:
-                db.rollback()
-                logger.info("Rollback realizado devido a erro no processamento")
-            except Exception as rollback_error:
-                logger.error(f"Erro no rollback: {str(rollback_error)}")
-            
             raise HTTPException(
                 status_code=400,
                 detail=f"Erro ao processar webhook: {error_msg}",
             )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao processar webhook: {str(e)}")
         logger.error(f"Tipo do erro: {type(e).__name__}")
@@ -166,4 +159,5 @@ async def webhook_health() -> Dict[str, Any]:
         "success": True,
         "message": "Webhook endpoint está funcionando",
         "status": "healthy",
+        "inbox": pool_webhook.snapshot() if settings.webhook_inbox_habilitada else None,
     }
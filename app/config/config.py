@@ -32,7 +32,7 @@ class Settings(BaseSettings):
         hospital_name: Nome do hospital (opcional - para identificação e logs)
         debug: Modo debug da aplicação (padrão: False)
         log_level: Nível de log (padrão: INFO)
-        max_workers: Número máximo de workers (padrão: 4) - para futuras funcionalidades de processamento assíncrono
+        max_workers: Número máximo de workers (padrão: 4) - workflows de novos atendimentos executados em paralelo
         worker_timeout: Timeout dos workers em segundos (padrão: 30)
         reminder_interval: Intervalo de lembretes em horas (padrão: 24)
         confirmation_window_hours: Janela de confirmação em horas (padrão: 72)
@@ -44,6 +44,14 @@ class Settings(BaseSettings):
 
     # Oracle specific configuration
     oracle_url: Optional[str] = None
+    oracle_client_lib_dir: Optional[str] = None  # Instant Client (modo thick); vazio = ambiente / modo thin
+    oracle_stmtcachesize: int = 50  # Statements em cache por conexão (view e UPDATE sem novo parse)
+    # Pool nativo do python-oracledb (no lugar do pool do SQLAlchemy)
+    oracle_pool_nativo: bool = False
+    oracle_pool_min: int = 2  # Sessões abertas na criação do pool
+    oracle_pool_max: int = 10  # Limite de sessões
+    oracle_pool_incremento: int = 1  # Sessões abertas de cada vez quando o pool cresce
+    oracle_drcp_classe: Optional[str] = None  # Connection class DRCP; vazio = sem DRCP
 
     # PostgreSQL specific configuration
     postgresql_url: Optional[str] = None
@@ -51,11 +59,37 @@ class Settings(BaseSettings):
     # Firebird specific configuration
     firebird_url: Optional[str] = None
 
+    # Pool de conexões do banco principal
+    db_pool_size: int = 10  # Conexões mantidas abertas
+    db_pool_max_overflow: int = 10  # Conexões extras em picos (fechadas ao devolver)
+    db_pool_timeout: int = 30  # Segundos aguardando conexão livre antes de erro
+    db_pool_recycle: int = 3600  # Recria conexões mais velhas que isso (segundos)
+    db_pool_lifo: bool = True  # Reusa a conexão devolvida por último (as demais podem expirar)
+    db_pool_ping_ociosa_segundos: int = 60  # Valida só conexões ociosas há mais que isso (-1 = nunca)
+    db_pool_aquecer: bool = True  # Abre as db_pool_size conexões no startup
+    # Engine assíncrono (AsyncSession) além do síncrono: PostgreSQL (asyncpg) e Oracle (oracledb async).
+    # Usado na leitura da view do job 48h; mesmo dimensionamento/validação do pool síncrono (db_pool_*)
+    database_async_habilitado: bool = False
+    database_async_url: Optional[str] = None  # Vazio = URL do banco com o driver async correspondente
+
     # Botconversa API Configuration
     botconversa_api_url: str = "https://backend.botconversa.com.br/api/v1/webhook"
     botconversa_webhook_secret: Optional[str] = None
     botconversa_api_key: Optional[str] = None
 
+    # Botconversa HTTP - pool de conexões keep-alive compartilhado pelo processo
+    botconversa_http_pool_connections: int = 4  # Nº de hosts com pool próprio
+    botconversa_http_pool_maxsize: int = 20  # Conexões mantidas abertas por host
+    botconversa_http_pool_block: bool = False  # Se True, aguarda conexão livre em vez de abrir extra
+    botconversa_http_keepalive: bool = True  # TCP keep-alive nas conexões ociosas
+    botconversa_http_keepalive_idle: int = 60  # Segundos ociosos antes do primeiro probe
+
+    # Botconversa - limite de taxa (token bucket adaptativo, compartilhado pelo processo)
+    botconversa_rate_limit_rps: float = 10.0  # Teto de requisições por segundo
+    botconversa_rate_limit_burst: int = 20  # Rajada máxima acima da taxa
+    botconversa_rate_limit_min_rps: float = 1.0  # Piso da taxa após 429/503 seguidos
+    botconversa_rate_limit_max_retries: int = 3  # Repetições de uma requisição que recebeu 429/503
+
     # Application Configuration
     app_secret_key: Optional[str] = None
     hospital_name: Optional[str] = None
@@ -64,13 +98,19 @@ class Settings(BaseSettings):
 
     # Hospital Information (para mensagens personalizadas)
     hospital_phone: Optional[str] = None
+    hospital_phone_padrao: str = "(31) 3238-8100"  # Usado nas mensagens quando hospital_phone está vazio
     hospital_address: Optional[str] = None
     hospital_city: Optional[str] = None
     hospital_state: Optional[str] = None
 
     # Performance settings Configuration
-    max_workers: int = 4
+    max_workers: int = 4  # Threads do job de novos atendimentos (1 = em série)
     worker_timeout: int = 30
+    # Threads dos executores que rodam código bloqueante (SQLAlchemy/requests) das rotas async
+    executor_webhook_workers: int = 10  # Rota do webhook (não compete com as rotas de teste)
+    executor_api_workers: int = 4  # Rotas /test
+    # Atendimentos por página nos jobs do scheduler (paginação keyset por data_consulta, id)
+    atendimentos_pagina: int = 200
 
     # Webhook Configuration
     webhook_host: str = "0.0.0.0"  # Host para aceitar conexões externas
@@ -78,6 +118,14 @@ class Settings(BaseSettings):
     webhook_url: Optional[str] = None  # URL pública do webhook
     # Header com assinatura do webhook (opcional). Se BOTCONVERSA_WEBHOOK_SECRET estiver setado e o header vier na requisição, validamos.
     webhook_signature_header: str = "X-Webhook-Signature"
+    # ACK rápido: grava o payload na inbox SQLite, responde 202 e processa em workers
+    webhook_inbox_habilitada: bool = False
+    webhook_inbox_workers: int = 2  # Threads processando a inbox
+    webhook_inbox_max_tentativas: int = 5  # Depois disso o webhook fica FALHOU
+    webhook_inbox_visibilidade_segundos: int = 120  # Webhook reservado volta à inbox se o worker não concluir
+    # Idempotência: reentregas do mesmo webhook (mesmo id de mensagem/entrega do provedor) devolvem o resultado gravado
+    webhook_idempotencia_habilitada: bool = True
+    webhook_idempotencia_ttl_horas: int = 24  # Por quanto tempo um webhook processado é lembrado
 
     # Scheduler Configuration
     reminder_interval: int = 24
@@ -97,15 +145,58 @@ class Settings(BaseSettings):
     # SQLite (controle "já enviado" para lembretes 48h/12h)
     sqlite_url: str = "sqlite:///./data/envios_lembrete.db"
 
+    # SQLite - PRAGMAs aplicados em cada conexão (vazio/0 = manter o padrão do SQLite)
+    sqlite_journal_mode: str = "WAL"  # WAL: leitores (webhook) não bloqueiam com escritor (scheduler)
+    sqlite_synchronous: str = "NORMAL"  # NORMAL em WAL: sem fsync a cada commit
+    sqlite_mmap_size: int = 268435456  # Bytes mapeados em memória (256 MB)
+    sqlite_cache_size: int = -65536  # Negativo = KiB (64 MB); positivo = nº de páginas
+    sqlite_busy_timeout_ms: int = 5000  # Espera por lock antes de "database is locked"
+    sqlite_temp_store: str = "MEMORY"  # Tabelas/índices temporários em memória
+
+    # Registro dos envios de lembrete em lote (write-behind): grava a cada N registros ou T ms
+    sqlite_write_lote: int = 200
+    sqlite_write_intervalo_ms: int = 500
+
     # View de confirmação (banco principal - Oracle)
     view_confirmacao_nome: str = "TASY.AVA_CONFIRMACAO_CONSULTA"
 
     # Tabela agenda_consulta no banco principal (para UPDATE de confirmação)
     tabela_agenda_consulta: str = "TASY.AGENDA_CONSULTA"
+    # UPDATE de confirmação em lote: agrupa respostas e grava a cada N respostas ou T ms (webhook espera o commit)
+    agenda_confirmacao_lote_habilitado: bool = False
+    agenda_confirmacao_lote: int = 200
+    agenda_confirmacao_intervalo_ms: int = 500
 
     # Intervalo (minutos) para consultar a view e processar lembretes 48h/12h
     view_poll_interval_minutes: int = 5
 
+    # Leitura da view em streaming: linhas buscadas por lote (yield_per / arraysize do cursor)
+    view_fetch_lote: int = 500
+    # Colunas projetadas no SELECT (separadas por vírgula; todas devem existir na view);
+    # vazio = colunas do schema que a view tem (lidas uma vez por processo)
+    view_colunas: Optional[str] = None
+
+    # Poll incremental da view: janela 36–50h no SQL (bind) + high-watermark persistido no SQLite
+    view_poll_modo_incremental: bool = False
+    view_coluna_data: str = "DT_AGENDA"  # Coluna (ou expressão) da data usada na janela
+    view_coluna_atualizacao: Optional[str] = None  # Ex.: DT_ATUALIZACAO (detecta linhas alteradas)
+    view_resync_completo_minutos: int = 60  # Releitura completa da janela a cada N minutos
+
+    # Nº de pacientes processados em paralelo nos envios de lembrete 48h/12h
+    lembretes_concorrencia: int = 10
+
+    # Fila persistente de envios (SQLite): jobs enfileiram, workers enviam com retry
+    fila_envio_habilitada: bool = False
+    fila_envio_workers: int = 4  # Threads consumindo a fila
+    fila_envio_max_tentativas: int = 5  # Depois disso o item fica FALHOU
+    fila_envio_visibilidade_segundos: int = 120  # Item reservado volta à fila se o worker não concluir
+    fila_envio_intervalo_ocioso_segundos: float = 2.0  # Espera do worker com a fila vazia
+
+    # Cache SQLite telefone → subscriber_id (evita GET get_by_phone a cada lembrete)
+    subscriber_cache_habilitado: bool = True
+    subscriber_cache_ttl_horas: int = 720  # Validade de cada entrada (30 dias)
+    subscriber_cache_max_itens: int = 50000  # Acima disso, remove os menos usados (LRU)
+
     # Se False, não cria tabelas da app (atendimentos, etc.) no startup - uso apenas view + agenda_consulta
     create_app_tables: bool = True
 
@@ -0,0 +1,146 @@
+"""
+Operações de fila persistente sobre tabelas do SQLite.
+
+Usadas pelas filas com o mesmo layout de controle (FilaEnvio, WebhookInbox):
+status, tentativas, visivel_em, reservado_por, ultimo_erro e atualizado_em.
+
+- reservar_proximo(): reserva atomicamente o próximo item visível (PENDENTE ou
+  PROCESSANDO com reserva expirada) e o empurra para agora + visibilidade.
+  Com `coluna_ordem`, um item só é reservável quando não há item anterior com
+  a mesma chave ainda pendente/em processamento (FIFO por chave entre workers).
+- finalizar(): atualiza o item só se a reserva ainda for do mesmo worker.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, delete, exists, func, or_, select, update
+from sqlalchemy.orm import aliased
+
+from app.database.sqlite_envios import get_sqlite_session
+
+PENDENTE = "PENDENTE"
+PROCESSANDO = "PROCESSANDO"
+FALHOU = "FALHOU"
+
+
+def espera_retentativa(tentativas: int) -> timedelta:
+    """Espera antes de tentar de novo um item que falhou (15s, 30s, 60s, ... até 15 min)."""
+    return timedelta(seconds=min(15 * 2 ** max(tentativas - 1, 0), 900))
+
+
+def reservar_proximo(
+    modelo, visibilidade_segundos: int, coluna_ordem: Optional[str] = None
+) -> Optional[Any]:
+    """
+    Reserva o próximo item visível de `modelo`.
+
+    Com `coluna_ordem`, itens com a mesma chave nessa coluna são entregues um por
+    vez e em ordem de id (itens com a chave nula não têm restrição).
+
+    Retorna o item desanexado da sessão, ou None se não houver nada a processar.
+    """
+    agora = datetime.utcnow()
+    token = uuid.uuid4().hex
+    condicoes = [
+        modelo.status.in_((PENDENTE, PROCESSANDO)),
+        modelo.visivel_em <= agora,
+    ]
+    if coluna_ordem:
+        anterior = aliased(modelo)
+        chave = getattr(modelo, coluna_ordem)
+        condicoes.append(
+            or_(
+                chave.is_(None),
+                ~exists().where(
+                    and_(
+                        getattr(anterior, coluna_ordem) == chave,
+                        anterior.id < modelo.id,
+                        anterior.status.in_((PENDENTE, PROCESSANDO)),
+                    )
+                ),
+            )
+        )
+    proximo = (
+        select(modelo.id)
+        .where(*condicoes)
+        .order_by(modelo.visivel_em)
+        .limit(1)
+        .scalar_subquery()
+    )
+    session = get_sqlite_session()
+    try:
+        result = session.execute(
+            update(modelo)
+            .where(modelo.id == proximo)
+            .values(
+                status=PROCESSANDO,
+                reservado_por=token,
+                tentativas=modelo.tentativas + 1,
+                visivel_em=agora + timedelta(seconds=visibilidade_segundos),
+                atualizado_em=agora,
+            )
+        )
+        session.commit()
+        if not result.rowcount:
+            return None
+        item = session.execute(
+            select(modelo).where(modelo.reservado_por == token)
+        ).scalar_one_or_none()
+        if item is not None:
+            session.expunge(item)
+        return item
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def finalizar(modelo, item, **valores) -> None:
+    """Atualiza o item se a reserva ainda for deste worker."""
+    session = get_sqlite_session()
+    try:
+        session.execute(
+            update(modelo)
+            .where(modelo.id == item.id, modelo.reservado_por == item.reservado_por)
+            .values(atualizado_em=datetime.utcnow(), **valores)
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def limpar_concluidos(modelo, status: str, retencao: timedelta) -> int:
+    """Remove itens em `status` atualizados há mais que `retencao`. Retorna quantos."""
+    session = get_sqlite_session()
+    try:
+        result = session.execute(
+            delete(modelo).where(
+                modelo.status == status,
+                modelo.atualizado_em < datetime.utcnow() - retencao,
+            )
+        )
+        session.commit()
+        return result.rowcount or 0
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def contar_por_status(modelo) -> Dict[str, int]:
+    """Quantidade de itens da fila por status."""
+    session = get_sqlite_session()
+    try:
+        rows = session.execute(
+            select(modelo.status, func.count()).group_by(modelo.status)
+        ).all()
+        return {status: total for status, total in rows}
+    finally:
+        session.close()
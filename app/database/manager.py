@@ -1,11 +1,27 @@
+import asyncio
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from typing import Optional, Union
-import os
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from typing import Awaitable, Optional, TypeVar, Union
 from loguru import logger
 
 from app.config.config import settings, DataBaseType
 from app.database.base import Base
+from app.database.oracle_pool import (
+    criar_pool_oracle,
+    inicializar_cliente_oracle,
+    metricas_pool_oracle,
+    registrar_cache_statements,
+)
+from app.database.pool import (
+    aquecer_pool,
+    metricas_pool,
+    opcoes_pool,
+    registrar_validacao_ociosas,
+)
 
 # Importa os modelos para que sejam registrados no Base.metadata
 from app.database.models import (
@@ -16,6 +32,8 @@ from app.database.models import (
     StatusConfirmacao,
 )
 
+T = TypeVar("T")
+
 # Variáveis globais para diferentes tipos de banco
 engine = None
 SessionLocal = None
@@ -28,6 +46,10 @@ class DatabaseManager:
         self.database_type = settings.database_type
         self.engine = None
         self.session_local = None
+        self.async_engine = None
+        self.async_session_local = None
+        self.async_loop = None  # Event loop dono das conexões do engine assíncrono
+        self.oracle_pool = None
 
     def initialize_database(self):
         """Inicializa a conexão com o banco de dados baseado no tipo configurado"""
@@ -45,19 +67,25 @@ class DatabaseManager:
     def _initialize_oracle(self):
         """Inicializa conexão com Oracle"""
         try:
-            import os
-            os.environ['ORACLE_HOME'] = '/opt/oracle/instantclient_21_13'
-            os.environ['LD_LIBRARY_PATH'] = '/opt/oracle/instantclient_21_13'
-            os.environ['PATH'] = '/opt/oracle/instantclient_21_13:' + os.environ.get('PATH', '')
-            
             database_url = settings.get_database_url
             if not database_url:
                 raise ValueError("Oracle URL não configurada")
 
-            # Configuração específica para Oracle
-            self.engine = create_engine(
-                database_url, pool_pre_ping=True, pool_recycle=3600, echo=settings.debug
-            )
+            # Instant Client só quando ORACLE_CLIENT_LIB_DIR estiver configurado
+            inicializar_cliente_oracle(database_url)
+
+            if settings.oracle_pool_nativo:
+                # Sessões vêm do pool do python-oracledb; o SQLAlchemy não mantém pool próprio
+                self.oracle_pool = criar_pool_oracle(database_url)
+                self.engine = create_engine(
+                    "oracle+oracledb://",
+                    creator=self.oracle_pool.acquire,
+                    poolclass=NullPool,
+                    echo=settings.debug,
+                )
+            else:
+                self.engine = self._criar_engine(database_url)
+                registrar_cache_statements(self.engine)
             self.session_local = sessionmaker(
                 autocommit=False, autoflush=False, bind=self.engine
             )
@@ -75,9 +103,7 @@ class DatabaseManager:
                 raise ValueError("PostgreSQL URL não configurada")
 
             # Configuração específica para PostgreSQL
-            self.engine = create_engine(
-                database_url, pool_pre_ping=True, pool_recycle=3600, echo=settings.debug
-            )
+            self.engine = self._criar_engine(database_url)
             self.session_local = sessionmaker(
                 autocommit=False, autoflush=False, bind=self.engine
             )
@@ -95,9 +121,7 @@ class DatabaseManager:
                 raise ValueError("Firebird URL não configurada")
 
             # Configuração específica para Firebird
-            self.engine = create_engine(
-                database_url, pool_pre_ping=True, pool_recycle=3600, echo=settings.debug
-            )
+            self.engine = self._criar_engine(database_url)
             self.session_local = sessionmaker(
                 autocommit=False, autoflush=False, bind=self.engine
             )
@@ -107,6 +131,72 @@ class DatabaseManager:
             logger.error(f"Erro ao inicializar Firebird: {str(e)}")
             raise
 
+    def _criar_engine(self, database_url: str):
+        """Cria o engine síncrono com o pool configurado (settings.db_pool_*)."""
+        engine = create_engine(database_url, echo=settings.debug, **opcoes_pool())
+        registrar_validacao_ociosas(engine)
+        return engine
+
+    def aquecer_pool(self) -> None:
+        """Abre as conexões do pool no startup (settings.db_pool_aquecer)."""
+        if not self.engine or not settings.db_pool_aquecer:
+            return
+        if self.oracle_pool is not None:
+            # O pool nativo já abre oracle_pool_min sessões ao ser criado
+            return
+        abertas = aquecer_pool(self.engine, settings.db_pool_size)
+        logger.info(f"Pool do banco aquecido: {abertas}/{settings.db_pool_size} conexões")
+
+    def metricas_pool(self) -> dict:
+        """Métricas do pool de conexões do engine síncrono."""
+        if self.oracle_pool is not None:
+            return {"pool_nativo_oracle": metricas_pool_oracle(self.oracle_pool)}
+        return metricas_pool(self.engine)
+
+    def fechar(self) -> None:
+        """Fecha o engine síncrono e o pool nativo Oracle (shutdown)."""
+        if self.engine is not None:
+            self.engine.dispose()
+        if self.oracle_pool is not None:
+            self.oracle_pool.close(force=True)
+            self.oracle_pool = None
+
+    def initialize_async_database(self):
+        """
+        Inicializa o engine assíncrono (AsyncSession) do banco configurado.
+
+        Suportado para PostgreSQL (asyncpg) e Oracle (python-oracledb em modo
+        async); Firebird não tem driver async no SQLAlchemy. O pool usa o mesmo
+        dimensionamento e a mesma validação de ociosas do engine síncrono.
+
+        Chamar no startup, dentro do event loop da aplicação: as conexões do pool
+        ficam presas a esse loop (threads de fora usam executar_no_loop_async).
+        """
+        try:
+            database_url = _url_async(settings.database_async_url or settings.get_database_url)
+            # Mesmas opções do pool síncrono; QueuePoolMetricas não serve para conexões async
+            opcoes = {**opcoes_pool(), "poolclass": AsyncAdaptedQueuePool}
+            self.async_engine = create_async_engine(database_url, echo=settings.debug, **opcoes)
+            registrar_validacao_ociosas(self.async_engine.sync_engine)
+            self.async_session_local = async_sessionmaker(
+                self.async_engine, autoflush=False, expire_on_commit=False
+            )
+            try:
+                self.async_loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.async_loop = None
+            logger.info(f"Engine assíncrono inicializado ({self.async_engine.dialect.driver})")
+
+        except Exception as e:
+            logger.error(f"Erro ao inicializar engine assíncrono: {str(e)}")
+            raise
+
+    def get_async_session(self) -> AsyncSession:
+        """Retorna uma sessão assíncrona do banco de dados"""
+        if not self.async_session_local:
+            raise RuntimeError("Sessão assíncrona não inicializada (DATABASE_ASYNC_HABILITADO)")
+        return self.async_session_local()
+
     def get_session(self):
         """Retorna uma sessão do banco de dados"""
         if self.database_type in [
@@ -131,12 +221,47 @@ class DatabaseManager:
         ]:
             if self.engine:
                 Base.metadata.create_all(bind=self.engine)
+                self._criar_indices_faltantes()
                 logger.info("Tabelas criadas com sucesso")
         else:
             raise ValueError(
                 f"Tipo de banco de dados não suportado: {self.database_type}"
             )
 
+    def _criar_indices_faltantes(self):
+        """
+        Cria índices declarados nos modelos que ainda não existem no banco.
+
+        create_all só cria os índices junto com tabelas novas; em tabelas que já
+        existiam os índices novos (ex.: compostos de Atendimento) são criados aqui.
+        """
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    index.create(bind=self.engine, checkfirst=True)
+                except Exception as e:
+                    # Ex.: Oracle recusa um índice com as mesmas colunas de outro já existente
+                    logger.warning(f"Índice {index.name} não criado em {table.name}: {str(e)}")
+
+
+def _url_async(database_url: Optional[str]) -> URL:
+    """Troca o driver síncrono da URL pelo async equivalente (asyncpg / oracledb_async)."""
+    if not database_url:
+        raise ValueError("URL do banco não configurada para o engine assíncrono")
+    url = make_url(database_url)
+    if url.get_backend_name() == "postgresql":
+        if url.get_driver_name() != "asyncpg":
+            url = url.set(drivername="postgresql+asyncpg")
+    elif url.get_backend_name() == "oracle":
+        if url.get_driver_name() != "oracledb_async":
+            url = url.set(drivername="oracle+oracledb_async")
+    else:
+        raise ValueError(
+            f"Engine assíncrono não suportado para {url.get_backend_name()} "
+            f"(use PostgreSQL ou Oracle)"
+        )
+    return url
+
 
 # Instância global do gerenciador de banco
 db_manager = DatabaseManager()
@@ -155,6 +280,10 @@ def initialize_database():
     ]:
         engine = db_manager.engine
         SessionLocal = db_manager.session_local
+        db_manager.aquecer_pool()
+
+    if settings.database_async_habilitado:
+        db_manager.initialize_async_database()
 
 
 def get_db():
@@ -178,6 +307,45 @@ def get_db():
         )
 
 
+async def get_async_db():
+    """Dependency para FastAPI - retorna sessão assíncrona do banco"""
+    async with db_manager.get_async_session() as db:
+        yield db
+
+
+def executar_no_loop_async(coro: Awaitable[T]) -> T:
+    """
+    Executa `coro` no event loop do engine assíncrono e espera o resultado.
+
+    Para código síncrono fora do loop (jobs do scheduler): a consulta roda no
+    loop da aplicação, junto com as demais, sem uma thread presa por query.
+    """
+    loop = db_manager.async_loop
+    if loop is None or loop.is_closed():
+        coro.close()
+        raise RuntimeError("Event loop do engine assíncrono indisponível")
+    try:
+        no_loop = asyncio.get_running_loop() is loop
+    except RuntimeError:
+        no_loop = False
+    if no_loop:
+        coro.close()
+        raise RuntimeError("executar_no_loop_async chamado de dentro do próprio event loop")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def fechar_database():
+    """Fecha as conexões do banco principal (shutdown)."""
+    db_manager.fechar()
+
+
+async def fechar_database_async():
+    """Fecha as conexões do engine assíncrono (shutdown)."""
+    if db_manager.async_engine is not None:
+        await db_manager.async_engine.dispose()
+        db_manager.async_loop = None
+
+
 def create_tables():
     """Cria as tabelas no banco de dados"""
     db_manager.create_tables()
@@ -6,6 +6,7 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -70,6 +71,14 @@ class Atendimento(Base):
     """
 
     __tablename__ = "ghas_tbl_pac_agendados"
+    __table_args__ = (
+        # Novos atendimentos: status = PENDENTE AND subscriber_id IS NULL AND data_consulta > now,
+        # paginado por (data_consulta, id); cobre o SELECT id, data_consulta do job
+        Index("ix_atend_status_sub_dt", "status_confirmacao", "subscriber_id", "data_consulta", "id"),
+        # Confirmações e lembretes: status = PENDENTE AND faixa de data_consulta,
+        # paginado por (data_consulta, id)
+        Index("ix_atend_status_dt", "status_confirmacao", "data_consulta", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
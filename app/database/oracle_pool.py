@@ -0,0 +1,112 @@
+"""
+Oracle: cliente (Instant Client) e pool nativo de sessões do python-oracledb.
+
+Com settings.oracle_pool_nativo o engine do SQLAlchemy não mantém pool próprio
+(NullPool): cada checkout pega uma sessão do oracledb.ConnectionPool
+(min/max/incremento, cache de statements por sessão e, opcionalmente, DRCP no
+servidor com connection class). O cache de statements evita novo parse do
+SELECT da view e do UPDATE de agenda_consulta a cada execução.
+"""
+
+from typing import Any, Dict, Optional
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+from app.config.config import settings
+
+
+def inicializar_cliente_oracle(database_url: Optional[str] = None) -> None:
+    """
+    Carrega o Instant Client de settings.oracle_client_lib_dir (modo thick).
+
+    Sem oracle_client_lib_dir nada é feito: cx_Oracle usa ORACLE_HOME /
+    LD_LIBRARY_PATH do ambiente (ex.: Dockerfile) e o python-oracledb roda em
+    modo thin, sem Instant Client.
+    """
+    lib_dir = settings.oracle_client_lib_dir
+    if not lib_dir:
+        return
+    driver = make_url(database_url).get_driver_name() if database_url else "oracledb"
+    if settings.oracle_pool_nativo or driver.startswith("oracledb"):
+        import oracledb as driver_oracle
+    else:
+        import cx_Oracle as driver_oracle
+    try:
+        driver_oracle.init_oracle_client(lib_dir=lib_dir)
+        logger.info(f"Oracle Instant Client carregado de {lib_dir}")
+    except Exception as e:
+        # Já inicializado no processo (init_oracle_client só pode ser chamado uma vez)
+        logger.warning(f"Oracle Instant Client não inicializado ({lib_dir}): {e}")
+
+
+def registrar_cache_statements(engine: Engine) -> None:
+    """
+    Ajusta o cache de statements do driver (cx_Oracle / oracledb) em cada conexão nova.
+
+    Usado com o pool do SQLAlchemy; no pool nativo o tamanho vai em create_pool.
+    """
+    tamanho = settings.oracle_stmtcachesize
+
+    @event.listens_for(engine, "connect")
+    def _definir_stmtcachesize(dbapi_connection, connection_record):
+        try:
+            dbapi_connection.stmtcachesize = tamanho
+        except Exception as e:
+            logger.warning(f"Não foi possível definir stmtcachesize={tamanho}: {e}")
+
+
+def _dsn(url) -> str:
+    """DSN host:porta/serviço a partir da URL (service_name na query ou SID no path)."""
+    import oracledb
+
+    port = url.port or 1521
+    service_name = url.query.get("service_name")
+    if service_name:
+        return oracledb.makedsn(url.host, port, service_name=service_name)
+    return oracledb.makedsn(url.host, port, sid=url.database)
+
+
+def criar_pool_oracle(database_url: str):
+    """Cria o oracledb.ConnectionPool configurado em settings.oracle_pool_*."""
+    import oracledb
+
+    url = make_url(database_url)
+    opcoes: Dict[str, Any] = {
+        "user": url.username,
+        "password": url.password,
+        "dsn": _dsn(url),
+        "min": settings.oracle_pool_min,
+        "max": settings.oracle_pool_max,
+        "increment": settings.oracle_pool_incremento,
+        "stmtcachesize": settings.oracle_stmtcachesize,
+        "getmode": oracledb.POOL_GETMODE_TIMEDWAIT,
+        "wait_timeout": settings.db_pool_timeout * 1000,
+        "ping_interval": settings.db_pool_ping_ociosa_segundos,
+    }
+    if settings.oracle_drcp_classe:
+        # DRCP: sessões servidoras compartilhadas no banco, reaproveitadas pela classe
+        opcoes.update(
+            server_type="pooled",
+            cclass=settings.oracle_drcp_classe,
+            purity=oracledb.PURITY_SELF,
+        )
+    pool = oracledb.create_pool(**opcoes)
+    logger.info(
+        f"Pool nativo Oracle criado: min={pool.min}, max={pool.max}, "
+        f"incremento={pool.increment}, stmtcache={pool.stmtcachesize}"
+        + (f", DRCP cclass={settings.oracle_drcp_classe}" if settings.oracle_drcp_classe else "")
+    )
+    return pool
+
+
+def metricas_pool_oracle(pool) -> Dict[str, Any]:
+    """Uso do pool nativo (sessões abertas/ocupadas)."""
+    return {
+        "abertas": pool.opened,
+        "ocupadas": pool.busy,
+        "min": pool.min,
+        "max": pool.max,
+        "stmtcachesize": pool.stmtcachesize,
+    }
@@ -0,0 +1,71 @@
+"""
+Paginação por keyset (seek) para processar backlogs sem carregar tudo com .all().
+
+Cada página é buscada com `WHERE (ordem, id) > (última ordem, último id)
+ORDER BY ordem, id LIMIT n`, então o custo por página não cresce com o backlog
+(ao contrário de OFFSET) e linhas alteradas durante o processamento (commit por
+linha) não deslocam as páginas seguintes. Os objetos de cada página são
+removidos da sessão (expunge) antes da próxima, mantendo o identity map pequeno.
+
+Uso:
+    query = db.query(Atendimento).filter(...)
+    for pagina in paginar_por_keyset(query, Atendimento.data_consulta, Atendimento.id):
+        for atendimento in pagina:
+            ...
+"""
+
+from typing import Any, Iterator, List
+
+from sqlalchemy import and_, inspect, or_
+from sqlalchemy.orm import Query
+
+
+def paginar_por_keyset(
+    query: Query,
+    coluna_ordem,
+    coluna_id,
+    tamanho_pagina: int = 200,
+) -> Iterator[List[Any]]:
+    """
+    Itera a query em páginas ordenadas por (coluna_ordem, coluna_id).
+
+    A query pode trazer entidades ou linhas com as duas colunas (ex.:
+    db.query(Atendimento.id, Atendimento.data_consulta)). coluna_ordem não pode
+    ser nula nas linhas filtradas e coluna_id deve ser única.
+
+    Yields:
+        Lista com as linhas de cada página (entidades são desanexadas da
+        sessão quando a próxima página é pedida)
+    """
+    tamanho_pagina = max(tamanho_pagina, 1)
+    session = query.session
+    ultimo = None
+    while True:
+        pagina_query = query
+        if ultimo is not None:
+            ordem, id_ = ultimo
+            pagina_query = pagina_query.filter(
+                or_(coluna_ordem > ordem, and_(coluna_ordem == ordem, coluna_id > id_))
+            )
+        pagina = (
+            pagina_query.order_by(coluna_ordem.asc(), coluna_id.asc())
+            .limit(tamanho_pagina)
+            .all()
+        )
+        if not pagina:
+            return
+        # Chave lida antes do processamento (commit por linha expira os atributos)
+        ultima_linha = pagina[-1]
+        ultimo = (
+            getattr(ultima_linha, coluna_ordem.key),
+            getattr(ultima_linha, coluna_id.key),
+        )
+
+        yield pagina
+
+        for linha in pagina:
+            estado = inspect(linha, raiseerr=False)  # None para linhas (Row) sem entidade
+            if estado is not None and estado.session is session:
+                session.expunge(linha)
+        if len(pagina) < tamanho_pagina:
+            return
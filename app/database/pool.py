@@ -0,0 +1,144 @@
+"""
+Pool de conexões do banco principal: dimensionamento, validação de ociosas,
+aquecimento e métricas.
+
+- QueuePoolMetricas: QueuePool que conta checkouts, espera por conexão livre,
+  conexões de overflow e timeouts.
+- Em vez de pool_pre_ping (um round trip a cada checkout), só valida a conexão
+  que ficou ociosa no pool por mais de settings.db_pool_ping_ociosa_segundos.
+- aquecer_pool() abre as conexões do pool no startup, para a primeira rajada
+  (ex.: webhooks da manhã) não pagar a latência de conexão com o Oracle.
+"""
+
+import threading
+import time
+from typing import Any, Dict
+
+from loguru import logger
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from app.config.config import settings
+
+
+class QueuePoolMetricas(QueuePool):
+    """QueuePool com contadores de uso (expostos em snapshot())."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metricas_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.conexoes_criadas = 0
+        self.validacoes = 0
+        self.invalidas = 0
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._metricas_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            with self._metricas_lock:
+                self.checkouts += 1
+                self.espera_total += espera
+                self.espera_max = max(self.espera_max, espera)
+
+    def _create_connection(self):
+        with self._metricas_lock:
+            self.conexoes_criadas += 1
+        return super()._create_connection()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._metricas_lock:
+            checkouts = self.checkouts
+            return {
+                "pool_size": self.size(),
+                "checked_in": self.checkedin(),
+                "checked_out": self.checkedout(),
+                "overflow": max(self.overflow(), 0),
+                "max_overflow": self._max_overflow,
+                "checkouts": checkouts,
+                "timeouts": self.timeouts,
+                "espera_media_ms": round(self.espera_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "espera_max_ms": round(self.espera_max * 1000, 3),
+                "conexoes_criadas": self.conexoes_criadas,
+                "validacoes": self.validacoes,
+                "invalidas": self.invalidas,
+            }
+
+
+def opcoes_pool() -> Dict[str, Any]:
+    """Argumentos de create_engine para o pool (settings.db_pool_*)."""
+    return {
+        "poolclass": QueuePoolMetricas,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_pool_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_use_lifo": settings.db_pool_lifo,
+        # Sem ping a cada checkout; ociosas são validadas em _validar_se_ociosa
+        "pool_pre_ping": False,
+    }
+
+
+def registrar_validacao_ociosas(engine: Engine) -> None:
+    """Valida (ping) só conexões que ficaram ociosas no pool além do limite."""
+    limite = settings.db_pool_ping_ociosa_segundos
+    if limite is None or limite < 0:
+        return
+
+    @event.listens_for(engine, "checkin")
+    def _marcar_devolucao(dbapi_connection, connection_record):
+        connection_record.info["devolvida_em"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _validar_se_ociosa(dbapi_connection, connection_record, connection_proxy):
+        devolvida_em = connection_record.info.get("devolvida_em")
+        if devolvida_em is None or time.monotonic() - devolvida_em < limite:
+            return
+        pool = engine.pool
+        if isinstance(pool, QueuePoolMetricas):
+            with pool._metricas_lock:
+                pool.validacoes += 1
+        try:
+            ok = engine.dialect.do_ping(dbapi_connection)
+        except Exception:
+            ok = False
+        if not ok:
+            if isinstance(pool, QueuePoolMetricas):
+                with pool._metricas_lock:
+                    pool.invalidas += 1
+            # O pool descarta a conexão e tenta outra
+            raise exc.DisconnectionError("Conexão ociosa não respondeu ao ping")
+
+
+def aquecer_pool(engine: Engine, conexoes: int) -> int:
+    """Abre `conexoes` conexões de uma vez e devolve ao pool. Retorna quantas abriram."""
+    abertas = []
+    try:
+        for _ in range(max(conexoes, 0)):
+            abertas.append(engine.connect())
+    except Exception as e:
+        logger.warning(f"Aquecimento do pool interrompido após {len(abertas)} conexões: {e}")
+    finally:
+        for conn in abertas:
+            conn.close()
+    return len(abertas)
+
+
+def metricas_pool(engine: Engine) -> Dict[str, Any]:
+    """Métricas do pool do engine (status textual se não for QueuePoolMetricas)."""
+    if engine is None:
+        return {"inicializado": False}
+    pool = engine.pool
+    if isinstance(pool, QueuePoolMetricas):
+        return pool.snapshot()
+    return {"status": pool.status()}
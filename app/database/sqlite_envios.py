@@ -7,7 +7,7 @@ Também serve de base para derivar a lista de 12h a partir do que foi enviado em
 
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Integer, String, Text, create_engine, text
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text, create_engine, event, text
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from app.config.config import settings
@@ -24,6 +24,12 @@ class EnvioLembrete(SqliteBase):
     """
 
     __tablename__ = "envios_lembrete"
+    __table_args__ = (
+        # Anti-join view × envios (tipo + nr_sequencia, limitado pela janela de dt_agenda)
+        Index("ix_envios_tipo_seq_dt", "tipo_lembrete", "nr_sequencia", "dt_agenda"),
+        # Resposta do webhook sem nr_sequencia: último envio sem resposta por telefone
+        Index("ix_envios_tel_resp_env", "nr_telefone_envio", "dt_resposta", "enviado_em"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     nr_sequencia = Column(Integer, nullable=False, index=True)
@@ -34,6 +40,7 @@ class EnvioLembrete(SqliteBase):
     # Dados guardados para montar mensagem 12h depois (e auditoria)
     dt_agenda = Column(DateTime, nullable=True)
     nr_telefone = Column(String(80), nullable=True)
+    nr_telefone_envio = Column(String(20), nullable=True)  # Só dígitos, com DDI (telefone_para_envio); "" = sem telefone válido
     nm_paciente = Column(String(255), nullable=True)
     nr_ddi = Column(String(3), nullable=True)
     nm_medico_externo = Column(String(60), nullable=True)
@@ -46,9 +53,172 @@ class EnvioLembrete(SqliteBase):
         pass
 
 
+class SubscriberCache(SqliteBase):
+    """
+    Cache telefone → subscriber_id do Botconversa.
+
+    Evita o GET get_by_phone a cada lembrete. Chave: telefone no padrão de envio
+    (só dígitos, com DDI). Expira por TTL (criado_em) e é podado por LRU (ultimo_acesso).
+    """
+
+    __tablename__ = "subscriber_cache"
+
+    telefone = Column(String(20), primary_key=True)
+    subscriber_id = Column(Integer, nullable=False, index=True)
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    ultimo_acesso = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class SubscriberCampoConhecido(SqliteBase):
+    """
+    Etiquetas, campos personalizados e campanhas já gravados em um subscriber.
+
+    Usado pelo enriquecimento do subscriber para pular chamadas cujo valor já
+    está aplicado no Botconversa. Chave: 'etiqueta:<id>', 'campo:<id>' ou 'campanha:<id>'.
+    """
+
+    __tablename__ = "subscriber_campos_conhecidos"
+
+    subscriber_id = Column(Integer, primary_key=True)
+    chave = Column(String(40), primary_key=True)
+    valor = Column(String(255), nullable=False)
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ViewWatermark(SqliteBase):
+    """
+    High-watermark do poll incremental da view de confirmação.
+
+    - ultimo_nr_sequencia / ultima_atualizacao: maiores valores já lidos.
+    - fim_janela: limite superior da janela (dt) consultada no último poll; linhas
+      com data acima dele entraram na janela depois e são lidas mesmo sem ser novas.
+    - ultimo_resync_completo: última releitura completa da janela.
+    """
+
+    __tablename__ = "view_watermark"
+
+    nome_view = Column(String(128), primary_key=True)
+    ultimo_nr_sequencia = Column(Integer, nullable=True)
+    ultima_atualizacao = Column(DateTime, nullable=True)
+    fim_janela = Column(DateTime, nullable=True)
+    ultimo_resync_completo = Column(DateTime, nullable=True)
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+def _pragmas_sqlite() -> list:
+    """PRAGMAs configurados (settings.sqlite_*), na ordem em que são aplicados."""
+    pragmas = []
+    # busy_timeout primeiro: a troca para WAL precisa de lock exclusivo
+    if settings.sqlite_busy_timeout_ms:
+        pragmas.append(("busy_timeout", int(settings.sqlite_busy_timeout_ms)))
+    if settings.sqlite_journal_mode:
+        pragmas.append(("journal_mode", settings.sqlite_journal_mode.upper()))
+    if settings.sqlite_synchronous:
+        pragmas.append(("synchronous", settings.sqlite_synchronous.upper()))
+    if settings.sqlite_mmap_size:
+        pragmas.append(("mmap_size", int(settings.sqlite_mmap_size)))
+    if settings.sqlite_cache_size:
+        pragmas.append(("cache_size", int(settings.sqlite_cache_size)))
+    if settings.sqlite_temp_store:
+        pragmas.append(("temp_store", settings.sqlite_temp_store.upper()))
+    return pragmas
+
+
+def _aplicar_pragmas(dbapi_connection, connection_record) -> None:
+    """Listener 'connect': aplica os PRAGMAs em cada conexão nova do pool."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for nome, valor in _pragmas_sqlite():
+            cursor.execute(f"PRAGMA {nome}={valor}")
+    finally:
+        cursor.close()
+
+
+class FilaEnvio(SqliteBase):
+    """
+    Fila persistente de envios ao Botconversa (produtores: jobs; consumidores: workers).
+
+    - chave: identifica o envio ('48H:<nr_sequencia>'); enfileirar de novo só
+      reabre o item se ele tiver FALHOU.
+    - status: PENDENTE → PROCESSANDO → ENVIADO (ou de volta a PENDENTE / FALHOU).
+    - visivel_em: o item só pode ser reservado a partir daqui; ao reservar, é
+      empurrado para agora + timeout de visibilidade (worker que morrer libera o item).
+    - dados: JSON com os campos para registrar o envio em envios_lembrete.
+    """
+
+    __tablename__ = "fila_envio"
+    __table_args__ = (Index("ix_fila_envio_status_visivel", "status", "visivel_em"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chave = Column(String(60), nullable=False, unique=True)
+    tipo_lembrete = Column(String(3), nullable=False)
+    nr_sequencia = Column(Integer, nullable=False)
+    cd_agenda = Column(Integer, nullable=True)
+    telefone = Column(String(20), nullable=False)
+    nome = Column(String(255), nullable=True)
+    mensagem = Column(Text, nullable=False)
+    dados = Column(Text, nullable=True)
+    status = Column(String(12), nullable=False, default="PENDENTE")
+    tentativas = Column(Integer, nullable=False, default=0)
+    visivel_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    reservado_por = Column(String(36), nullable=True)
+    ultimo_erro = Column(Text, nullable=True)
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class WebhookInbox(SqliteBase):
+    """
+    Inbox persistente dos webhooks recebidos (modo de ACK rápido).
+
+    O endpoint grava o payload bruto e responde 202; workers processam depois.
+    Mesmo controle de fila de FilaEnvio: PENDENTE → PROCESSANDO → PROCESSADO
+    (ou de volta a PENDENTE / FALHOU), com visivel_em como timeout de reserva.
+    Webhooks com a mesma chave_ordem (paciente) são processados um de cada vez,
+    na ordem de chegada.
+    """
+
+    __tablename__ = "webhook_inbox"
+    __table_args__ = (
+        Index("ix_webhook_inbox_status_visivel", "status", "visivel_em"),
+        Index("ix_webhook_inbox_chave_ordem", "chave_ordem", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    payload = Column(Text, nullable=False)  # Body bruto (JSON) como recebido
+    chave_ordem = Column(String(80), nullable=True)  # Telefone/subscriber: serializa webhooks do mesmo paciente
+    status = Column(String(12), nullable=False, default="PENDENTE")
+    tentativas = Column(Integer, nullable=False, default=0)
+    visivel_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    reservado_por = Column(String(36), nullable=True)
+    ultimo_erro = Column(Text, nullable=True)
+    resultado = Column(Text, nullable=True)  # JSON do resultado do processamento
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class WebhookIdempotencia(SqliteBase):
+    """
+    Webhooks já processados, para responder reentregas sem repetir o trabalho no banco.
+
+    - chave: 'msg:[<cd_agenda>:<nr_sequencia>:]<id da mensagem>'; webhooks sem
+      id do provedor não são registrados.
+    - resultado: JSON do resultado; NULL enquanto o webhook está em processamento.
+    - atualizado_em: início do processamento ou conclusão (base do TTL).
+    """
+
+    __tablename__ = "webhook_idempotencia"
+
+    chave = Column(String(80), primary_key=True)
+    resultado = Column(Text, nullable=True)
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
 # Engine e sessão SQLite (inicializados em init_sqlite)
 _sqlite_engine = None
 _sqlite_session_factory = None
+# PRAGMA user_version a partir da qual o backfill de nr_telefone_envio já foi feito
+_VERSAO_TELEFONE_ENVIO = 1
 
 
 def init_sqlite() -> None:
@@ -64,6 +234,7 @@ def init_sqlite() -> None:
         connect_args={"check_same_thread": False},
         echo=settings.debug,
     )
+    event.listen(_sqlite_engine, "connect", _aplicar_pragmas)
     SqliteBase.metadata.create_all(bind=_sqlite_engine)
     # Migração: adicionar coluna cd_agenda se a tabela já existia sem ela
     with _sqlite_engine.connect() as conn:
@@ -73,11 +244,47 @@ def init_sqlite() -> None:
         if r.scalar() is None:
             conn.execute(text("ALTER TABLE envios_lembrete ADD COLUMN cd_agenda INTEGER"))
             conn.commit()
+        r = conn.execute(
+            text("SELECT 1 FROM pragma_table_info('envios_lembrete') WHERE name = 'nr_telefone_envio'")
+        )
+        if r.scalar() is None:
+            conn.execute(text("ALTER TABLE envios_lembrete ADD COLUMN nr_telefone_envio VARCHAR(20)"))
+            conn.commit()
+        if conn.execute(text("PRAGMA user_version")).scalar() < _VERSAO_TELEFONE_ENVIO:
+            _preencher_telefone_envio(conn)
+    # Índices novos em tabelas que já existiam (create_all só cria índices de tabelas novas)
+    for index in EnvioLembrete.__table__.indexes:
+        index.create(bind=_sqlite_engine, checkfirst=True)
     _sqlite_session_factory = sessionmaker(
         autocommit=False, autoflush=False, bind=_sqlite_engine
     )
 
 
+def _preencher_telefone_envio(conn) -> None:
+    """
+    Backfill de nr_telefone_envio nos registros antigos.
+
+    Registros sem telefone válido recebem "" (mesmo valor gravado por _dados_envio),
+    nunca NULL. Ao final grava PRAGMA user_version na mesma transação: nas próximas
+    inicializações o backfill não roda (nem a varredura por NULL).
+    """
+    from app.utils.telefone import telefones_para_envio
+
+    rows = conn.execute(
+        text("SELECT id, nr_telefone, nr_ddi FROM envios_lembrete WHERE nr_telefone_envio IS NULL")
+    ).fetchall()
+    if rows:
+        conn.execute(
+            text("UPDATE envios_lembrete SET nr_telefone_envio = :tel WHERE id = :id"),
+            [
+                {"id": r[0], "tel": tel or ""}
+                for r, tel in zip(rows, telefones_para_envio([r[1] for r in rows], [r[2] for r in rows]))
+            ],
+        )
+    conn.execute(text(f"PRAGMA user_version = {_VERSAO_TELEFONE_ENVIO}"))
+    conn.commit()
+
+
 def get_sqlite_session():
     """Retorna uma sessão do SQLite (context manager ou generator)."""
     if _sqlite_session_factory is None:
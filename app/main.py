@@ -7,9 +7,21 @@ from fastapi.responses import JSONResponse
 from loguru import logger
 
 from app.config.config import settings
-from app.database.manager import create_tables, initialize_database
+from app.database.manager import (
+    create_tables,
+    fechar_database,
+    fechar_database_async,
+    initialize_database,
+)
 from app.database.sqlite_envios import init_sqlite
 from app.scheduler import iniciar_scheduler, parar_scheduler
+from app.services.botconversa_http import (
+    fechar_botconversa_http,
+    obter_metricas_pool_http,
+)
+from app.services.webhook_inbox_service import pool_webhook
+from app.utils.executor import fechar_executores, metricas_executores
+from app.utils.write_behind import fechar_buffers_write_behind
 
 # Configuração de logs
 logger.remove()
@@ -62,6 +74,10 @@ async def startup_event():
         except Exception as e:
             logger.warning(f"SQLite de envios não inicializado: {e}")
 
+        # Workers da inbox de webhooks (modo ACK rápido)
+        if settings.webhook_inbox_habilitada:
+            pool_webhook.iniciar()
+
         # Inicia o scheduler
         if iniciar_scheduler():
             logger.info("Scheduler iniciado com sucesso")
@@ -86,6 +102,25 @@ async def shutdown_event():
     else:
         logger.warning("Erro ao parar scheduler")
 
+    # Termina os webhooks em processamento (os pendentes ficam na inbox)
+    if settings.webhook_inbox_habilitada:
+        pool_webhook.parar()
+
+    # Aguarda as chamadas bloqueantes em andamento nas rotas
+    fechar_executores()
+
+    # Grava registros pendentes nos buffers write-behind (envios de lembrete)
+    fechar_buffers_write_behind()
+
+    # Fecha o engine assíncrono do banco (se habilitado)
+    await fechar_database_async()
+
+    # Fecha o pool do banco principal (inclui o pool nativo Oracle, se usado)
+    fechar_database()
+
+    # Libera as conexões keep-alive do Botconversa
+    fechar_botconversa_http()
+
 
 # Middleware para logging de requisições
 @app.middleware("http")
@@ -156,6 +191,26 @@ async def scheduler_status():
     return obter_status_scheduler()
 
 
+@app.get("/metrics/botconversa")
+async def botconversa_metrics():
+    """Endpoint com métricas do pool HTTP do Botconversa (acertos/falhas)"""
+    return obter_metricas_pool_http()
+
+
+@app.get("/metrics/database")
+async def database_metrics():
+    """Endpoint com métricas do pool de conexões do banco principal"""
+    from app.database.manager import db_manager
+
+    return db_manager.metricas_pool()
+
+
+@app.get("/metrics/executores")
+async def executores_metrics():
+    """Endpoint com métricas dos executores de código bloqueante (fila, espera, execução)"""
+    return metricas_executores()
+
+
 # Inclusão dos routers
 from app.api.routes.botconversa_test import router as botconversa_test_router
 from app.api.routes.webhook import router as webhook_router
@@ -54,6 +54,12 @@ class AppointmentScheduler:
                 # Adiciona os jobs básicos
                 self._adicionar_jobs_basicos()
 
+                # Workers da fila de envio (consomem o que os jobs de lembrete enfileiram)
+                if settings.fila_envio_habilitada:
+                    from app.services.fila_envio_service import pool_envio
+
+                    pool_envio.iniciar()
+
         except Exception as e:
             logger.error(f"Erro ao iniciar scheduler: {str(e)}")
             raise e
@@ -64,6 +70,10 @@ class AppointmentScheduler:
             if self.is_running:
                 self.scheduler.shutdown()
                 self.is_running = False
+                if settings.fila_envio_habilitada:
+                    from app.services.fila_envio_service import pool_envio
+
+                    pool_envio.parar()
                 logger.info("Scheduler parado com sucesso")
         except Exception as e:
             logger.error(f"Erro ao parar scheduler: {str(e)}")
@@ -139,6 +149,7 @@ class AppointmentScheduler:
 
             from app.database.manager import get_db
             from app.database.models import Atendimento, StatusConfirmacao
+            from app.database.paginacao import paginar_por_keyset
             from app.services.botconversa_service import BotconversaService
 
             # Obtém uma sessão do banco
@@ -152,50 +163,49 @@ class AppointmentScheduler:
                 )
 
                 # Busca consultas que estão a 72h de acontecer e ainda não foram enviadas
-                consultas_para_confirmar = (
-                    db.query(Atendimento)
-                    .filter(
-                        Atendimento.data_consulta > datetime.now(),  # Consulta no futuro
-                        Atendimento.data_consulta <= datetime.now() + timedelta(hours=settings.confirmation_window_hours),  # Dentro de 72h
-                        Atendimento.status_confirmacao == StatusConfirmacao.PENDENTE,
-                        Atendimento.subscriber_id.isnot(None),  # Tem subscriber no Botconversa
-                        Atendimento.mensagem_enviada.is_(None),  # Mensagem ainda não foi enviada
-                    )
-                    .order_by(Atendimento.data_consulta.asc())
-                    .all()
+                consultas_para_confirmar = db.query(Atendimento).filter(
+                    Atendimento.data_consulta > datetime.now(),  # Consulta no futuro
+                    Atendimento.data_consulta <= datetime.now() + timedelta(hours=settings.confirmation_window_hours),  # Dentro de 72h
+                    Atendimento.status_confirmacao == StatusConfirmacao.PENDENTE,
+                    Atendimento.subscriber_id.isnot(None),  # Tem subscriber no Botconversa
+                    Atendimento.mensagem_enviada.is_(None),  # Mensagem ainda não foi enviada
                 )
 
-                logger.info(
-                    f"Encontradas {len(consultas_para_confirmar)} consultas para confirmação"
-                )
+                # Processa as consultas página a página (keyset por data_consulta, id)
+                total = 0
+                for pagina in paginar_por_keyset(
+                    consultas_para_confirmar,
+                    Atendimento.data_consulta,
+                    Atendimento.id,
+                    settings.atendimentos_pagina,
+                ):
+                    for consulta in pagina:
+                        total += 1
+                        try:
+                            logger.info(
+                                f"Processando consulta {consulta.id} para {consulta.nome_paciente}"
+                            )
 
-                # Processa cada consulta
-                for consulta in consultas_para_confirmar:
-                    try:
-                        logger.info(
-                            f"Processando consulta {consulta.id} para {consulta.nome_paciente}"
-                        )
+                            # Envia mensagem de confirmação
+                            sucesso = botconversa_service.enviar_mensagem_consulta(consulta)
 
-                        # Envia mensagem de confirmação
-                        sucesso = botconversa_service.enviar_mensagem_consulta(consulta)
+                            if sucesso:
+                                logger.info(
+                                    f"Mensagem de confirmação enviada para {consulta.nome_paciente}"
+                                )
+                            else:
+                                logger.error(
+                                    f"Erro ao enviar mensagem para {consulta.nome_paciente}"
+                                )
 
-                        if sucesso:
-                            logger.info(
-                                f"Mensagem de confirmação enviada para {consulta.nome_paciente}"
-                            )
-                        else:
+                        except Exception as e:
                             logger.error(
-                                f"Erro ao enviar mensagem para {consulta.nome_paciente}"
+                                f"Erro ao processar consulta {consulta.id}: {str(e)}"
                             )
-
-                    except Exception as e:
-                        logger.error(
-                            f"Erro ao processar consulta {consulta.id}: {str(e)}"
-                        )
-                        continue
+                            continue
 
                 logger.info(
-                    f"Job de confirmações concluído: {len(consultas_para_confirmar)} consultas processadas"
+                    f"Job de confirmações concluído: {total} consultas processadas"
                 )
 
             finally:
@@ -226,6 +236,7 @@ class AppointmentScheduler:
 
             from app.database.manager import get_db
             from app.database.models import Atendimento, StatusConfirmacao
+            from app.database.paginacao import paginar_por_keyset
             from app.services.botconversa_service import BotconversaService
 
             # Obtém uma sessão do banco
@@ -239,61 +250,60 @@ class AppointmentScheduler:
                 lembrete_12h = agora + timedelta(hours=12)
 
                 # Busca consultas que precisam de lembretes
-                consultas_para_lembrete = (
-                    db.query(Atendimento)
-                    .filter(
-                        Atendimento.status_confirmacao == StatusConfirmacao.PENDENTE,
-                        Atendimento.subscriber_id.isnot(
-                            None
-                        ),  # Tem subscriber no Botconversa
-                        Atendimento.mensagem_enviada.isnot(
-                            None
-                        ),  # Mensagem inicial já foi enviada
-                        Atendimento.resposta_paciente.is_(
-                            None
-                        ),  # Paciente ainda não respondeu
-                    )
-                    .order_by(Atendimento.data_consulta.asc())
-                    .all()
+                consultas_para_lembrete = db.query(Atendimento).filter(
+                    Atendimento.status_confirmacao == StatusConfirmacao.PENDENTE,
+                    Atendimento.subscriber_id.isnot(
+                        None
+                    ),  # Tem subscriber no Botconversa
+                    Atendimento.mensagem_enviada.isnot(
+                        None
+                    ),  # Mensagem inicial já foi enviada
+                    Atendimento.resposta_paciente.is_(
+                        None
+                    ),  # Paciente ainda não respondeu
                 )
 
-                logger.info(
-                    f"Encontradas {len(consultas_para_lembrete)} consultas para lembretes"
-                )
-
-                # Processa cada consulta
-                for consulta in consultas_para_lembrete:
-                    try:
-                        # Verifica se está na janela de lembrete baseado na data da consulta
-                        tempo_ate_consulta = consulta.data_consulta - datetime.now()
+                # Processa as consultas página a página (keyset por data_consulta, id)
+                total = 0
+                for pagina in paginar_por_keyset(
+                    consultas_para_lembrete,
+                    Atendimento.data_consulta,
+                    Atendimento.id,
+                    settings.atendimentos_pagina,
+                ):
+                    for consulta in pagina:
+                        total += 1
+                        try:
+                            # Verifica se está na janela de lembrete baseado na data da consulta
+                            tempo_ate_consulta = consulta.data_consulta - datetime.now()
                         
-                        if tempo_ate_consulta <= timedelta(hours=48) and tempo_ate_consulta > timedelta(hours=12):
-                            # Lembrete 48h antes
-                            if self._pode_enviar_lembrete(consulta, "48h"):
-                                logger.info(f"Enviando lembrete 48h para {consulta.nome_paciente}")
-                                self._enviar_lembrete(botconversa_service, consulta, "48h", db)
-
-                        elif tempo_ate_consulta <= timedelta(hours=12) and tempo_ate_consulta > timedelta(hours=0):
-                            # Lembrete 12h antes
-                            if self._pode_enviar_lembrete(consulta, "12h"):
-                                logger.info(f"Enviando lembrete 12h para {consulta.nome_paciente}")
-                                self._enviar_lembrete(botconversa_service, consulta, "12h", db)
-
-                        elif consulta.data_consulta <= datetime.now():
-                            # Consulta passou sem confirmação
-                            logger.info(f"Marcando consulta {consulta.id} como SEM_RESPOSTA")
-                            consulta.status_confirmacao = StatusConfirmacao.SEM_RESPOSTA
-                            consulta.atualizado_em = datetime.now()
-                            db.commit()
-
-                    except Exception as e:
-                        logger.error(
-                            f"Erro ao processar lembrete para consulta {consulta.id}: {str(e)}"
-                        )
-                        continue
+                            if tempo_ate_consulta <= timedelta(hours=48) and tempo_ate_consulta > timedelta(hours=12):
+                                # Lembrete 48h antes
+                                if self._pode_enviar_lembrete(consulta, "48h"):
+                                    logger.info(f"Enviando lembrete 48h para {consulta.nome_paciente}")
+                                    self._enviar_lembrete(botconversa_service, consulta, "48h", db)
+
+                            elif tempo_ate_consulta <= timedelta(hours=12) and tempo_ate_consulta > timedelta(hours=0):
+                                # Lembrete 12h antes
+                                if self._pode_enviar_lembrete(consulta, "12h"):
+                                    logger.info(f"Enviando lembrete 12h para {consulta.nome_paciente}")
+                                    self._enviar_lembrete(botconversa_service, consulta, "12h", db)
+
+                            elif consulta.data_consulta <= datetime.now():
+                                # Consulta passou sem confirmação
+                                logger.info(f"Marcando consulta {consulta.id} como SEM_RESPOSTA")
+                                consulta.status_confirmacao = StatusConfirmacao.SEM_RESPOSTA
+                                consulta.atualizado_em = datetime.now()
+                                db.commit()
+
+                        except Exception as e:
+                            logger.error(
+                                f"Erro ao processar lembrete para consulta {consulta.id}: {str(e)}"
+                            )
+                            continue
 
                 logger.info(
-                    f"Job de lembretes concluído: {len(consultas_para_lembrete)} consultas processadas"
+                    f"Job de lembretes concluído: {total} consultas processadas"
                 )
 
             finally:
@@ -313,78 +323,110 @@ class AppointmentScheduler:
         Este job roda a cada x minutos (configurável via .env) e identifica atendimentos que:
         - Não têm subscriber_id (não foram processados pelo Botconversa)
         - Precisam do workflow completo executado
+
+        Os atendimentos são lidos em páginas (settings.atendimentos_pagina) e os
+        workflows de cada página rodam em paralelo em até settings.max_workers
+        threads, cada uma com sua própria sessão do banco (max_workers=1 processa em série).
         """
         try:
             logger.info("Executando job: monitorar novos atendimentos")
 
-            # Importa o serviço do Botconversa
+            from concurrent.futures import ThreadPoolExecutor
             from datetime import datetime
 
             from app.database.manager import get_db
             from app.database.models import Atendimento, StatusConfirmacao
-            from app.services.botconversa_service import BotconversaService
+            from app.database.paginacao import paginar_por_keyset
 
-            # Obtém uma sessão do banco
+            # Obtém uma sessão do banco (só para listar os IDs pendentes)
             db = next(get_db())
-            botconversa_service = BotconversaService(db)
-
             try:
                 # Busca atendimentos que não foram processados pelo Botconversa
-                novos_atendimentos = (
-                    db.query(Atendimento)
-                    .filter(
-                        Atendimento.subscriber_id.is_(None),  # Não tem subscriber_id
-                        Atendimento.status_confirmacao
-                        == StatusConfirmacao.PENDENTE,  # Status pendente
-                        Atendimento.data_consulta
-                        > datetime.now(),  # Consulta no futuro
-                    )
-                    .order_by(
-                        Atendimento.criado_em.asc()
-                    )  # Processa os mais antigos primeiro
-                    .all()
+                novos_atendimentos = db.query(
+                    Atendimento.id, Atendimento.data_consulta
+                ).filter(
+                    Atendimento.subscriber_id.is_(None),  # Não tem subscriber_id
+                    Atendimento.status_confirmacao
+                    == StatusConfirmacao.PENDENTE,  # Status pendente
+                    Atendimento.data_consulta
+                    > datetime.now(),  # Consulta no futuro
                 )
 
-                logger.info(
-                    f"Encontrados {len(novos_atendimentos)} novos atendimentos para processar"
-                )
-
-                # Processa cada novo atendimento
-                for atendimento in novos_atendimentos:
-                    try:
+                # Página a página (keyset por data_consulta, id: consultas mais próximas primeiro)
+                total = 0
+                sucessos = 0
+                with ThreadPoolExecutor(
+                    max_workers=max(1, settings.max_workers),
+                    thread_name_prefix="workflow",
+                ) as executor:
+                    for pagina in paginar_por_keyset(
+                        novos_atendimentos,
+                        Atendimento.data_consulta,
+                        Atendimento.id,
+                        settings.atendimentos_pagina,
+                    ):
+                        ids_atendimentos = [linha.id for linha in pagina]
                         logger.info(
-                            f"Processando novo atendimento {atendimento.id} para {atendimento.nome_paciente}"
+                            f"Processando {len(ids_atendimentos)} novos atendimentos "
+                            f"({settings.max_workers} workers)"
                         )
-
-                        # Executa o workflow completo
-                        sucesso = self._executar_workflow_completo(
-                            botconversa_service, atendimento, db
+                        total += len(ids_atendimentos)
+                        sucessos += sum(
+                            executor.map(self._processar_novo_atendimento, ids_atendimentos)
                         )
+            finally:
+                db.close()
 
-                        if sucesso:
-                            logger.info(
-                                f"Workflow completo executado com sucesso para {atendimento.nome_paciente}"
-                            )
-                        else:
-                            logger.error(
-                                f"Erro ao executar workflow para {atendimento.nome_paciente}"
-                            )
+            logger.info(
+                f"Job de monitoramento concluído: {sucessos}/{total} "
+                f"atendimentos processados com sucesso"
+            )
 
-                    except Exception as e:
-                        logger.error(
-                            f"Erro ao processar atendimento {atendimento.id}: {str(e)}"
-                        )
-                        continue
+        except Exception as e:
+            logger.error(f"Erro no job de monitoramento: {str(e)}")
 
+    def _processar_novo_atendimento(self, atendimento_id: int) -> bool:
+        """
+        Executa o workflow completo de um atendimento em uma sessão própria.
+
+        Roda nas threads do job de monitoramento: a sessão (e o BotconversaService
+        que a usa) não é compartilhada entre workers.
+        """
+        from app.database.manager import db_manager
+        from app.database.models import Atendimento
+        from app.services.botconversa_service import BotconversaService
+
+        db = db_manager.get_session()
+        try:
+            atendimento = db.get(Atendimento, atendimento_id)
+            if atendimento is None or atendimento.subscriber_id is not None:
+                # Removido ou já processado desde a listagem
+                return False
+
+            logger.info(
+                f"Processando novo atendimento {atendimento.id} para {atendimento.nome_paciente}"
+            )
+
+            # Executa o workflow completo
+            sucesso = self._executar_workflow_completo(
+                BotconversaService(db), atendimento, db
+            )
+
+            if sucesso:
                 logger.info(
-                    f"Job de monitoramento concluído: {len(novos_atendimentos)} atendimentos processados"
+                    f"Workflow completo executado com sucesso para {atendimento.nome_paciente}"
                 )
-
-            finally:
-                db.close()
+            else:
+                logger.error(
+                    f"Erro ao executar workflow para {atendimento.nome_paciente}"
+                )
+            return sucesso
 
         except Exception as e:
-            logger.error(f"Erro no job de monitoramento: {str(e)}")
+            logger.error(f"Erro ao processar atendimento {atendimento_id}: {str(e)}")
+            return False
+        finally:
+            db.close()
 
     def _executar_workflow_completo(self, botconversa_service, atendimento, db) -> bool:
         """
@@ -402,6 +444,14 @@ class AppointmentScheduler:
             from datetime import datetime
 
             from app.database.models import StatusConfirmacao
+            from app.services.subscriber_enriquecimento_service import (
+                CAMPANHA_CONFIRMACAO_CONSULTAS,
+                CAMPO_ID_TABELA,
+                CAMPO_NR_SEQ_AGENDA,
+                CAMPO_SUBSCRIBER_ID,
+                ETIQUETA_SUBSCRIBER_ID,
+                EnriquecimentoSubscriber,
+            )
 
             logger.info(f"Iniciando workflow completo para {atendimento.nome_paciente}")
 
@@ -423,7 +473,7 @@ class AppointmentScheduler:
             logger.info(f"👤 Nome completo: {nome} {sobrenome_completo}")
             
             subscriber_data = botconversa_service.criar_subscriber(
-                atendimento.telefone, nome, sobrenome_completo
+                atendimento.telefone, nome, sobrenome_completo, enriquecer=False
             )
 
             if not subscriber_data:
@@ -439,8 +489,6 @@ class AppointmentScheduler:
                 return False
 
             logger.info(f"Subscriber criado com ID: {subscriber_id}")
-            logger.info(f"🏷️ Etiqueta 'subscriber_id' adicionada automaticamente ao subscriber {subscriber_id}")
-            logger.info(f"📝 Campo personalizado 'subscriber_id' adicionado automaticamente ao subscriber {subscriber_id}")
 
             # PASSO 2: Salvar subscriber_id no banco ANTES de continuar
             logger.info(f"PASSO 2: Salvando subscriber_id no banco")
@@ -449,31 +497,26 @@ class AppointmentScheduler:
             db.commit()
             logger.info(f"Subscriber_id {subscriber_id} salvo no banco para {atendimento.nome_paciente}")
 
-            # PASSO 2.1: Adicionar campos personalizados ao Botconversa
-            logger.info(f"PASSO 2.1: Adicionando campos personalizados ao Botconversa")
-            sucesso_id_tabela = botconversa_service.adicionar_campo_id_tabela(subscriber_id, atendimento.id)
-            sucesso_nr_seq = botconversa_service.adicionar_campo_nr_seq_agenda(subscriber_id, atendimento.nr_seq_agenda)
-            
-            if sucesso_id_tabela:
-                logger.info(f"✅ Campo personalizado id_tabela adicionado com sucesso ao subscriber {subscriber_id}")
-            else:
-                logger.warning(f"⚠️ Falha ao adicionar campo personalizado id_tabela ao subscriber {subscriber_id}")
-            
-            if sucesso_nr_seq:
-                logger.info(f"✅ Campo personalizado nr_seq_agenda adicionado com sucesso ao subscriber {subscriber_id}")
-            else:
-                logger.warning(f"⚠️ Falha ao adicionar campo personalizado nr_seq_agenda ao subscriber {subscriber_id}")
-
-            # PASSO 3: Adicionar à campanha "Confirmação de Consultas"
-            logger.info(f"PASSO 3: Adicionando à campanha")
-            sucesso_campanha = botconversa_service.adicionar_subscriber_campanha(
+            # PASSO 3: Enriquecer subscriber (etiqueta e campos em paralelo; depois a campanha)
+            logger.info(f"PASSO 3: Enriquecendo subscriber (etiqueta, campos e campanha)")
+            resultados = botconversa_service.enriquecer_subscriber(
                 subscriber_id,
-                campaign_id=289860,  # ID da campanha "Confirmação de Consultas"
+                EnriquecimentoSubscriber(
+                    etiquetas=(ETIQUETA_SUBSCRIBER_ID,),
+                    campos={
+                        CAMPO_SUBSCRIBER_ID: str(subscriber_id),
+                        CAMPO_ID_TABELA: str(atendimento.id),
+                        CAMPO_NR_SEQ_AGENDA: str(atendimento.nr_seq_agenda),
+                    },
+                    campanha_id=CAMPANHA_CONFIRMACAO_CONSULTAS,  # "Confirmação de Consultas"
+                ),
             )
 
-            if not sucesso_campanha:
+            falhas = [chave for chave, ok in resultados.items() if not ok]
+            if falhas:
                 logger.warning(
-                    f"Falha ao adicionar à campanha: {atendimento.nome_paciente} (continua mesmo assim)"
+                    f"Falha ao enriquecer subscriber {subscriber_id} ({', '.join(falhas)}): "
+                    f"{atendimento.nome_paciente} (continua mesmo assim)"
                 )
 
             # PASSO 4: Enviar mensagem de confirmação
@@ -582,47 +625,21 @@ class AppointmentScheduler:
         try:
             from datetime import datetime
 
-            from app.config.config import settings
-
-            # Formata a data da consulta
-            data_formatada = consulta.data_consulta.strftime("%d/%m/%Y")
-            hora_formatada = consulta.data_consulta.strftime("%H:%M")
-
-            # Obtém as configurações do hospital
-            hospital_name = settings.hospital_name
-            hospital_phone = settings.hospital_phone 
+            from app.services.templates_mensagem import campos_mensagem, renderizar_mensagem
 
             # Cria mensagem de lembrete baseada no tipo
-            if tipo_lembrete == "48h":
-                mensagem = f"""🔔 **LEMBRETE IMPORTANTE**, {consulta.nome_paciente}!
-
-        Sua consulta está marcada para **AMANHÃ**:
-        📅 {data_formatada} às {hora_formatada}
-        👨‍⚕️ Dr. {consulta.nome_medico}
-        🏥 {consulta.especialidade}
-
-        Por favor, confirme sua presença:
-        ✅ SIM - Vou comparecer
-        ❌ NÃO - Preciso cancelar
-
-        📞 Para dúvidas: {hospital_phone}"""
-
-            elif tipo_lembrete == "12h":
-                mensagem = f"""⚠️ **ÚLTIMO LEMBRETE**, {consulta.nome_paciente}!
-
-        Sua consulta é **HOJE** às {hora_formatada}:
-        👨‍⚕️ Dr. {consulta.nome_medico}
-        🏥 {consulta.especialidade}
-
-        Confirme sua presença AGORA:
-        ✅ SIM - Vou comparecer
-        ❌ NÃO - Preciso cancelar
-
-        📞 Para dúvidas: {hospital_phone}"""
-
-            else:
+            if tipo_lembrete not in ("48h", "12h"):
                 logger.error(f"Tipo de lembrete inválido: {tipo_lembrete}")
                 return False
+            mensagem = renderizar_mensagem(
+                f"lembrete_{tipo_lembrete}_atendimento",
+                campos_mensagem(
+                    consulta.nome_paciente,
+                    consulta.data_consulta,
+                    consulta.nome_medico,
+                    consulta.especialidade,
+                ),
+            )
 
             # Envia a mensagem
             sucesso = botconversa_service.enviar_mensagem(
@@ -701,11 +718,20 @@ class AppointmentScheduler:
                 "reminder_enabled": any(
                     job.id == "verificar_lembretes" for job in jobs
                 ),
+                "fila_envio": self._get_status_fila_envio(),
             }
         except Exception as e:
             logger.error(f"Erro ao obter status do scheduler: {str(e)}")
             return {"is_running": self.is_running, "jobs_count": 0, "error": str(e)}
 
+    def _get_status_fila_envio(self) -> Optional[dict]:
+        """Workers e itens por status da fila de envio (None se a fila estiver desabilitada)."""
+        if not settings.fila_envio_habilitada:
+            return None
+        from app.services.fila_envio_service import pool_envio
+
+        return pool_envio.snapshot()
+
     def _get_next_run_time(self) -> Optional[str]:
         """Retorna a próxima execução programada"""
         try:
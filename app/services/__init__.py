@@ -8,9 +8,11 @@ Este módulo contém a lógica de negócio para:
 """
 
 from .botconversa_service import BotconversaService
+from .botconversa_async_service import AsyncBotconversaService
 from .webhook_service import WebhookService
 
 __all__ = [
     "BotconversaService",
+    "AsyncBotconversaService",
     "WebhookService",
 ]
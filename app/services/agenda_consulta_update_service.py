@@ -3,21 +3,63 @@ Atualização da tabela agenda_consulta no banco principal (Oracle).
 
 Usado quando o paciente responde à confirmação (SIM/NÃO) no webhook:
 atualiza DT_CONFIRMACAO, DS_CONFIRMACAO e outros campos relevantes.
+
+DT_CONFIRMACAO é o momento em que a resposta foi recebida (não o do
+processamento) e o UPDATE só sobrescreve uma confirmação mais antiga: uma
+resposta reprocessada fora de ordem não desfaz a mais recente.
+
+Com settings.agenda_confirmacao_lote_habilitado as respostas são agrupadas no
+EscritorConfirmacaoAgenda e gravadas em lote (um executemany + um commit). O
+chamador espera o commit do seu lote (group commit): o webhook só é concluído
+com a resposta gravada, e uma falha volta para ele (retentativa pela inbox).
 """
 
+from concurrent.futures import Future
 from datetime import datetime
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
 
 from loguru import logger
 from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
 from sqlalchemy.orm import Session
 
 from app.config.config import settings
+from app.utils.write_behind import BufferWriteBehind
+
+
+def _sql_update_confirmacao() -> TextClause:
+    tabela = getattr(settings, "tabela_agenda_consulta", "TASY.AGENDA_CONSULTA")
+    return _update_confirmacao_tabela(tabela)
+
+
+@lru_cache(maxsize=8)
+def _update_confirmacao_tabela(tabela: str) -> TextClause:
+    """UPDATE montado uma vez por tabela: mesmo SQL a cada resposta (cache do SQLAlchemy e do driver)."""
+    return text(
+        f"UPDATE {tabela} SET DT_CONFIRMACAO = :dt_confirmacao, DS_CONFIRMACAO = :ds_confirmacao "
+        "WHERE CD_AGENDA = :cd_agenda "
+        "AND (DT_CONFIRMACAO IS NULL OR DT_CONFIRMACAO <= :dt_confirmacao)"
+    )
+
+
+# Tempo máximo (segundos) que o webhook espera o commit do lote
+_ESPERA_GRAVACAO_SEGUNDOS = 60
+
+
+def _params_confirmacao(cd_agenda: int, confirmado: bool, dt_confirmacao: datetime) -> dict:
+    return {
+        "dt_confirmacao": dt_confirmacao,
+        "ds_confirmacao": "Confirmado" if confirmado else "Cancelado",
+        "cd_agenda": cd_agenda,
+    }
 
 
 def atualizar_confirmacao_agenda_consulta(
     db: Session,
     cd_agenda: int,
     confirmado: bool,
+    dt_confirmacao: Optional[datetime] = None,
 ) -> bool:
     """
     Atualiza a tabela agenda_consulta com data e texto de confirmação.
@@ -29,25 +71,16 @@ def atualizar_confirmacao_agenda_consulta(
         db: Sessão do banco principal (Oracle).
         cd_agenda: Chave da agenda (CD_AGENDA / nr_sequencia_agenda).
         confirmado: True = confirmado ('1'), False = cancelado ('0').
+        dt_confirmacao: Recebimento da resposta (padrão: agora).
 
     Returns:
-        True se o UPDATE afetou alguma linha, False caso contrário.
+        True se o UPDATE afetou alguma linha, False caso contrário (agenda
+        inexistente ou já com confirmação mais recente).
     """
-    tabela = getattr(settings, "tabela_agenda_consulta", "TASY.AGENDA_CONSULTA")
-    dt_confirmacao = datetime.now()
-    ds_confirmacao = "Confirmado" if confirmado else "Cancelado"
-
     try:
-        sql = text(
-            f"UPDATE {tabela} SET DT_CONFIRMACAO = :dt_confirmacao, DS_CONFIRMACAO = :ds_confirmacao WHERE CD_AGENDA = :cd_agenda"
-        )
         result = db.execute(
-            sql,
-            {
-                "dt_confirmacao": dt_confirmacao,
-                "ds_confirmacao": ds_confirmacao,
-                "cd_agenda": cd_agenda,
-            },
+            _sql_update_confirmacao(),
+            _params_confirmacao(cd_agenda, confirmado, dt_confirmacao or datetime.now()),
         )
         db.commit()
         rowcount = result.rowcount
@@ -60,3 +93,123 @@ def atualizar_confirmacao_agenda_consulta(
         logger.error(f"Erro ao atualizar agenda_consulta cd_agenda={cd_agenda}: {e}")
         db.rollback()
         raise
+
+
+class ConfirmacaoAgenda(NamedTuple):
+    """Resposta pendente de gravação em agenda_consulta."""
+
+    cd_agenda: int
+    confirmado: bool
+    dt_confirmacao: datetime
+    gravada: Future
+
+
+class EscritorConfirmacaoAgenda(BufferWriteBehind[ConfirmacaoAgenda]):
+    """
+    Agrupa respostas e grava em lote na agenda_consulta.
+
+    Cada lote vira um UPDATE executemany com um único commit, em sessão própria.
+    Respostas repetidas do mesmo cd_agenda no lote são reduzidas à mais recente.
+    Se o lote falhar, cada resposta é gravada sozinha: uma linha com erro só
+    falha o seu próprio Future e não volta ao buffer (a retentativa fica com
+    quem registrou, ex.: inbox de webhooks, que a leva a FALHOU no limite).
+    """
+
+    def __init__(self, max_itens: int = 200, intervalo_ms: int = 500):
+        super().__init__(
+            "agenda_consulta", self._gravar, max_itens=max_itens, intervalo_ms=intervalo_ms
+        )
+
+    def registrar(self, cd_agenda: int, confirmado: bool, dt_confirmacao: datetime) -> Future:
+        """Enfileira a resposta. O Future é resolvido quando o lote é gravado (ou falha)."""
+        gravada: Future = Future()
+        self.adicionar(ConfirmacaoAgenda(cd_agenda, confirmado, dt_confirmacao, gravada))
+        return gravada
+
+    @classmethod
+    def _gravar(cls, itens: List[ConfirmacaoAgenda]) -> None:
+        from app.database.manager import db_manager
+
+        ultimas = {}
+        for item in itens:
+            atual = ultimas.get(item.cd_agenda)
+            if atual is None or item.dt_confirmacao >= atual.dt_confirmacao:
+                ultimas[item.cd_agenda] = item
+        try:
+            db = db_manager.get_session()
+        except Exception as e:
+            logger.error(f"Erro ao abrir sessão para o lote de agenda_consulta: {e}")
+            for item in itens:
+                item.gravada.set_exception(e)
+            return
+        try:
+            db.execute(
+                _sql_update_confirmacao(),
+                [
+                    _params_confirmacao(i.cd_agenda, i.confirmado, i.dt_confirmacao)
+                    for i in ultimas.values()
+                ],
+            )
+            db.commit()
+            logger.info(
+                f"agenda_consulta atualizada em lote: {len(ultimas)} agendas "
+                f"({len(itens)} respostas)"
+            )
+        except Exception as e:
+            db.rollback()
+            logger.warning(
+                f"Erro no lote de agenda_consulta ({len(ultimas)} agendas), "
+                f"gravando uma a uma: {e}"
+            )
+            cls._gravar_uma_a_uma(db, list(ultimas.values()))
+        finally:
+            db.close()
+        # Respostas vencidas por uma mais recente do mesmo cd_agenda contam como gravadas
+        for item in itens:
+            if not item.gravada.done():
+                item.gravada.set_result(True)
+
+    @staticmethod
+    def _gravar_uma_a_uma(db: Session, itens: List[ConfirmacaoAgenda]) -> None:
+        for item in itens:
+            try:
+                db.execute(
+                    _sql_update_confirmacao(),
+                    _params_confirmacao(item.cd_agenda, item.confirmado, item.dt_confirmacao),
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Erro ao atualizar agenda_consulta cd_agenda={item.cd_agenda}: {e}")
+                item.gravada.set_exception(e)
+
+
+escritor_confirmacao_agenda = EscritorConfirmacaoAgenda(
+    max_itens=settings.agenda_confirmacao_lote,
+    intervalo_ms=settings.agenda_confirmacao_intervalo_ms,
+)
+
+
+def registrar_confirmacao_agenda(
+    db: Session,
+    cd_agenda: int,
+    confirmado: bool,
+    recebido_em: Optional[datetime] = None,
+) -> None:
+    """
+    Grava a resposta do paciente na agenda_consulta: em lote pelo
+    EscritorConfirmacaoAgenda (agenda_confirmacao_lote_habilitado) ou na hora.
+
+    Só retorna com o UPDATE confirmado; erro (ou lote não gravado a tempo)
+    levanta exceção para o webhook ser reprocessado.
+
+    Args:
+        recebido_em: Recebimento da resposta (DT_CONFIRMACAO; padrão: agora).
+    """
+    dt_confirmacao = recebido_em or datetime.now()
+    if settings.agenda_confirmacao_lote_habilitado:
+        escritor_confirmacao_agenda.registrar(cd_agenda, confirmado, dt_confirmacao).result(
+            timeout=_ESPERA_GRAVACAO_SEGUNDOS
+        )
+    else:
+        atualizar_confirmacao_agenda_consulta(db, cd_agenda, confirmado, dt_confirmacao)
@@ -0,0 +1,335 @@
+"""
+Cliente assíncrono (httpx.AsyncClient) para a API do Botconversa.
+
+Contraparte de BotconversaService para o caminho de alto volume dos lembretes
+48h/12h: permite processar vários pacientes em paralelo (busca/criação de
+subscriber, envio da mensagem e PATCH de contexto) sob um semáforo.
+
+Uso:
+    async with AsyncBotconversaService() as bot:
+        await bot.enviar_mensagem_por_telefone_com_nr_sequencia(...)
+"""
+
+import asyncio
+from typing import Any, Dict, Optional
+
+import httpx
+from loguru import logger
+
+from app.config.config import settings
+from app.services.botconversa_http import criar_cliente_async
+from app.services.subscriber_cache_service import (
+    descartar_subscriber_do_cache,
+    guardar_subscriber_id_em_cache,
+    obter_subscriber_id_em_cache,
+)
+from app.utils.telefone import telefone_para_envio
+
+
+class AsyncBotconversaService:
+    """Serviço assíncrono para integração com a API do Botconversa"""
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        self.base_url = "https://backend.botconversa.com.br/api/v1/webhook"
+        self.api_key = settings.botconversa_api_key
+        self.headers = {
+            "API-KEY": self.api_key or "",
+            "Content-Type": "application/json",
+            "accept": "application/json",
+        }
+        self._client_proprio = client is None
+        self.http = client or criar_cliente_async()
+
+    async def __aenter__(self) -> "AsyncBotconversaService":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.fechar()
+
+    async def fechar(self) -> None:
+        """Fecha o cliente HTTP (somente se foi criado por este serviço)."""
+        if self._client_proprio:
+            await self.http.aclose()
+
+    async def criar_subscriber(
+        self, telefone: str, nome: str, sobrenome: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Cria um subscriber no Botconversa (com etiqueta e campo subscriber_id).
+
+        Returns:
+            Dados do subscriber criado ou None se erro
+        """
+        try:
+            telefone = telefone_para_envio(telefone)
+            if not telefone:
+                logger.error("Telefone inválido ou vazio")
+                return None
+            subscriber_data = {
+                "phone": telefone,
+                "first_name": nome,
+                "last_name": sobrenome,
+            }
+            logger.info(f"Criando subscriber para telefone: {telefone}")
+            response = await self.http.post(
+                f"{self.base_url}/subscriber/",
+                json=subscriber_data,
+                headers=self.headers,
+                timeout=30,
+            )
+            if response.status_code != 200:
+                logger.error(
+                    f"Erro ao criar subscriber: {response.status_code} - {response.text}"
+                )
+                return None
+
+            subscriber = response.json()
+            subscriber_id = subscriber.get("id")
+            logger.info(f"Subscriber criado com sucesso: {subscriber_id}")
+            if subscriber_id:
+                ok_etiqueta, ok_campo = await asyncio.gather(
+                    self.adicionar_etiqueta_subscriber(subscriber_id),
+                    self.adicionar_campo_personalizado(subscriber_id),
+                )
+                if not ok_etiqueta:
+                    logger.warning(
+                        f"⚠️ Subscriber criado, mas falha ao adicionar etiqueta para {subscriber_id}"
+                    )
+                if not ok_campo:
+                    logger.warning(
+                        f"⚠️ Subscriber criado, mas falha ao adicionar campo personalizado para {subscriber_id}"
+                    )
+            else:
+                logger.warning(
+                    "Subscriber criado mas sem ID válido para adicionar etiqueta e campo personalizado"
+                )
+            return subscriber
+
+        except Exception as e:
+            logger.error(f"Erro ao criar subscriber: {str(e)}")
+            return None
+
+    async def buscar_subscriber(self, telefone: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca um subscriber pelo telefone.
+
+        Returns:
+            Dados do subscriber ou None se não encontrado
+        """
+        try:
+            telefone = telefone_para_envio(telefone)
+            if not telefone:
+                return None
+            logger.info(f"Buscando subscriber para telefone: {telefone}")
+            response = await self.http.get(
+                f"{self.base_url}/subscriber/get_by_phone/{telefone}/",
+                headers=self.headers,
+                timeout=30,
+            )
+            if response.status_code == 200:
+                subscriber = response.json()
+                logger.info(f"Subscriber encontrado: {subscriber.get('id')}")
+                return subscriber
+            logger.error(
+                f"Erro ao buscar subscriber: {response.status_code} - {response.text}"
+            )
+            return None
+
+        except Exception as e:
+            logger.error(f"Erro ao buscar subscriber: {str(e)}")
+            return None
+
+    async def adicionar_etiqueta_subscriber(
+        self, subscriber_id: int, tag_id: int = 15362464
+    ) -> bool:
+        """Adiciona etiqueta (padrão: subscriber_id) ao subscriber."""
+        try:
+            response = await self.http.post(
+                f"{self.base_url}/subscriber/{subscriber_id}/tags/{tag_id}/",
+                headers=self.headers,
+                timeout=30,
+            )
+            if response.status_code in (200, 201):
+                logger.info(
+                    f"✅ Etiqueta {tag_id} adicionada com sucesso ao subscriber {subscriber_id}"
+                )
+                return True
+            logger.error(
+                f"❌ Erro ao adicionar etiqueta {tag_id} ao subscriber {subscriber_id}: "
+                f"{response.status_code} - {response.text}"
+            )
+            return False
+
+        except Exception as e:
+            logger.error(
+                f"❌ Erro ao adicionar etiqueta ao subscriber {subscriber_id}: {str(e)}"
+            )
+            return False
+
+    async def adicionar_campo_personalizado(
+        self, subscriber_id: int, field_id: int = 4336343, valor: str = None
+    ) -> bool:
+        """Grava valor em campo personalizado (padrão: o próprio subscriber_id)."""
+        try:
+            if valor is None:
+                valor = str(subscriber_id)
+            response = await self.http.post(
+                f"{self.base_url}/subscriber/{subscriber_id}/custom_fields/{field_id}/",
+                json={"value": valor},
+                headers=self.headers,
+                timeout=30,
+            )
+            if response.status_code in (200, 201):
+                logger.info(
+                    f"✅ Campo personalizado {field_id} atualizado com sucesso para "
+                    f"subscriber {subscriber_id} com valor '{valor}'"
+                )
+                return True
+            logger.error(
+                f"❌ Erro ao atualizar campo personalizado {field_id} do subscriber {subscriber_id}: "
+                f"{response.status_code} - {response.text}"
+            )
+            return False
+
+        except Exception as e:
+            logger.error(
+                f"❌ Erro ao atualizar campo personalizado do subscriber {subscriber_id}: {str(e)}"
+            )
+            return False
+
+    async def enviar_mensagem(self, subscriber_id: int, mensagem: str) -> bool:
+        """
+        Envia uma mensagem de texto para um subscriber.
+
+        Returns:
+            True se enviado com sucesso, False caso contrário
+        """
+        return await self._enviar_mensagem_status(subscriber_id, mensagem) == 200
+
+    async def _enviar_mensagem_status(
+        self, subscriber_id: int, mensagem: str
+    ) -> Optional[int]:
+        """Envia a mensagem e retorna o status HTTP (None se a requisição falhou)."""
+        try:
+            response = await self.http.post(
+                f"{self.base_url}/subscriber/{subscriber_id}/send_message/",
+                json={"type": "text", "value": mensagem},
+                headers=self.headers,
+                timeout=30,
+            )
+            if response.status_code == 200:
+                result = response.json()
+                logger.info(f"Mensagem enviada com sucesso: {result.get('message_id')}")
+            else:
+                logger.error(
+                    f"Erro ao enviar mensagem: {response.status_code} - {response.text}"
+                )
+            return response.status_code
+
+        except Exception as e:
+            logger.error(f"Erro ao enviar mensagem: {str(e)}")
+            return None
+
+    async def get_or_create_subscriber_id(
+        self, telefone: str, nome: str
+    ) -> Optional[int]:
+        """
+        Retorna subscriber_id pelo telefone (cache SQLite → busca → criação).
+
+        O cache é SQLite síncrono: as chamadas rodam em thread (asyncio.to_thread)
+        para não bloquear o event loop.
+        """
+        telefone = telefone_para_envio(telefone)
+        if not telefone:
+            return None
+        subscriber_id = await asyncio.to_thread(obter_subscriber_id_em_cache, telefone)
+        if subscriber_id is not None:
+            logger.info(f"Subscriber {subscriber_id} obtido do cache para {telefone}")
+            return subscriber_id
+        subscriber = await self.buscar_subscriber(telefone)
+        if subscriber and subscriber.get("id") is not None:
+            await asyncio.to_thread(guardar_subscriber_id_em_cache, telefone, subscriber["id"])
+            return subscriber["id"]
+        partes = (nome or "").strip().split(maxsplit=1)
+        primeiro_nome = partes[0] if partes else "Paciente"
+        sobrenome = partes[1] if len(partes) > 1 else ""
+        subscriber = await self.criar_subscriber(
+            telefone=telefone, nome=primeiro_nome, sobrenome=sobrenome
+        )
+        if subscriber and subscriber.get("id") is not None:
+            await asyncio.to_thread(guardar_subscriber_id_em_cache, telefone, subscriber["id"])
+            return subscriber["id"]
+        return None
+
+    async def atualizar_subscriber_contexto_lembrete(
+        self,
+        subscriber_id: int,
+        nr_sequencia: int,
+        nr_sequencia_agenda: int | None = None,
+    ) -> bool:
+        """Atualiza o subscriber com nr_sequencia e nr_sequencia_agenda (PATCH)."""
+        try:
+            body: dict = {"nr_sequencia": nr_sequencia}
+            if nr_sequencia_agenda is not None:
+                body["nr_sequencia_agenda"] = nr_sequencia_agenda
+            response = await self.http.patch(
+                f"{self.base_url}/subscriber/{subscriber_id}/",
+                json=body,
+                headers=self.headers,
+                timeout=10,
+            )
+            if response.status_code in (200, 201, 204):
+                logger.info(
+                    f"Subscriber {subscriber_id} atualizado com nr_sequencia={nr_sequencia}"
+                    + (f", nr_sequencia_agenda={nr_sequencia_agenda}" if nr_sequencia_agenda is not None else "")
+                )
+                return True
+            logger.warning(
+                f"Botconversa: atualizar subscriber {subscriber_id} retornou "
+                f"{response.status_code} - {response.text}"
+            )
+            return False
+        except Exception as e:
+            logger.warning(
+                f"Erro ao atualizar subscriber com contexto (ignorado): {e}"
+            )
+            return False
+
+    async def enviar_mensagem_por_telefone_com_nr_sequencia(
+        self,
+        telefone: str,
+        nome: str,
+        mensagem: str,
+        nr_sequencia: int,
+        nr_sequencia_agenda: int | None = None,
+    ) -> bool:
+        """
+        Envia mensagem e grava nr_sequencia e nr_sequencia_agenda no subscriber.
+
+        Se o envio der 404 (subscriber removido no Botconversa), invalida o cache
+        do telefone e tenta mais uma vez com o subscriber resolvido novamente.
+        """
+        for tentativa in range(2):
+            subscriber_id = await self.get_or_create_subscriber_id(
+                telefone, nome or "Paciente"
+            )
+            if not subscriber_id:
+                logger.error(f"Não foi possível obter subscriber para telefone {telefone}")
+                return False
+            status = await self._enviar_mensagem_status(subscriber_id, mensagem)
+            if status == 200:
+                await self.atualizar_subscriber_contexto_lembrete(
+                    subscriber_id, nr_sequencia, nr_sequencia_agenda
+                )
+                return True
+            if status != 404 or tentativa > 0:
+                return False
+            logger.warning(
+                f"Subscriber {subscriber_id} não encontrado (404); invalidando cache de {telefone}"
+            )
+            await asyncio.to_thread(
+                descartar_subscriber_do_cache,
+                telefone=telefone_para_envio(telefone),
+                subscriber_id=subscriber_id,
+            )
+        return False
@@ -0,0 +1,246 @@
+"""
+Transporte HTTP compartilhado para a API do Botconversa.
+
+Mantém uma única requests.Session por processo, com pool de conexões
+keep-alive por host, para que todas as instâncias de BotconversaService
+reaproveitem conexões TCP/TLS em vez de abrir uma nova a cada chamada.
+
+Também contabiliza acertos (conexão reaproveitada) e falhas (conexão nova)
+do pool, expostos por obter_metricas_pool_http().
+
+Para o cliente assíncrono (AsyncBotconversaService), criar_cliente_async()
+monta um httpx.AsyncClient com os mesmos limites de pool.
+
+Ambos passam pelo limitador de taxa compartilhado (botconversa_rate_limit):
+cada requisição aguarda um token e respostas 429 (e 503 em métodos
+idempotentes) são repetidas até settings.botconversa_rate_limit_max_retries
+vezes, respeitando Retry-After. POST com 503 não é repetido: o Botconversa
+pode ter aceitado a mensagem antes de responder.
+"""
+
+import asyncio
+import socket
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from app.config.config import settings
+from app.services.botconversa_rate_limit import (
+    STATUS_LIMITE,
+    espera_exponencial,
+    interpretar_retry_after,
+    limitador_botconversa,
+    pode_repetir,
+)
+
+
+class _MetricasPool:
+    """Contadores de uso do pool (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.conexoes_novas = 0
+
+    def registrar_checkout(self) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+    def registrar_conexao_nova(self) -> None:
+        with self._lock:
+            self.conexoes_novas += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            checkouts = self.checkouts
+            misses = self.conexoes_novas
+        hits = max(checkouts - misses, 0)
+        return {
+            "checkouts": checkouts,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / checkouts, 4) if checkouts else None,
+        }
+
+
+_metricas = _MetricasPool()
+
+
+class _HTTPConnectionPoolMetrificado(HTTPConnectionPool):
+    def _get_conn(self, timeout=None):
+        _metricas.registrar_checkout()
+        return super()._get_conn(timeout=timeout)
+
+    def _new_conn(self):
+        _metricas.registrar_conexao_nova()
+        return super()._new_conn()
+
+
+class _HTTPSConnectionPoolMetrificado(HTTPSConnectionPool):
+    def _get_conn(self, timeout=None):
+        _metricas.registrar_checkout()
+        return super()._get_conn(timeout=timeout)
+
+    def _new_conn(self):
+        _metricas.registrar_conexao_nova()
+        return super()._new_conn()
+
+
+def _socket_options_keepalive() -> list:
+    """Opções de socket com TCP keep-alive (quando suportado pelo SO)."""
+    opcoes = list(HTTPConnection.default_socket_options)
+    opcoes.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    idle = settings.botconversa_http_keepalive_idle
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        opcoes.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle))
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        opcoes.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(idle // 4, 1)))
+    return opcoes
+
+
+class _BotconversaHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter que usa pools instrumentados e TCP keep-alive opcional."""
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if settings.botconversa_http_keepalive:
+            pool_kwargs.setdefault("socket_options", _socket_options_keepalive())
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _HTTPConnectionPoolMetrificado,
+            "https": _HTTPSConnectionPoolMetrificado,
+        }
+
+
+class _BotconversaSession(requests.Session):
+    """requests.Session que aplica o limitador de taxa e repete 429 (503 só em idempotentes)."""
+
+    def request(self, method, url, *args, **kwargs):
+        tentativa = 0
+        while True:
+            espera = limitador_botconversa.reservar()
+            if espera > 0:
+                time.sleep(espera)
+            response = super().request(method, url, *args, **kwargs)
+            if response.status_code not in STATUS_LIMITE:
+                limitador_botconversa.registrar_sucesso()
+                return response
+            retry_after = interpretar_retry_after(response.headers.get("Retry-After"))
+            limitador_botconversa.registrar_limite(retry_after)
+            if (
+                tentativa >= settings.botconversa_rate_limit_max_retries
+                or not pode_repetir(method, response.status_code)
+            ):
+                return response
+            if retry_after is None:
+                time.sleep(espera_exponencial(tentativa))
+            tentativa += 1
+            response.close()
+
+
+class _BotconversaAsyncClient(httpx.AsyncClient):
+    """httpx.AsyncClient que aplica o limitador de taxa e repete 429 (503 só em idempotentes)."""
+
+    async def request(self, method, url, *args, **kwargs):
+        tentativa = 0
+        while True:
+            espera = limitador_botconversa.reservar()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            response = await super().request(method, url, *args, **kwargs)
+            if response.status_code not in STATUS_LIMITE:
+                limitador_botconversa.registrar_sucesso()
+                return response
+            retry_after = interpretar_retry_after(response.headers.get("Retry-After"))
+            limitador_botconversa.registrar_limite(retry_after)
+            if (
+                tentativa >= settings.botconversa_rate_limit_max_retries
+                or not pode_repetir(method, response.status_code)
+            ):
+                return response
+            if retry_after is None:
+                await asyncio.sleep(espera_exponencial(tentativa))
+            tentativa += 1
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _criar_session() -> requests.Session:
+    session = _BotconversaSession()
+    adapter = _BotconversaHTTPAdapter(
+        pool_connections=settings.botconversa_http_pool_connections,
+        pool_maxsize=settings.botconversa_http_pool_maxsize,
+        pool_block=settings.botconversa_http_pool_block,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    logger.info(
+        "Pool HTTP Botconversa criado: "
+        f"hosts={settings.botconversa_http_pool_connections}, "
+        f"conexões/host={settings.botconversa_http_pool_maxsize}, "
+        f"block={settings.botconversa_http_pool_block}, "
+        f"keepalive={settings.botconversa_http_keepalive}"
+    )
+    return session
+
+
+def get_botconversa_http() -> requests.Session:
+    """Retorna a sessão HTTP compartilhada do processo (criada sob demanda)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _criar_session()
+    return _session
+
+
+def fechar_botconversa_http() -> None:
+    """Fecha a sessão compartilhada e libera as conexões do pool."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+            logger.info("Pool HTTP Botconversa encerrado")
+
+
+def criar_cliente_async() -> httpx.AsyncClient:
+    """
+    Cria um httpx.AsyncClient com os limites de pool do Botconversa.
+
+    O cliente fica preso ao event loop em que é usado, por isso é criado por
+    execução (ex.: a cada rodada dos jobs de lembrete) e fechado ao final.
+    """
+    limites = httpx.Limits(
+        max_connections=settings.botconversa_http_pool_maxsize,
+        max_keepalive_connections=settings.botconversa_http_pool_maxsize,
+        keepalive_expiry=settings.botconversa_http_keepalive_idle,
+    )
+    return _BotconversaAsyncClient(
+        limits=limites, headers={"Connection": "keep-alive"}
+    )
+
+
+def obter_metricas_pool_http() -> Dict[str, Any]:
+    """Retorna contadores do pool HTTP e do limitador de taxa do Botconversa."""
+    metricas = _metricas.snapshot()
+    metricas.update(
+        {
+            "pool_connections": settings.botconversa_http_pool_connections,
+            "pool_maxsize": settings.botconversa_http_pool_maxsize,
+            "pool_block": settings.botconversa_http_pool_block,
+            "keepalive": settings.botconversa_http_keepalive,
+            "ativo": _session is not None,
+            "rate_limit": limitador_botconversa.snapshot(),
+        }
+    )
+    return metricas
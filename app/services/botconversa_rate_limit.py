@@ -0,0 +1,159 @@
+"""
+Limitador de taxa (token bucket adaptativo) para a API do Botconversa.
+
+Compartilhado pelo cliente síncrono (requests) e assíncrono (httpx):
+- Cada requisição consome um token; a reposição segue a taxa atual (req/s)
+  e o balde comporta até `rajada` tokens.
+- Ao receber 429/503 a taxa atual é reduzida (multiplicativamente) e, se vier
+  Retry-After, as requisições ficam suspensas até o prazo indicado.
+- Cada resposta bem-sucedida devolve um pouco da taxa (aumento aditivo) até
+  o teto configurado, mantendo o throughput próximo do máximo tolerado pela API.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from app.config.config import settings
+
+# Status que indicam limite de taxa / sobrecarga no Botconversa
+STATUS_LIMITE = (429, 503)
+# Métodos que podem ser repetidos após 503 (o servidor pode ter processado a
+# requisição antes de responder; repetir um POST duplicaria a mensagem)
+METODOS_IDEMPOTENTES = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def pode_repetir(method: str, status_code: int) -> bool:
+    """429 é rejeitado antes do processamento e sempre pode ser repetido; 503 só em métodos idempotentes."""
+    if status_code == 429:
+        return True
+    return status_code in STATUS_LIMITE and str(method).upper() in METODOS_IDEMPOTENTES
+
+
+def interpretar_retry_after(valor: Optional[str]) -> Optional[float]:
+    """Converte o header Retry-After (segundos ou data HTTP) em segundos de espera."""
+    if not valor:
+        return None
+    valor = valor.strip()
+    try:
+        return max(float(valor), 0.0)
+    except ValueError:
+        pass
+    try:
+        data = parsedate_to_datetime(valor)
+        if data.tzinfo is None:
+            data = data.replace(tzinfo=timezone.utc)
+        return max((data - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class LimitadorTaxa:
+    """Token bucket thread-safe com redução multiplicativa e aumento aditivo (AIMD)."""
+
+    def __init__(
+        self,
+        taxa: float,
+        rajada: int,
+        taxa_minima: float,
+        fator_reducao: float = 0.5,
+        incremento: float = 0.05,
+    ):
+        self.taxa_maxima = max(taxa, 0.01)
+        self.taxa_minima = min(max(taxa_minima, 0.01), self.taxa_maxima)
+        self.rajada = max(rajada, 1)
+        self.fator_reducao = fator_reducao
+        self.incremento = self.taxa_maxima * incremento
+        self.taxa_atual = self.taxa_maxima
+
+        self._lock = threading.Lock()
+        self._tokens = float(self.rajada)
+        self._referencia = time.monotonic()  # instante a partir do qual os tokens repõem
+        self._ultima_reducao = 0.0
+
+        self.total_reservas = 0
+        self.total_limitadas = 0
+        self.total_espera_s = 0.0
+
+    def _repor(self, agora: float) -> None:
+        if agora > self._referencia:
+            self._tokens = min(
+                self.rajada,
+                self._tokens + (agora - self._referencia) * self.taxa_atual,
+            )
+            self._referencia = agora
+
+    def reservar(self) -> float:
+        """Reserva um token e retorna quantos segundos aguardar antes de requisitar."""
+        with self._lock:
+            agora = time.monotonic()
+            self._repor(agora)
+            self._tokens -= 1
+            espera = max(self._referencia - agora, 0.0)
+            if self._tokens < 0:
+                espera += -self._tokens / self.taxa_atual
+            self.total_reservas += 1
+            self.total_espera_s += espera
+            return espera
+
+    def registrar_sucesso(self) -> None:
+        """Resposta normal: recupera a taxa aos poucos até o teto configurado."""
+        if self.taxa_atual >= self.taxa_maxima:
+            return
+        with self._lock:
+            self._repor(time.monotonic())
+            self.taxa_atual = min(self.taxa_maxima, self.taxa_atual + self.incremento)
+
+    def registrar_limite(self, retry_after: Optional[float] = None) -> None:
+        """
+        Resposta 429/503: reduz a taxa e, se informado, suspende até o Retry-After.
+
+        A redução é aplicada no máximo uma vez por segundo, para que uma rajada
+        de 429 simultâneos (requisições já em voo) não derrube a taxa ao mínimo.
+        """
+        with self._lock:
+            agora = time.monotonic()
+            self._repor(agora)
+            self.total_limitadas += 1
+            if agora - self._ultima_reducao >= 1.0:
+                self.taxa_atual = max(
+                    self.taxa_minima, self.taxa_atual * self.fator_reducao
+                )
+                self._ultima_reducao = agora
+            if retry_after:
+                retomar_em = agora + retry_after
+                if retomar_em > self._referencia:
+                    self._referencia = retomar_em
+                    self._tokens = min(self._tokens, 0.0)
+            taxa = self.taxa_atual
+        logger.warning(
+            f"Botconversa limitou requisições (429/503): taxa ajustada para {taxa:.2f} req/s"
+            + (f", aguardando Retry-After de {retry_after:.1f}s" if retry_after else "")
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "taxa_maxima": self.taxa_maxima,
+                "taxa_atual": round(self.taxa_atual, 3),
+                "rajada": self.rajada,
+                "reservas": self.total_reservas,
+                "respostas_limitadas": self.total_limitadas,
+                "espera_total_s": round(self.total_espera_s, 3),
+            }
+
+
+limitador_botconversa = LimitadorTaxa(
+    taxa=settings.botconversa_rate_limit_rps,
+    rajada=settings.botconversa_rate_limit_burst,
+    taxa_minima=settings.botconversa_rate_limit_min_rps,
+)
+
+
+def espera_exponencial(tentativa: int) -> float:
+    """Espera antes de repetir uma requisição limitada que não trouxe Retry-After."""
+    return min(0.5 * 2 ** tentativa, 30.0)
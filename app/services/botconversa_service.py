@@ -8,14 +8,29 @@ Este serviço gerencia:
 - Processamento de respostas
 """
 
-import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 from loguru import logger
 from sqlalchemy.orm import Session
 
 from app.config.config import settings
+from app.services.botconversa_http import get_botconversa_http
+from app.services.subscriber_enriquecimento_service import (
+    CAMPO_SUBSCRIBER_ID,
+    ETIQUETA_SUBSCRIBER_ID,
+    EnriquecimentoSubscriber,
+    carregar_valores_conhecidos,
+    enriquecimento_padrao,
+    registrar_valores_conhecidos,
+)
+from app.services.subscriber_cache_service import (
+    descartar_subscriber_do_cache,
+    guardar_subscriber_id_em_cache,
+    obter_subscriber_id_em_cache,
+)
+from app.services.templates_mensagem import campos_mensagem, renderizar_mensagem
 from app.utils.telefone import telefone_para_envio
 from app.database.models import (
     Atendimento,
@@ -38,6 +53,8 @@ class BotconversaService:
             "Content-Type": "application/json",
             "accept": "application/json",
         }
+        # Sessão HTTP compartilhada pelo processo (pool keep-alive)
+        self.http = get_botconversa_http()
 
     def testar_conexao(self) -> Dict[str, Any]:
         """
@@ -47,7 +64,7 @@ class BotconversaService:
             Dicionário com resultado do teste
         """
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.base_url}/campaigns/", headers=self.headers, timeout=30
             )
 
@@ -73,7 +90,7 @@ class BotconversaService:
             }
 
     def criar_subscriber(
-        self, telefone: str, nome: str, sobrenome: str = ""
+        self, telefone: str, nome: str, sobrenome: str = "", enriquecer: bool = True
     ) -> Optional[Dict[str, Any]]:
         """
         Cria um subscriber no Botconversa usando o webhook.
@@ -82,6 +99,8 @@ class BotconversaService:
             telefone: Número do telefone (qualquer formatação; será normalizado para padrão)
             nome: Primeiro nome
             sobrenome: Sobrenome (opcional)
+            enriquecer: Se True, já aplica etiqueta e campo subscriber_id. Use False quando
+                o chamador fará um enriquecer_subscriber completo logo em seguida.
 
         Returns:
             Dados do subscriber criado ou None se erro
@@ -101,7 +120,7 @@ class BotconversaService:
             logger.info(f"Criando subscriber para telefone: {telefone}")
 
             # Faz requisição para criar subscriber via webhook
-            response = requests.post(
+            response = self.http.post(
                 f"{self.base_url}/subscriber/",
                 json=subscriber_data,
                 headers=self.headers,
@@ -113,26 +132,17 @@ class BotconversaService:
                 subscriber_id = subscriber.get('id')
                 logger.info(f"Subscriber criado com sucesso: {subscriber_id}")
                 
-                # Adicionar etiqueta subscriber_id automaticamente
-                if subscriber_id:
-                    logger.info(f"Adicionando etiqueta subscriber_id ao subscriber {subscriber_id}")
-                    sucesso_etiqueta = self.adicionar_etiqueta_subscriber(subscriber_id)
-                    
-                    if sucesso_etiqueta:
-                        logger.info(f"✅ Etiqueta subscriber_id adicionada com sucesso ao subscriber {subscriber_id}")
-                    else:
+                # Adicionar etiqueta e campo personalizado subscriber_id (em paralelo)
+                if enriquecer and subscriber_id:
+                    resultados = self.enriquecer_subscriber(
+                        subscriber_id, enriquecimento_padrao(subscriber_id)
+                    )
+                    if not resultados.get(f"etiqueta:{ETIQUETA_SUBSCRIBER_ID}"):
                         logger.warning(f"⚠️ Subscriber criado, mas falha ao adicionar etiqueta para {subscriber_id}")
-                    
-                    # Adicionar campo personalizado subscriber_id automaticamente
-                    logger.info(f"Adicionando campo personalizado subscriber_id ao subscriber {subscriber_id}")
-                    sucesso_campo = self.adicionar_campo_personalizado(subscriber_id)
-                    
-                    if sucesso_campo:
-                        logger.info(f"✅ Campo personalizado subscriber_id adicionado com sucesso ao subscriber {subscriber_id}")
-                    else:
+                    if not resultados.get(f"campo:{CAMPO_SUBSCRIBER_ID}"):
                         logger.warning(f"⚠️ Subscriber criado, mas falha ao adicionar campo personalizado para {subscriber_id}")
                         # Continua mesmo se o campo falhar - não quebra o fluxo
-                else:
+                elif enriquecer:
                     logger.warning("Subscriber criado mas sem ID válido para adicionar etiqueta e campo personalizado")
                 
                 return subscriber
@@ -162,7 +172,7 @@ class BotconversaService:
                 return None
             logger.info(f"Buscando subscriber para telefone: {telefone}")
 
-            response = requests.get(
+            response = self.http.get(
                 f"{self.base_url}/subscriber/get_by_phone/{telefone}/",
                 headers=self.headers,
                 timeout=30,
@@ -200,7 +210,7 @@ class BotconversaService:
             url = f"{self.base_url}/subscriber/{subscriber_id}/tags/{tag_id}/"
             
             # Faz requisição POST para adicionar etiqueta
-            response = requests.post(
+            response = self.http.post(
                 url,
                 headers=self.headers,
                 timeout=30,
@@ -250,7 +260,7 @@ class BotconversaService:
             }
             
             # Faz requisição POST para atualizar campo personalizado
-            response = requests.post(
+            response = self.http.post(
                 url,
                 json=field_data,
                 headers=self.headers,
@@ -297,7 +307,7 @@ class BotconversaService:
             }
             
             # Faz requisição POST para atualizar campo personalizado
-            response = requests.post(
+            response = self.http.post(
                 url,
                 json=field_data,
                 headers=self.headers,
@@ -344,7 +354,7 @@ class BotconversaService:
             }
             
             # Faz requisição POST para atualizar campo personalizado
-            response = requests.post(
+            response = self.http.post(
                 url,
                 json=field_data,
                 headers=self.headers,
@@ -365,6 +375,75 @@ class BotconversaService:
             logger.error(f"❌ Erro ao atualizar campo personalizado nr_seq_agenda do subscriber {subscriber_id}: {str(e)}")
             return False
 
+    def enriquecer_subscriber(
+        self, subscriber_id: int, spec: EnriquecimentoSubscriber
+    ) -> Dict[str, bool]:
+        """
+        Aplica etiquetas, campos personalizados e campanha descritos em `spec`.
+
+        Etiquetas e campos personalizados são independentes entre si e rodam em
+        paralelo. A campanha só é adicionada depois que eles terminam: automações da
+        campanha podem ler os campos (id_tabela, nr_seq_agenda). A latência total é a
+        da chamada mais lenta de etiquetas/campos mais a da campanha. Valores já
+        aplicados (registrados no SQLite) são pulados.
+
+        Args:
+            subscriber_id: ID do subscriber no Botconversa
+            spec: Especificação do enriquecimento
+
+        Returns:
+            {chave: sucesso} por operação ('etiqueta:<id>', 'campo:<id>', 'campanha:<id>')
+        """
+        operacoes = spec.operacoes()
+        conhecidos = carregar_valores_conhecidos(subscriber_id)
+        resultados = {
+            chave: True for chave, valor in operacoes.items() if conhecidos.get(chave) == valor
+        }
+        pendentes = {
+            chave: valor for chave, valor in operacoes.items() if chave not in resultados
+        }
+        if resultados:
+            logger.info(
+                f"Subscriber {subscriber_id}: {len(resultados)} operação(ões) já aplicada(s), pulando"
+            )
+        if not pendentes:
+            return resultados
+
+        def executar(chave: str, valor: str) -> bool:
+            tipo, _, ident = chave.partition(":")
+            if tipo == "etiqueta":
+                return self.adicionar_etiqueta_subscriber(subscriber_id, int(ident))
+            if tipo == "campo":
+                return self.adicionar_campo_personalizado(subscriber_id, int(ident), valor)
+            return self.adicionar_subscriber_campanha(subscriber_id, int(ident))
+
+        campanhas = [chave for chave in pendentes if chave.startswith("campanha:")]
+        paralelas = [chave for chave in pendentes if chave not in campanhas]
+        if paralelas:
+            workers = min(len(paralelas), settings.botconversa_http_pool_maxsize)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futuros = {
+                    chave: executor.submit(executar, chave, pendentes[chave])
+                    for chave in paralelas
+                }
+                for chave, futuro in futuros.items():
+                    resultados[chave] = futuro.result()
+        # Campanha por último, com os campos já gravados no subscriber
+        for chave in campanhas:
+            resultados[chave] = executar(chave, pendentes[chave])
+
+        registrar_valores_conhecidos(
+            subscriber_id,
+            {chave: valor for chave, valor in pendentes.items() if resultados[chave]},
+        )
+        falhas = [chave for chave in pendentes if not resultados[chave]]
+        logger.info(
+            f"Subscriber {subscriber_id} enriquecido: {len(pendentes) - len(falhas)}/"
+            f"{len(pendentes)} operação(ões) aplicada(s)"
+            + (f", falhas: {', '.join(falhas)}" if falhas else "")
+        )
+        return resultados
+
     def criar_atendimento(self, dados: Dict[str, Any]) -> Optional[Atendimento]:
         """
         Cria um novo atendimento e registra no Botconversa.
@@ -432,10 +511,14 @@ class BotconversaService:
         Returns:
             True se enviado com sucesso, False caso contrário
         """
+        return self._enviar_mensagem_status(subscriber_id, mensagem) == 200
+
+    def _enviar_mensagem_status(self, subscriber_id: int, mensagem: str) -> Optional[int]:
+        """Envia a mensagem e retorna o status HTTP (None se a requisição falhou)."""
         try:
             message_data = {"type": "text", "value": mensagem}
 
-            response = requests.post(
+            response = self.http.post(
                 f"{self.base_url}/subscriber/{subscriber_id}/send_message/",
                 json=message_data,
                 headers=self.headers,
@@ -445,16 +528,15 @@ class BotconversaService:
             if response.status_code == 200:
                 result = response.json()
                 logger.info(f"Mensagem enviada com sucesso: {result.get('message_id')}")
-                return True
             else:
                 logger.error(
                     f"Erro ao enviar mensagem: {response.status_code} - {response.text}"
                 )
-                return False
+            return response.status_code
 
         except Exception as e:
             logger.error(f"Erro ao enviar mensagem: {str(e)}")
-            return False
+            return None
 
     def enviar_mensagem_consulta(self, atendimento: Atendimento) -> bool:
         """
@@ -471,40 +553,17 @@ class BotconversaService:
                 logger.error(f"Atendimento {atendimento.id} não tem subscriber_id")
                 return False
 
-            # Formata a data da consulta
-            data_formatada = atendimento.data_consulta.strftime("%d/%m/%Y")
-            hora_formatada = atendimento.data_consulta.strftime("%H:%M")
-
-            # Obtém as configurações do hospital
-            hospital_name = settings.hospital_name 
-            hospital_phone = settings.hospital_phone
-            hospital_address = (
-                settings.hospital_address 
-            )
-            hospital_city = settings.hospital_city 
-            hospital_state = settings.hospital_state 
-
-            # Monta o endereço completo
-            endereco_completo = (
-                f"{hospital_address}, {hospital_city} - {hospital_state}"
+            # Template com os dados do hospital já embutidos (templates_mensagem)
+            mensagem = renderizar_mensagem(
+                "consulta_agendada",
+                campos_mensagem(
+                    atendimento.nome_paciente,
+                    atendimento.data_consulta,
+                    atendimento.nome_medico,
+                    atendimento.especialidade,
+                ),
             )
 
-            # Cria a mensagem personalizada
-            mensagem = f"""🏥 **{hospital_name}**
-
-Olá {atendimento.nome_paciente}! 👋
-
-Você tem uma consulta agendada:
-📅 **Data:** {data_formatada}
-⏰ **Horário:** {hora_formatada}
-👨‍⚕️ **Médico:** {atendimento.nome_medico}
-🏥 **Especialidade:** {atendimento.especialidade}
-
-Aguardamos sua confirmação! 🙏
-
-📞 Para dúvidas: {hospital_phone}
-📍 Endereço: {endereco_completo}"""
-
             logger.info(
                 f"Enviando mensagem personalizada para subscriber {atendimento.subscriber_id}"
             )
@@ -537,6 +596,9 @@ Aguardamos sua confirmação! 🙏
         """
         Retorna subscriber_id pelo telefone, criando subscriber se não existir.
 
+        Consulta primeiro o cache SQLite (telefone → subscriber_id); só busca/cria
+        no Botconversa em caso de miss, e grava o resultado no cache.
+
         Args:
             telefone: Número (qualquer formatação; será normalizado para padrão)
             nome: Nome do paciente (será split em first_name / last_name)
@@ -547,8 +609,13 @@ Aguardamos sua confirmação! 🙏
         telefone = telefone_para_envio(telefone)
         if not telefone:
             return None
+        subscriber_id = obter_subscriber_id_em_cache(telefone)
+        if subscriber_id is not None:
+            logger.info(f"Subscriber {subscriber_id} obtido do cache para {telefone}")
+            return subscriber_id
         subscriber = self.buscar_subscriber(telefone)
         if subscriber and subscriber.get("id") is not None:
+            guardar_subscriber_id_em_cache(telefone, subscriber["id"])
             return subscriber["id"]
         partes = (nome or "").strip().split(maxsplit=1)
         primeiro_nome = partes[0] if partes else "Paciente"
@@ -557,9 +624,37 @@ Aguardamos sua confirmação! 🙏
             telefone=telefone, nome=primeiro_nome, sobrenome=sobrenome
         )
         if subscriber and subscriber.get("id") is not None:
+            guardar_subscriber_id_em_cache(telefone, subscriber["id"])
             return subscriber["id"]
         return None
 
+    def _enviar_mensagem_para_telefone(
+        self, telefone: str, nome: str, mensagem: str
+    ) -> Optional[int]:
+        """
+        Obtém/cria o subscriber e envia a mensagem; retorna o subscriber_id se enviou.
+
+        Se o Botconversa responder 404 (subscriber removido), descarta o cache
+        desse telefone e tenta uma vez com o subscriber resolvido novamente.
+        """
+        for tentativa in range(2):
+            subscriber_id = self.get_or_create_subscriber_id(telefone, nome or "Paciente")
+            if not subscriber_id:
+                logger.error(f"Não foi possível obter subscriber para telefone {telefone}")
+                return None
+            status = self._enviar_mensagem_status(subscriber_id, mensagem)
+            if status == 200:
+                return subscriber_id
+            if status != 404 or tentativa > 0:
+                return None
+            logger.warning(
+                f"Subscriber {subscriber_id} não encontrado (404); invalidando cache de {telefone}"
+            )
+            descartar_subscriber_do_cache(
+                telefone=telefone_para_envio(telefone), subscriber_id=subscriber_id
+            )
+        return None
+
     def enviar_mensagem_por_telefone(
         self, telefone: str, nome: str, mensagem: str
     ) -> bool:
@@ -568,11 +663,7 @@ Aguardamos sua confirmação! 🙏
 
         Usado para lembretes 48h/12h quando os dados vêm da view/SQLite.
         """
-        subscriber_id = self.get_or_create_subscriber_id(telefone, nome or "Paciente")
-        if not subscriber_id:
-            logger.error(f"Não foi possível obter subscriber para telefone {telefone}")
-            return False
-        return self.enviar_mensagem(subscriber_id, mensagem)
+        return self._enviar_mensagem_para_telefone(telefone, nome, mensagem) is not None
 
     def atualizar_subscriber_contexto_lembrete(
         self,
@@ -591,7 +682,7 @@ Aguardamos sua confirmação! 🙏
             body: dict = {"nr_sequencia": nr_sequencia}
             if nr_sequencia_agenda is not None:
                 body["nr_sequencia_agenda"] = nr_sequencia_agenda
-            response = requests.patch(
+            response = self.http.patch(
                 url, json=body, headers=self.headers, timeout=10
             )
             if response.status_code in (200, 201, 204):
@@ -624,16 +715,13 @@ Aguardamos sua confirmação! 🙏
 
         nr_sequencia_agenda (cd_agenda) identifica a agenda para não alterar a errada.
         """
-        subscriber_id = self.get_or_create_subscriber_id(telefone, nome or "Paciente")
-        if not subscriber_id:
-            logger.error(f"Não foi possível obter subscriber para telefone {telefone}")
+        subscriber_id = self._enviar_mensagem_para_telefone(telefone, nome, mensagem)
+        if subscriber_id is None:
             return False
-        ok = self.enviar_mensagem(subscriber_id, mensagem)
-        if ok:
-            self.atualizar_subscriber_contexto_lembrete(
-                subscriber_id, nr_sequencia, nr_sequencia_agenda
-            )
-        return ok
+        self.atualizar_subscriber_contexto_lembrete(
+            subscriber_id, nr_sequencia, nr_sequencia_agenda
+        )
+        return True
 
     def processar_resposta_paciente(self, telefone: str, resposta: str) -> bool:
         """
@@ -804,7 +892,7 @@ Aguardamos sua confirmação! 🙏
         try:
             logger.info("Listando campanhas ativas...")
 
-            response = requests.get(
+            response = self.http.get(
                 f"{self.base_url}/campaigns/",
                 headers=self.headers,
                 timeout=30,
@@ -842,7 +930,7 @@ Aguardamos sua confirmação! 🙏
                 f"Adicionando subscriber {subscriber_id} à campanha {campaign_id}"
             )
 
-            response = requests.post(
+            response = self.http.post(
                 f"{self.base_url}/subscriber/{subscriber_id}/campaigns/{campaign_id}/",
                 headers=self.headers,
                 timeout=30,
@@ -873,7 +961,7 @@ Aguardamos sua confirmação! 🙏
         try:
             logger.info("Listando fluxos disponíveis...")
 
-            response = requests.get(
+            response = self.http.get(
                 f"{self.base_url}/flows/",
                 headers=self.headers,
                 timeout=30,
@@ -914,7 +1002,7 @@ Aguardamos sua confirmação! 🙏
                 flow_data = {"flow": flow_id}
                 logger.info(f"Enviando fluxo com flow_id: {flow_id}")
 
-                response = requests.post(
+                response = self.http.post(
                     f"{self.base_url}/subscriber/{subscriber_id}/send_flow/",
                     json=flow_data,
                     headers=self.headers,
@@ -925,7 +1013,7 @@ Aguardamos sua confirmação! 🙏
                 logger.info(
                     "Enviando fluxo sem flow_id (usando fluxo padrão da campanha)"
                 )
-                response = requests.post(
+                response = self.http.post(
                     f"{self.base_url}/subscriber/{subscriber_id}/send_flow/",
                     headers=self.headers,
                     timeout=30,
@@ -2,19 +2,22 @@
 Serviço para o SQLite de envios de lembrete (48h e 12h).
 
 - Consulta quem já foi enviado (por nr_sequencia e tipo).
-- Insere novo envio após enviar via Botconversa.
+- Insere novo envio após enviar via Botconversa (um a um ou em lote, via write-behind).
 - Lista registros 48h que entram na janela de 12h e ainda não têm 12h enviado.
 """
 
 from datetime import datetime, timedelta
-from typing import List, Set
+from typing import Any, Dict, Iterable, List, Set
 
 from loguru import logger
-from sqlalchemy import and_, select
+from sqlalchemy import and_, exists, insert, select, text
+from sqlalchemy.orm import aliased
 from sqlalchemy.orm import Session
 
-from app.database.sqlite_envios import EnvioLembrete
-from app.utils.telefone import normalizar_telefone
+from app.config.config import settings
+from app.database.sqlite_envios import EnvioLembrete, get_sqlite_session
+from app.utils.telefone import normalizar_telefone, telefone_para_envio
+from app.utils.write_behind import BufferWriteBehind
 
 
 def nr_sequencias_ja_enviados_48h(session: Session) -> Set[int]:
@@ -31,6 +34,77 @@ def nr_sequencias_ja_enviados_48h(session: Session) -> Set[int]:
         return set()
 
 
+def nr_sequencias_pendentes_48h(session: Session, candidatos: Iterable[int]) -> Set[int]:
+    """
+    Retorna, dentre os nr_sequencia candidatos (linhas da view na janela), os que ainda
+    não tiveram lembrete 48H enviado.
+
+    Os candidatos (já filtrados pela janela) vão para uma tabela temporária e o diff
+    é um anti-join no SQLite por nr_sequencia, pelo índice ix_envios_tipo_seq_dt: o
+    custo depende do tamanho da janela, não do histórico. O envio anterior conta
+    qualquer que seja o dt_agenda gravado, então uma consulta remarcada (mesmo
+    nr_sequencia, nova data) não recebe um segundo lembrete 48H.
+    """
+    candidatos = list(candidatos)
+    if not candidatos:
+        return set()
+    try:
+        session.execute(
+            text(
+                "CREATE TEMP TABLE IF NOT EXISTS tmp_view_48h "
+                "(nr_sequencia INTEGER PRIMARY KEY)"
+            )
+        )
+        session.execute(text("DELETE FROM tmp_view_48h"))
+        session.execute(
+            text("INSERT OR IGNORE INTO tmp_view_48h (nr_sequencia) VALUES (:nr_sequencia)"),
+            [{"nr_sequencia": nr} for nr in candidatos],
+        )
+        result = session.execute(
+            text(
+                "SELECT t.nr_sequencia FROM tmp_view_48h t "
+                "WHERE NOT EXISTS ("
+                " SELECT 1 FROM envios_lembrete e"
+                " WHERE e.tipo_lembrete = '48H'"
+                " AND e.nr_sequencia = t.nr_sequencia"
+                ")"
+            )
+        )
+        pendentes = {r[0] for r in result.fetchall()}
+        session.execute(text("DELETE FROM tmp_view_48h"))
+        session.commit()
+        return pendentes
+    except Exception as e:
+        logger.error(f"Erro ao comparar view com envios 48h: {e}")
+        session.rollback()
+        raise
+
+
+def _dados_envio(
+    tipo_lembrete: str,
+    nr_sequencia: int,
+    dt_agenda: datetime | None,
+    nr_telefone: str | None,
+    nm_paciente: str | None,
+    nr_ddi: str | None = None,
+    nm_medico_externo: str | None = None,
+    cd_agenda: int | None = None,
+) -> Dict[str, Any]:
+    """Colunas de um registro de envio (48H/12H)."""
+    return {
+        "nr_sequencia": nr_sequencia,
+        "cd_agenda": cd_agenda,
+        "tipo_lembrete": tipo_lembrete,
+        "enviado_em": datetime.utcnow(),
+        "dt_agenda": dt_agenda,
+        "nr_telefone": nr_telefone,
+        "nr_telefone_envio": telefone_para_envio(nr_telefone, nr_ddi),
+        "nm_paciente": nm_paciente,
+        "nr_ddi": nr_ddi,
+        "nm_medico_externo": nm_medico_externo,
+    }
+
+
 def registrar_envio_48h(
     session: Session,
     nr_sequencia: int,
@@ -44,15 +118,10 @@ def registrar_envio_48h(
     """Registra envio de lembrete 48H no SQLite."""
     try:
         env = EnvioLembrete(
-            nr_sequencia=nr_sequencia,
-            cd_agenda=cd_agenda,
-            tipo_lembrete="48H",
-            enviado_em=datetime.utcnow(),
-            dt_agenda=dt_agenda,
-            nr_telefone=nr_telefone,
-            nm_paciente=nm_paciente,
-            nr_ddi=nr_ddi,
-            nm_medico_externo=nm_medico_externo,
+            **_dados_envio(
+                "48H", nr_sequencia, dt_agenda, nr_telefone, nm_paciente,
+                nr_ddi, nm_medico_externo, cd_agenda,
+            )
         )
         session.add(env)
         session.commit()
@@ -89,7 +158,12 @@ def listar_para_lembrete_12h(
     agora = datetime.utcnow()
     limite = agora + timedelta(hours=horas_janela)
     try:
-        ja_12h = nr_sequencias_ja_enviados_12h(session)
+        # Excluir os que já receberam 12H (anti-join no próprio SQLite)
+        envio_12h = aliased(EnvioLembrete)
+        ja_12h = exists().where(
+            envio_12h.tipo_lembrete == "12H",
+            envio_12h.nr_sequencia == EnvioLembrete.nr_sequencia,
+        )
         result = (
             session.query(EnvioLembrete)
             .where(
@@ -98,14 +172,12 @@ def listar_para_lembrete_12h(
                     EnvioLembrete.dt_agenda.isnot(None),
                     EnvioLembrete.dt_agenda >= agora,
                     EnvioLembrete.dt_agenda <= limite,
+                    ~ja_12h,
                 )
             )
             .order_by(EnvioLembrete.dt_agenda.asc())
             .all()
         )
-        # Excluir os que já receberam 12H
-        if ja_12h:
-            result = [r for r in result if r.nr_sequencia not in ja_12h]
         logger.info(f"Lembretes 12h a enviar: {len(result)}")
         return result
     except Exception as e:
@@ -121,20 +193,20 @@ def buscar_ultimo_envio_sem_resposta_por_telefone(
     Usado pelo webhook para obter nr_sequencia quando não vem no payload.
     """
     try:
-        tel_norm = normalizar_telefone(telefone)
-        if not tel_norm:
+        # Mesmo padrão gravado em nr_telefone_envio; também tenta só os dígitos, caso o
+        # número recebido já traga um DDI diferente do padrão
+        candidatos = {telefone_para_envio(telefone), normalizar_telefone(telefone)} - {""}
+        if not candidatos:
             return None
-        # Busca por nr_telefone normalizado (só dígitos) para aceitar qualquer formatação
-        todos = (
+        return (
             session.query(EnvioLembrete)
-            .where(EnvioLembrete.dt_resposta.is_(None))
+            .where(
+                EnvioLembrete.nr_telefone_envio.in_(candidatos),
+                EnvioLembrete.dt_resposta.is_(None),
+            )
             .order_by(EnvioLembrete.enviado_em.desc())
-            .all()
+            .first()
         )
-        for env in todos:
-            if normalizar_telefone(env.nr_telefone) == tel_norm:
-                return env
-        return None
     except Exception as e:
         logger.error(f"Erro ao buscar envio sem resposta por telefone: {e}")
         return None
@@ -177,15 +249,10 @@ def registrar_envio_12h(
     """Registra envio de lembrete 12H no SQLite."""
     try:
         env = EnvioLembrete(
-            nr_sequencia=nr_sequencia,
-            cd_agenda=cd_agenda,
-            tipo_lembrete="12H",
-            enviado_em=datetime.utcnow(),
-            dt_agenda=dt_agenda,
-            nr_telefone=nr_telefone,
-            nm_paciente=nm_paciente,
-            nr_ddi=nr_ddi,
-            nm_medico_externo=nm_medico_externo,
+            **_dados_envio(
+                "12H", nr_sequencia, dt_agenda, nr_telefone, nm_paciente,
+                nr_ddi, nm_medico_externo, cd_agenda,
+            )
         )
         session.add(env)
         session.commit()
@@ -194,3 +261,43 @@ def registrar_envio_12h(
         logger.error(f"Erro ao registrar envio 12H: {e}")
         session.rollback()
         raise
+
+
+# --- Registro em lote (write-behind) para os jobs de lembrete ---
+
+
+def _gravar_envios_lote(registros: List[Dict[str, Any]]) -> None:
+    """Insere um lote de envios com um único INSERT (executemany) e um único commit."""
+    session = get_sqlite_session()
+    try:
+        session.execute(insert(EnvioLembrete), registros)
+        session.commit()
+        logger.info(f"Registrados {len(registros)} envios de lembrete (lote)")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+buffer_envios = BufferWriteBehind(
+    "envios_lembrete",
+    _gravar_envios_lote,
+    max_itens=settings.sqlite_write_lote,
+    intervalo_ms=settings.sqlite_write_intervalo_ms,
+)
+
+
+def inserir_envio(session: Session, tipo_lembrete: str, **dados) -> None:
+    """Insere o registro de um envio na transação de `session` (sem commit)."""
+    session.execute(insert(EnvioLembrete).values(**_dados_envio(tipo_lembrete, **dados)))
+
+
+def enfileirar_envio(tipo_lembrete: str, **dados) -> None:
+    """
+    Enfileira o registro de um envio (48H/12H) no buffer write-behind.
+
+    Gravado em lote por tamanho/tempo; o job deve chamar buffer_envios.flush()
+    ao terminar, antes do próximo diff com a view.
+    """
+    buffer_envios.adicionar(_dados_envio(tipo_lembrete, **dados))
@@ -0,0 +1,263 @@
+"""
+Fila persistente (SQLite) de envios de lembrete ao Botconversa.
+
+Desacopla os jobs do scheduler (produtores) do envio HTTP (consumidores):
+- Os jobs 48h/12h só montam as mensagens e chamam enfileirar_envios().
+- PoolEnvioLembretes (settings.fila_envio_workers threads) reserva itens,
+  envia e, na mesma transação do SQLite, marca ENVIADO e registra o envio em
+  envios_lembrete.
+- Item reservado fica invisível por fila_envio_visibilidade_segundos; se o
+  worker não concluir (queda do processo), ele volta a ser reservável.
+- Depois de um envio confirmado pelo Botconversa, só a gravação da conclusão é
+  repetida (_concluir_sem_reenvio); se o registro em envios_lembrete continuar
+  falhando, o item é marcado ENVIADO sem ele. Erro de contabilidade nunca
+  devolve o item à fila, então a mensagem não é enviada duas vezes.
+- Falhas de envio voltam para PENDENTE com espera exponencial, até
+  fila_envio_max_tentativas; depois ficam FALHOU (terminal: enfileirar de novo
+  a mesma chave não reabre o item).
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from loguru import logger
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.config.config import settings
+from app.database import fila_sqlite
+from app.database.fila_sqlite import FALHOU, PENDENTE, espera_retentativa
+from app.database.sqlite_envios import FilaEnvio, get_sqlite_session
+from app.services.envios_lembrete_service import inserir_envio
+from app.utils.worker_pool import PoolWorkers
+
+ENVIADO = "ENVIADO"
+
+# Itens ENVIADO são mantidos por este período (deduplicação pela chave) e depois removidos
+_RETENCAO_CONCLUIDOS = timedelta(days=7)
+# Linhas por INSERT multi-valores (limite de variáveis do SQLite)
+_LOTE_INSERT = 500
+# Tentativas de gravar a conclusão de um item já enviado (espera 0,5s, 1s, 2s, ...)
+_TENTATIVAS_CONCLUSAO = 5
+
+
+def _serializar_dados(dados: Dict[str, Any]) -> str:
+    return json.dumps(
+        {k: v.isoformat() if isinstance(v, datetime) else v for k, v in dados.items()}
+    )
+
+
+def _desserializar_dados(texto: Optional[str]) -> Dict[str, Any]:
+    dados = json.loads(texto) if texto else {}
+    if dados.get("dt_agenda"):
+        dados["dt_agenda"] = datetime.fromisoformat(dados["dt_agenda"])
+    return dados
+
+
+def enfileirar_envios(itens: Iterable[Dict[str, Any]]) -> int:
+    """
+    Enfileira envios (upsert pela chave).
+
+    Cada item: chave, tipo_lembrete, nr_sequencia, cd_agenda, telefone, nome, mensagem
+    e dados (dict para registrar o envio). Chaves já na fila ficam como estão,
+    inclusive FALHOU (sem zerar tentativas a cada poll).
+
+    Returns:
+        Quantidade de itens submetidos
+    """
+    agora = datetime.utcnow()
+    linhas = [
+        {
+            "chave": item["chave"],
+            "tipo_lembrete": item["tipo_lembrete"],
+            "nr_sequencia": item["nr_sequencia"],
+            "cd_agenda": item.get("cd_agenda"),
+            "telefone": item["telefone"],
+            "nome": item.get("nome"),
+            "mensagem": item["mensagem"],
+            "dados": _serializar_dados(item.get("dados") or {}),
+            "status": PENDENTE,
+            "tentativas": 0,
+            "visivel_em": agora,
+            "criado_em": agora,
+            "atualizado_em": agora,
+        }
+        for item in itens
+    ]
+    if not linhas:
+        return 0
+    session = get_sqlite_session()
+    try:
+        for i in range(0, len(linhas), _LOTE_INSERT):
+            stmt = sqlite_insert(FilaEnvio).values(linhas[i : i + _LOTE_INSERT])
+            stmt = stmt.on_conflict_do_nothing(index_elements=[FilaEnvio.chave])
+            session.execute(stmt)
+        session.commit()
+        logger.info(f"Fila de envio: {len(linhas)} itens submetidos")
+        return len(linhas)
+    except Exception as e:
+        logger.error(f"Erro ao enfileirar envios: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def reservar_proximo_envio() -> Optional[FilaEnvio]:
+    """
+    Reserva atomicamente o próximo item visível (PENDENTE ou reserva expirada).
+
+    Retorna o item desanexado da sessão, ou None se não houver nada a enviar.
+    """
+    return fila_sqlite.reservar_proximo(FilaEnvio, settings.fila_envio_visibilidade_segundos)
+
+
+def _finalizar(item: FilaEnvio, **valores) -> None:
+    """Atualiza o item se a reserva ainda for deste worker."""
+    fila_sqlite.finalizar(FilaEnvio, item, **valores)
+
+
+def concluir_envio(item: FilaEnvio) -> None:
+    """
+    Marca o item como ENVIADO e registra o envio em envios_lembrete, na mesma transação.
+
+    Se a reserva já não for deste worker (expirou e outro worker pegou o item),
+    nada é gravado: o outro worker conclui.
+    """
+    session = get_sqlite_session()
+    try:
+        result = session.execute(
+            update(FilaEnvio)
+            .where(FilaEnvio.id == item.id, FilaEnvio.reservado_por == item.reservado_por)
+            .values(
+                status=ENVIADO,
+                reservado_por=None,
+                ultimo_erro=None,
+                atualizado_em=datetime.utcnow(),
+            )
+        )
+        if not result.rowcount:
+            session.rollback()
+            logger.warning(f"Fila de envio: reserva de {item.chave} expirou antes da conclusão")
+            return
+        inserir_envio(session, item.tipo_lembrete, **_desserializar_dados(item.dados))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _concluir_sem_reenvio(item: FilaEnvio) -> None:
+    """
+    Grava a conclusão de um item cuja mensagem já foi enviada.
+
+    Repete só concluir_envio (com espera exponencial, bem abaixo da visibilidade
+    da reserva). Se continuar falhando, marca o item ENVIADO sem o registro em
+    envios_lembrete: a chave continua deduplicando os próximos polls e o
+    paciente não recebe a mesma mensagem de novo.
+    """
+    erro: Optional[Exception] = None
+    for tentativa in range(1, _TENTATIVAS_CONCLUSAO + 1):
+        try:
+            concluir_envio(item)
+            return
+        except Exception as e:
+            erro = e
+            logger.warning(
+                f"Fila de envio: {item.chave} enviado, mas a conclusão falhou "
+                f"(tentativa {tentativa}/{_TENTATIVAS_CONCLUSAO}): {e}"
+            )
+            if tentativa < _TENTATIVAS_CONCLUSAO:
+                time.sleep(0.5 * 2 ** (tentativa - 1))
+    logger.error(
+        f"Fila de envio: {item.chave} enviado, mas não registrado em envios_lembrete; "
+        f"marcando ENVIADO para não reenviar ({erro})"
+    )
+    _finalizar(
+        item,
+        status=ENVIADO,
+        reservado_por=None,
+        ultimo_erro=f"Envio não registrado em envios_lembrete: {erro}",
+    )
+
+
+def falhar_envio(item: FilaEnvio, erro: str) -> None:
+    """Devolve o item à fila com espera exponencial ou marca FALHOU após o limite."""
+    if item.tentativas >= settings.fila_envio_max_tentativas:
+        logger.error(
+            f"Fila de envio: {item.chave} falhou {item.tentativas} vezes, desistindo ({erro})"
+        )
+        _finalizar(item, status=FALHOU, reservado_por=None, ultimo_erro=erro)
+        return
+    espera = espera_retentativa(item.tentativas)
+    logger.warning(
+        f"Fila de envio: {item.chave} falhou (tentativa {item.tentativas}), "
+        f"nova tentativa em {int(espera.total_seconds())}s ({erro})"
+    )
+    _finalizar(
+        item,
+        status=PENDENTE,
+        reservado_por=None,
+        ultimo_erro=erro,
+        visivel_em=datetime.utcnow() + espera,
+    )
+
+
+def limpar_envios_concluidos() -> int:
+    """Remove itens ENVIADO mais antigos que a retenção. Retorna quantos foram removidos."""
+    try:
+        return fila_sqlite.limpar_concluidos(FilaEnvio, ENVIADO, _RETENCAO_CONCLUIDOS)
+    except Exception as e:
+        logger.warning(f"Erro ao limpar fila de envio: {e}")
+        return 0
+
+
+def contar_fila_por_status() -> Dict[str, int]:
+    """Quantidade de itens na fila por status."""
+    return fila_sqlite.contar_por_status(FilaEnvio)
+
+
+class PoolEnvioLembretes(PoolWorkers):
+    """Workers que enviam os lembretes da fila pelo BotconversaService (síncrono)."""
+
+    def reservar(self) -> Optional[FilaEnvio]:
+        return reservar_proximo_envio()
+
+    def processar(self, item: FilaEnvio) -> None:
+        from app.services.botconversa_service import BotconversaService
+
+        try:
+            ok = BotconversaService(None).enviar_mensagem_por_telefone_com_nr_sequencia(
+                item.telefone,
+                item.nome or "Paciente",
+                item.mensagem,
+                item.nr_sequencia,
+                nr_sequencia_agenda=item.cd_agenda,
+            )
+        except Exception as e:
+            falhar_envio(item, str(e))
+            raise
+        if not ok:
+            falhar_envio(item, "Botconversa não confirmou o envio")
+            return
+        # Daqui em diante a mensagem já saiu: falhas não devolvem o item à fila
+        _concluir_sem_reenvio(item)
+
+    def snapshot(self) -> Dict[str, Any]:
+        dados = super().snapshot()
+        try:
+            dados["fila"] = contar_fila_por_status()
+        except Exception as e:
+            dados["fila"] = {"erro": str(e)}
+        return dados
+
+
+pool_envio = PoolEnvioLembretes(
+    "fila-envio",
+    num_workers=settings.fila_envio_workers,
+    intervalo_ocioso=settings.fila_envio_intervalo_ocioso_segundos,
+)
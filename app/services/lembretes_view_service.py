@@ -3,120 +3,298 @@ Orquestração dos lembretes 48h e 12h: view + SQLite + Botconversa.
 
 - 48h: lê da view → compara com SQLite → envia → grava no SQLite.
 - 12h: lê só do SQLite (quem já recebeu 48h e está na janela 12h) → envia → grava 12h no SQLite.
+
+Os envios de cada rodada são feitos em paralelo pelo AsyncBotconversaService,
+limitados a settings.lembretes_concorrencia pacientes simultâneos. Com
+settings.fila_envio_habilitada, os jobs só enfileiram (fila_envio_service) e
+os workers da fila fazem o envio e o registro.
+
+Com settings.database_async_habilitado, o job 48h lê a view pelo engine
+assíncrono (AsyncSession) no event loop da aplicação.
 """
 
+import asyncio
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.config.config import settings
-from app.database.manager import get_db
+from app.database.manager import db_manager, executar_no_loop_async, get_db
 from app.database.sqlite_envios import get_sqlite_session
-from app.services.botconversa_service import BotconversaService
+from app.services.botconversa_async_service import AsyncBotconversaService
 from app.services.envios_lembrete_service import (
+    buffer_envios,
+    enfileirar_envio,
     listar_para_lembrete_12h,
-    nr_sequencias_ja_enviados_48h,
-    registrar_envio_48h,
-    registrar_envio_12h,
+    nr_sequencias_pendentes_48h,
+)
+from app.services.fila_envio_service import (
+    enfileirar_envios,
+    limpar_envios_concluidos,
+    pool_envio,
 )
-from app.services.view_confirmacao_service import listar_view_confirmacao_48h
-from app.utils.telefone import telefone_para_envio
+from app.services.templates_mensagem import campos_mensagem, renderizar_lote
+from app.services.view_confirmacao_service import (
+    LinhaViewConfirmacao,
+    iterar_view_confirmacao_48h,
+    iterar_view_confirmacao_48h_async,
+    listar_view_confirmacao_48h_incremental,
+    listar_view_confirmacao_48h_incremental_async,
+    salvar_watermark_view,
+)
+from app.utils.telefone import telefones_para_envio
+
 
+def _limites_janela_48h(horas_min: int = 36, horas_max: int = 50) -> Tuple[datetime, datetime]:
+    """Limites (inferior, superior) da janela de lembrete 48h a partir de agora."""
+    # Considera dt sem timezone; compara com now local
+    agora = datetime.now()
+    return agora + timedelta(hours=horas_min), agora + timedelta(hours=horas_max)
 
-def _mensagem_lembrete_48h(nome: str, dt_agenda: Optional[datetime], medico: Optional[str]) -> str:
-    hospital_phone = settings.hospital_phone or "(31) 3238-8100"
-    data_fmt = dt_agenda.strftime("%d/%m/%Y") if dt_agenda else ""
-    hora_fmt = dt_agenda.strftime("%H:%M") if dt_agenda else ""
-    medico_txt = f"Dr. {medico}" if medico else "médico"
-    return f"""🔔 **LEMBRETE IMPORTANTE**, {nome or 'Paciente'}!
 
-Sua consulta está marcada para **AMANHÃ**:
-📅 {data_fmt} às {hora_fmt}
-👨‍⚕️ {medico_txt}
+def _na_janela_48h(row: LinhaViewConfirmacao, limite_inf: datetime, limite_sup: datetime) -> bool:
+    # Só processar quem está na janela de 48h (evita enviar para consulta daqui a 7 dias)
+    dt = row.dt_agenda or row.dt_consulta
+    return bool(dt) and limite_inf <= dt <= limite_sup
 
-Por favor, confirme sua presença:
-✅ SIM - Vou comparecer
-❌ NÃO - Preciso cancelar
 
-📞 Para dúvidas: {hospital_phone}"""
+def _separar_janela_48h(
+    linhas: Iterable[LinhaViewConfirmacao], limite_inf: datetime, limite_sup: datetime
+) -> Tuple[int, List[LinhaViewConfirmacao]]:
+    """Consome as linhas da view em streaming. Retorna (total lido, linhas na janela)."""
+    total = 0
+    na_janela = []
+    for row in linhas:
+        total += 1
+        if _na_janela_48h(row, limite_inf, limite_sup):
+            na_janela.append(row)
+    return total, na_janela
 
 
-def _mensagem_lembrete_12h(nome: str, dt_agenda: Optional[datetime], medico: Optional[str]) -> str:
-    hospital_phone = settings.hospital_phone or "(31) 3238-8100"
-    hora_fmt = dt_agenda.strftime("%H:%M") if dt_agenda else ""
-    medico_txt = f"Dr. {medico}" if medico else "médico"
-    return f"""⚠️ **ÚLTIMO LEMBRETE**, {nome or 'Paciente'}!
+async def _separar_janela_48h_async(
+    db: AsyncSession,
+    linhas: AsyncIterator[LinhaViewConfirmacao],
+    limite_inf: datetime,
+    limite_sup: datetime,
+) -> Tuple[int, List[LinhaViewConfirmacao]]:
+    """_separar_janela_48h para a leitura pelo engine assíncrono (fecha a sessão ao final)."""
+    try:
+        total = 0
+        na_janela = []
+        async for row in linhas:
+            total += 1
+            if _na_janela_48h(row, limite_inf, limite_sup):
+                na_janela.append(row)
+        return total, na_janela
+    finally:
+        await db.close()
 
-Sua consulta é **HOJE** às {hora_fmt}:
-👨‍⚕️ {medico_txt}
 
-Confirme sua presença AGORA:
-✅ SIM - Vou comparecer
-❌ NÃO - Preciso cancelar
+class _LembretePendente(NamedTuple):
+    """Um envio de lembrete já montado, aguardando a chamada ao Botconversa."""
 
-📞 Para dúvidas: {hospital_phone}"""
+    origem: Any  # linha da view (48h) ou EnvioLembrete (12h)
+    telefone: str
+    nome: str
+    mensagem: str
+    nr_sequencia: int
+    cd_agenda: Optional[int]
+    registro: Dict[str, Any]  # campos para registrar o envio em envios_lembrete
 
 
-def _na_janela_48h(dt: Optional[datetime], horas_min: int = 36, horas_max: int = 50) -> bool:
-    """True se dt está na janela de lembrete 48h (entre horas_min e horas_max à frente)."""
-    if not dt:
-        return False
-    # Considera dt sem timezone; compara com now local
-    agora = datetime.now()
-    limite_inf = agora + timedelta(hours=horas_min)
-    limite_sup = agora + timedelta(hours=horas_max)
-    return limite_inf <= dt <= limite_sup
+async def _enviar_lembretes_async(
+    pendentes: List[_LembretePendente],
+    tipo: str,
+    registrar: Callable[[_LembretePendente], None],
+) -> List[int]:
+    """
+    Envia os lembretes em paralelo (limitado por semáforo) e registra os enviados.
+
+    Returns:
+        nr_sequencia dos lembretes que não foram enviados/registrados
+    """
+    semaforo = asyncio.Semaphore(max(settings.lembretes_concorrencia, 1))
+    falhas: List[int] = []
+
+    async with AsyncBotconversaService() as bot:
+
+        async def _enviar(item: _LembretePendente) -> None:
+            async with semaforo:
+                try:
+                    ok = await bot.enviar_mensagem_por_telefone_com_nr_sequencia(
+                        item.telefone,
+                        item.nome,
+                        item.mensagem,
+                        item.nr_sequencia,
+                        nr_sequencia_agenda=item.cd_agenda,
+                    )
+                except Exception as e:
+                    logger.error(f"Erro ao enviar {tipo} nr_sequencia={item.nr_sequencia}: {e}")
+                    ok = False
+            if not ok:
+                logger.error(f"Falha ao enviar {tipo} nr_sequencia={item.nr_sequencia}")
+                falhas.append(item.nr_sequencia)
+                return
+            # Registro vai para o buffer write-behind (gravado em lote no SQLite)
+            try:
+                registrar(item)
+            except Exception as e:
+                logger.error(f"Erro ao registrar {tipo} nr_sequencia={item.nr_sequencia}: {e}")
+                falhas.append(item.nr_sequencia)
+
+        await asyncio.gather(*(_enviar(item) for item in pendentes))
+
+    return falhas
+
+
+def _enviar_lembretes(
+    pendentes: List[_LembretePendente],
+    tipo: str,
+    registrar: Callable[[_LembretePendente], None],
+) -> List[int]:
+    """
+    Executa a rodada de envios assíncronos a partir do job (síncrono) do scheduler.
+
+    Returns:
+        nr_sequencia dos lembretes que falharam
+    """
+    if not pendentes:
+        return []
+    falhas = asyncio.run(_enviar_lembretes_async(pendentes, tipo, registrar))
+    logger.info(
+        f"Lembretes {tipo}: {len(pendentes) - len(falhas)}/{len(pendentes)} enviados "
+        f"(concorrência={settings.lembretes_concorrencia})"
+    )
+    return falhas
+
+
+def _despachar_lembretes(pendentes: List[_LembretePendente], tipo_lembrete: str) -> List[int]:
+    """
+    Entrega os lembretes montados: na fila persistente (fila_envio_habilitada)
+    ou enviando direto nesta rodada do job.
+
+    Returns:
+        nr_sequencia dos lembretes que falharam (sempre vazio com a fila: o item
+        fica gravado nela e é repetido pelos workers)
+    """
+    if not settings.fila_envio_habilitada:
+        return _enviar_lembretes(
+            pendentes,
+            tipo_lembrete.lower(),
+            lambda item: enfileirar_envio(tipo_lembrete, **item.registro),
+        )
+    if not pendentes:
+        return []
+    enfileirar_envios(
+        {
+            "chave": f"{tipo_lembrete}:{item.nr_sequencia}",
+            "tipo_lembrete": tipo_lembrete,
+            "nr_sequencia": item.nr_sequencia,
+            "cd_agenda": item.cd_agenda,
+            "telefone": item.telefone,
+            "nome": item.nome,
+            "mensagem": item.mensagem,
+            "dados": item.registro,
+        }
+        for item in pendentes
+    )
+    pool_envio.notificar()
+    limpar_envios_concluidos()
+    return []
 
 
 def executar_job_lembretes_48h() -> None:
     """
     Job 48h: view → filtrar janela 48h → diff SQLite → enviar → gravar no SQLite.
+
+    Com view_poll_modo_incremental, a janela é filtrada no SQL e só linhas novas/alteradas
+    desde o último poll são lidas; o watermark é gravado ao final da rodada.
+    Com database_async_habilitado a leitura da view roda no engine assíncrono.
     """
-    db_main = next(get_db())
+    db_main = None
     sqlite_session = get_sqlite_session()
-    bot = BotconversaService(db_main)
+    leitura = None
     try:
-        linhas_view = listar_view_confirmacao_48h(db_main)
-        # Só processar quem está na janela de 48h (evita enviar para consulta daqui a 7 dias)
-        na_janela = [r for r in linhas_view if _na_janela_48h(r.dt_agenda or r.dt_consulta)]
-        ja_48h = nr_sequencias_ja_enviados_48h(sqlite_session)
-        a_enviar = [r for r in na_janela if r.nr_sequencia not in ja_48h]
+        # Linhas consumidas em streaming: só as da janela ficam em memória
+        limite_inf, limite_sup = _limites_janela_48h()
+        if settings.database_async_habilitado:
+            db_async = db_manager.get_async_session()
+            if settings.view_poll_modo_incremental:
+                leitura = listar_view_confirmacao_48h_incremental_async(db_async, sqlite_session)
+                linhas_async = leitura.linhas
+            else:
+                linhas_async = iterar_view_confirmacao_48h_async(db_async)
+            total_view, na_janela = executar_no_loop_async(
+                _separar_janela_48h_async(db_async, linhas_async, limite_inf, limite_sup)
+            )
+        else:
+            db_main = next(get_db())
+            if settings.view_poll_modo_incremental:
+                leitura = listar_view_confirmacao_48h_incremental(db_main, sqlite_session)
+                linhas_view = leitura.linhas
+            else:
+                linhas_view = iterar_view_confirmacao_48h(db_main)
+            total_view, na_janela = _separar_janela_48h(linhas_view, limite_inf, limite_sup)
+        # Diff com o já enviado: anti-join no SQLite só com as linhas da janela
+        nao_enviados = nr_sequencias_pendentes_48h(
+            sqlite_session, (r.nr_sequencia for r in na_janela)
+        )
+        a_enviar = [r for r in na_janela if r.nr_sequencia in nao_enviados]
         logger.info(
-            f"Lembretes 48h: view={len(linhas_view)}, na_janela_48h={len(na_janela)}, "
-            f"já enviados={len(ja_48h)}, a enviar={len(a_enviar)}"
+            f"Lembretes 48h: view={total_view}, na_janela_48h={len(na_janela)}, "
+            f"já enviados={len(na_janela) - len(a_enviar)}, a enviar={len(a_enviar)}"
+        )
+        telefones = telefones_para_envio(
+            [r.nr_telefone for r in a_enviar], [r.nr_ddi for r in a_enviar]
         )
-        for row in a_enviar:
-            telefone = telefone_para_envio(row.nr_telefone, row.nr_ddi)
+        validos = []
+        for row, telefone in zip(a_enviar, telefones):
             if not telefone:
                 logger.warning(f"nr_sequencia={row.nr_sequencia} sem telefone, ignorando")
                 continue
-            mensagem = _mensagem_lembrete_48h(
-                row.nm_paciente, row.dt_agenda or row.dt_consulta, row.nm_medico_externo
-            )
-            cd_agenda = getattr(row, "cd_agenda", None)
-            if bot.enviar_mensagem_por_telefone_com_nr_sequencia(
-                telefone,
-                row.nm_paciente or "Paciente",
-                mensagem,
-                row.nr_sequencia,
-                nr_sequencia_agenda=cd_agenda,
-            ):
-                registrar_envio_48h(
-                    sqlite_session,
+            validos.append((row, telefone))
+        mensagens = renderizar_lote(
+            "lembrete_48h",
+            (
+                campos_mensagem(row.nm_paciente, row.dt_agenda or row.dt_consulta, row.nm_medico_externo)
+                for row, _ in validos
+            ),
+        )
+        pendentes = []
+        for (row, telefone), mensagem in zip(validos, mensagens):
+            pendentes.append(
+                _LembretePendente(
+                    origem=row,
+                    telefone=telefone,
+                    nome=row.nm_paciente or "Paciente",
+                    mensagem=mensagem,
                     nr_sequencia=row.nr_sequencia,
-                    dt_agenda=row.dt_agenda or row.dt_consulta,
-                    nr_telefone=row.nr_telefone,
-                    nm_paciente=row.nm_paciente,
-                    nr_ddi=row.nr_ddi,
-                    nm_medico_externo=row.nm_medico_externo,
-                    cd_agenda=cd_agenda,
+                    cd_agenda=row.cd_agenda,
+                    registro={
+                        "nr_sequencia": row.nr_sequencia,
+                        "dt_agenda": row.dt_agenda or row.dt_consulta,
+                        "nr_telefone": row.nr_telefone,
+                        "nm_paciente": row.nm_paciente,
+                        "nr_ddi": row.nr_ddi,
+                        "nm_medico_externo": row.nm_medico_externo,
+                        "cd_agenda": row.cd_agenda,
+                    },
                 )
-            else:
-                logger.error(f"Falha ao enviar 48h nr_sequencia={row.nr_sequencia}")
+            )
+
+        falhas = _despachar_lembretes(pendentes, "48H")
+        # Grava os envios ainda no buffer antes do watermark e do próximo diff com a view.
+        # Se falhar, o job termina com erro sem avançar o watermark.
+        buffer_envios.flush(levantar_erro=True)
+        if leitura is not None:
+            salvar_watermark_view(sqlite_session, leitura.watermark, falhas)
     finally:
-        db_main.close()
+        buffer_envios.flush()
+        if db_main is not None:
+            db_main.close()
         sqlite_session.close()
 
 
@@ -124,40 +302,47 @@ def executar_job_lembretes_12h() -> None:
     """
     Job 12h: só SQLite → enviar → gravar 12h no SQLite.
     """
-    db_main = next(get_db())
     sqlite_session = get_sqlite_session()
-    bot = BotconversaService(db_main)
     try:
         lista = listar_para_lembrete_12h(sqlite_session, horas_janela=12)
         logger.info(f"Lembretes 12h a enviar: {len(lista)}")
-        for env in lista:
-            telefone = telefone_para_envio(env.nr_telefone, env.nr_ddi)
+        telefones = telefones_para_envio(
+            [e.nr_telefone for e in lista], [e.nr_ddi for e in lista]
+        )
+        validos = []
+        for env, telefone in zip(lista, telefones):
             if not telefone:
                 logger.warning(f"nr_sequencia={env.nr_sequencia} sem telefone, ignorando")
                 continue
-            mensagem = _mensagem_lembrete_12h(
-                env.nm_paciente, env.dt_agenda, env.nm_medico_externo
-            )
-            cd_agenda = getattr(env, "cd_agenda", None)
-            if bot.enviar_mensagem_por_telefone_com_nr_sequencia(
-                telefone,
-                env.nm_paciente or "Paciente",
-                mensagem,
-                env.nr_sequencia,
-                nr_sequencia_agenda=cd_agenda,
-            ):
-                registrar_envio_12h(
-                    sqlite_session,
+            validos.append((env, telefone))
+        mensagens = renderizar_lote(
+            "lembrete_12h",
+            (campos_mensagem(env.nm_paciente, env.dt_agenda, env.nm_medico_externo) for env, _ in validos),
+        )
+        pendentes = []
+        for (env, telefone), mensagem in zip(validos, mensagens):
+            pendentes.append(
+                _LembretePendente(
+                    origem=env,
+                    telefone=telefone,
+                    nome=env.nm_paciente or "Paciente",
+                    mensagem=mensagem,
                     nr_sequencia=env.nr_sequencia,
-                    dt_agenda=env.dt_agenda,
-                    nr_telefone=env.nr_telefone,
-                    nm_paciente=env.nm_paciente,
-                    nr_ddi=env.nr_ddi,
-                    nm_medico_externo=env.nm_medico_externo,
-                    cd_agenda=cd_agenda,
+                    cd_agenda=getattr(env, "cd_agenda", None),
+                    registro={
+                        "nr_sequencia": env.nr_sequencia,
+                        "dt_agenda": env.dt_agenda,
+                        "nr_telefone": env.nr_telefone,
+                        "nm_paciente": env.nm_paciente,
+                        "nr_ddi": env.nr_ddi,
+                        "nm_medico_externo": env.nm_medico_externo,
+                        "cd_agenda": getattr(env, "cd_agenda", None),
+                    },
                 )
-            else:
-                logger.error(f"Falha ao enviar 12h nr_sequencia={env.nr_sequencia}")
+            )
+
+        _despachar_lembretes(pendentes, "12H")
+        buffer_envios.flush(levantar_erro=True)
     finally:
-        db_main.close()
+        buffer_envios.flush()
         sqlite_session.close()
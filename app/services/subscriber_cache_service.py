@@ -0,0 +1,174 @@
+"""
+Cache persistente (SQLite) de telefone → subscriber_id do Botconversa.
+
+- Consulta o cache antes do GET get_by_phone (uma chamada à API a menos por lembrete).
+- Expira entradas antigas (TTL) e poda as menos usadas (LRU) acima do limite
+  (verificado a cada _ESCRITAS_POR_PODA gravações, não em toda gravação).
+- Invalida a entrada (e os campos conhecidos do subscriber) quando o Botconversa
+  responde 404 para o subscriber.
+
+Falhas no cache nunca interrompem o envio: são logadas e tratadas como "miss".
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.config.config import settings
+from app.database.sqlite_envios import SubscriberCache, get_sqlite_session
+from app.services.subscriber_enriquecimento_service import descartar_valores_conhecidos
+
+# Só regrava ultimo_acesso se o último registro for mais antigo que isso (evita 1 escrita por hit)
+_GRANULARIDADE_LRU = timedelta(hours=1)
+# A poda LRU (COUNT + DELETE) roda uma vez a cada tantas gravações
+_ESCRITAS_POR_PODA = 100
+_escritas_desde_poda = _ESCRITAS_POR_PODA - 1  # primeira gravação do processo já verifica
+_escritas_lock = threading.Lock()
+
+
+def buscar_subscriber_id_cache(session: Session, telefone: str) -> Optional[int]:
+    """Retorna o subscriber_id em cache para o telefone (já normalizado) ou None."""
+    try:
+        item = session.get(SubscriberCache, telefone)
+        if item is None:
+            return None
+        agora = datetime.utcnow()
+        if item.criado_em < agora - timedelta(hours=settings.subscriber_cache_ttl_horas):
+            session.delete(item)
+            session.commit()
+            return None
+        if item.ultimo_acesso < agora - _GRANULARIDADE_LRU:
+            item.ultimo_acesso = agora
+            session.commit()
+        return item.subscriber_id
+    except Exception as e:
+        logger.warning(f"Erro ao consultar cache de subscriber ({telefone}): {e}")
+        session.rollback()
+        return None
+
+
+def salvar_subscriber_id_cache(session: Session, telefone: str, subscriber_id: int) -> None:
+    """Grava (ou atualiza) telefone → subscriber_id e poda o excedente por LRU."""
+    try:
+        agora = datetime.utcnow()
+        session.merge(
+            SubscriberCache(
+                telefone=telefone,
+                subscriber_id=subscriber_id,
+                criado_em=agora,
+                ultimo_acesso=agora,
+            )
+        )
+        session.commit()
+        if _deve_podar():
+            _podar_lru(session)
+    except Exception as e:
+        logger.warning(f"Erro ao gravar cache de subscriber ({telefone}): {e}")
+        session.rollback()
+
+
+def invalidar_subscriber_cache(
+    session: Session,
+    telefone: Optional[str] = None,
+    subscriber_id: Optional[int] = None,
+) -> None:
+    """Remove do cache as entradas do telefone e/ou do subscriber_id informado."""
+    try:
+        if telefone:
+            session.execute(delete(SubscriberCache).where(SubscriberCache.telefone == telefone))
+        if subscriber_id is not None:
+            session.execute(
+                delete(SubscriberCache).where(SubscriberCache.subscriber_id == subscriber_id)
+            )
+            descartar_valores_conhecidos(session, subscriber_id)
+        session.commit()
+        logger.info(
+            f"Cache de subscriber invalidado (telefone={telefone}, subscriber_id={subscriber_id})"
+        )
+    except Exception as e:
+        logger.warning(f"Erro ao invalidar cache de subscriber: {e}")
+        session.rollback()
+
+
+def _deve_podar() -> bool:
+    global _escritas_desde_poda
+    with _escritas_lock:
+        _escritas_desde_poda += 1
+        if _escritas_desde_poda < _ESCRITAS_POR_PODA:
+            return False
+        _escritas_desde_poda = 0
+        return True
+
+
+def _podar_lru(session: Session) -> None:
+    """Remove as entradas menos usadas quando o cache passa de subscriber_cache_max_itens."""
+    limite = settings.subscriber_cache_max_itens
+    total = session.execute(select(func.count()).select_from(SubscriberCache)).scalar() or 0
+    excedente = total - limite
+    if excedente <= 0:
+        return
+    antigos = (
+        select(SubscriberCache.telefone)
+        .order_by(SubscriberCache.ultimo_acesso.asc())
+        .limit(excedente)
+        .scalar_subquery()
+    )
+    session.execute(delete(SubscriberCache).where(SubscriberCache.telefone.in_(antigos)))
+    session.commit()
+    logger.info(f"Cache de subscriber: {excedente} entradas removidas (LRU)")
+
+
+# --- Atalhos com sessão própria (usados pelos serviços do Botconversa) ---
+
+
+def _abrir_sessao() -> Optional[Session]:
+    try:
+        return get_sqlite_session()
+    except Exception as e:
+        logger.warning(f"Cache de subscriber indisponível (SQLite): {e}")
+        return None
+
+
+def obter_subscriber_id_em_cache(telefone: str) -> Optional[int]:
+    """Consulta o cache abrindo/fechando uma sessão SQLite própria."""
+    if not settings.subscriber_cache_habilitado or not telefone:
+        return None
+    session = _abrir_sessao()
+    if session is None:
+        return None
+    try:
+        return buscar_subscriber_id_cache(session, telefone)
+    finally:
+        session.close()
+
+
+def guardar_subscriber_id_em_cache(telefone: str, subscriber_id: int) -> None:
+    """Grava no cache abrindo/fechando uma sessão SQLite própria."""
+    if not settings.subscriber_cache_habilitado or not telefone:
+        return
+    session = _abrir_sessao()
+    if session is None:
+        return
+    try:
+        salvar_subscriber_id_cache(session, telefone, subscriber_id)
+    finally:
+        session.close()
+
+
+def descartar_subscriber_do_cache(
+    telefone: Optional[str] = None, subscriber_id: Optional[int] = None
+) -> None:
+    """Invalida o cache abrindo/fechando uma sessão SQLite própria."""
+    if not settings.subscriber_cache_habilitado:
+        return
+    session = _abrir_sessao()
+    if session is None:
+        return
+    try:
+        invalidar_subscriber_cache(session, telefone=telefone, subscriber_id=subscriber_id)
+    finally:
+        session.close()
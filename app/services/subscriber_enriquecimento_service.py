@@ -0,0 +1,110 @@
+"""
+Enriquecimento de subscriber do Botconversa (etiquetas, campos e campanha).
+
+Define a especificação declarativa usada por BotconversaService.enriquecer_subscriber
+e o registro (SQLite) dos valores já aplicados em cada subscriber, para que
+chamadas repetidas não reenviem etiquetas/campos que já estão gravados.
+
+Falhas no registro nunca interrompem o fluxo: são logadas e tratadas como
+"valor desconhecido" (a chamada à API é feita normalmente).
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import delete, select
+
+from app.config.config import settings
+from app.database.sqlite_envios import SubscriberCampoConhecido, get_sqlite_session
+
+# IDs fixos no Botconversa
+ETIQUETA_SUBSCRIBER_ID = 15362464
+CAMPO_SUBSCRIBER_ID = 4336343
+CAMPO_ID_TABELA = 4373358
+CAMPO_NR_SEQ_AGENDA = 4373360
+CAMPANHA_CONFIRMACAO_CONSULTAS = 289860
+
+
+class EnriquecimentoSubscriber(NamedTuple):
+    """O que deve estar aplicado no subscriber: etiquetas, campos {field_id: valor} e campanha."""
+
+    etiquetas: Tuple[int, ...] = ()
+    campos: Optional[Dict[int, str]] = None
+    campanha_id: Optional[int] = None
+
+    def operacoes(self) -> Dict[str, str]:
+        """Retorna {chave: valor} de cada chamada à API descrita pela especificação."""
+        ops = {f"etiqueta:{tag_id}": "1" for tag_id in self.etiquetas}
+        for field_id, valor in (self.campos or {}).items():
+            ops[f"campo:{field_id}"] = str(valor)
+        if self.campanha_id is not None:
+            ops[f"campanha:{self.campanha_id}"] = "1"
+        return ops
+
+
+def enriquecimento_padrao(subscriber_id: int) -> EnriquecimentoSubscriber:
+    """Etiqueta e campo 'subscriber_id' aplicados a todo subscriber recém-criado."""
+    return EnriquecimentoSubscriber(
+        etiquetas=(ETIQUETA_SUBSCRIBER_ID,),
+        campos={CAMPO_SUBSCRIBER_ID: str(subscriber_id)},
+    )
+
+
+def carregar_valores_conhecidos(subscriber_id: int) -> Dict[str, str]:
+    """Retorna {chave: valor} já aplicados no subscriber (dentro do TTL do cache)."""
+    if not settings.subscriber_cache_habilitado:
+        return {}
+    session = None
+    try:
+        session = get_sqlite_session()
+        limite = datetime.utcnow() - timedelta(hours=settings.subscriber_cache_ttl_horas)
+        linhas = session.execute(
+            select(SubscriberCampoConhecido.chave, SubscriberCampoConhecido.valor).where(
+                SubscriberCampoConhecido.subscriber_id == subscriber_id,
+                SubscriberCampoConhecido.atualizado_em >= limite,
+            )
+        ).all()
+        return {chave: valor for chave, valor in linhas}
+    except Exception as e:
+        logger.warning(f"Erro ao consultar campos conhecidos do subscriber {subscriber_id}: {e}")
+        return {}
+    finally:
+        if session is not None:
+            session.close()
+
+
+def registrar_valores_conhecidos(subscriber_id: int, valores: Dict[str, str]) -> None:
+    """Grava (ou atualiza) os valores aplicados com sucesso no subscriber."""
+    if not settings.subscriber_cache_habilitado or not valores:
+        return
+    session = None
+    try:
+        session = get_sqlite_session()
+        agora = datetime.utcnow()
+        for chave, valor in valores.items():
+            session.merge(
+                SubscriberCampoConhecido(
+                    subscriber_id=subscriber_id,
+                    chave=chave,
+                    valor=valor,
+                    atualizado_em=agora,
+                )
+            )
+        session.commit()
+    except Exception as e:
+        logger.warning(f"Erro ao gravar campos conhecidos do subscriber {subscriber_id}: {e}")
+        if session is not None:
+            session.rollback()
+    finally:
+        if session is not None:
+            session.close()
+
+
+def descartar_valores_conhecidos(session, subscriber_id: int) -> None:
+    """Remove os valores registrados do subscriber (na sessão informada, sem commit)."""
+    session.execute(
+        delete(SubscriberCampoConhecido).where(
+            SubscriberCampoConhecido.subscriber_id == subscriber_id
+        )
+    )
@@ -0,0 +1,181 @@
+"""
+Templates das mensagens de consulta e lembrete (Botconversa).
+
+Cada template nomeado (TEMPLATES) é compilado uma vez por processo:
+- os dados constantes do hospital (nome, telefone, endereço) são lidos de
+  settings e embutidos no texto na compilação;
+- o restante vira uma string de formato com os campos do paciente em ordem,
+  renderizada em uma única passada (operador %).
+
+Uso:
+
+    campos = campos_mensagem(nome, dt_consulta, medico)
+    mensagem = renderizar_mensagem("lembrete_48h", campos)
+    mensagens = renderizar_lote("lembrete_48h", lista_de_campos)  # rodada inteira
+
+Campos por paciente: nome, data, hora, medico, medico_txt, especialidade.
+Constantes: hospital_nome, hospital_telefone, hospital_endereco.
+"""
+
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from app.config.config import settings
+
+TEMPLATES: Dict[str, str] = {
+    "lembrete_48h": """🔔 **LEMBRETE IMPORTANTE**, {nome}!
+
+Sua consulta está marcada para **AMANHÃ**:
+📅 {data} às {hora}
+👨‍⚕️ {medico_txt}
+
+Por favor, confirme sua presença:
+✅ SIM - Vou comparecer
+❌ NÃO - Preciso cancelar
+
+📞 Para dúvidas: {hospital_telefone}""",
+    "lembrete_12h": """⚠️ **ÚLTIMO LEMBRETE**, {nome}!
+
+Sua consulta é **HOJE** às {hora}:
+👨‍⚕️ {medico_txt}
+
+Confirme sua presença AGORA:
+✅ SIM - Vou comparecer
+❌ NÃO - Preciso cancelar
+
+📞 Para dúvidas: {hospital_telefone}""",
+    # Lembretes do fluxo legado (Atendimento), com a especialidade
+    "lembrete_48h_atendimento": """🔔 **LEMBRETE IMPORTANTE**, {nome}!
+
+Sua consulta está marcada para **AMANHÃ**:
+📅 {data} às {hora}
+👨‍⚕️ {medico_txt}
+🏥 {especialidade}
+
+Por favor, confirme sua presença:
+✅ SIM - Vou comparecer
+❌ NÃO - Preciso cancelar
+
+📞 Para dúvidas: {hospital_telefone}""",
+    "lembrete_12h_atendimento": """⚠️ **ÚLTIMO LEMBRETE**, {nome}!
+
+Sua consulta é **HOJE** às {hora}:
+👨‍⚕️ {medico_txt}
+🏥 {especialidade}
+
+Confirme sua presença AGORA:
+✅ SIM - Vou comparecer
+❌ NÃO - Preciso cancelar
+
+📞 Para dúvidas: {hospital_telefone}""",
+    "consulta_agendada": """🏥 **{hospital_nome}**
+
+Olá {nome}! 👋
+
+Você tem uma consulta agendada:
+📅 **Data:** {data}
+⏰ **Horário:** {hora}
+👨‍⚕️ **Médico:** {medico}
+🏥 **Especialidade:** {especialidade}
+
+Aguardamos sua confirmação! 🙏
+
+📞 Para dúvidas: {hospital_telefone}
+📍 Endereço: {hospital_endereco}""",
+}
+
+_CAMPO = re.compile(r"\{(\w+)\}")
+
+
+class TemplateMensagem:
+    """Template compilado: texto fixo com as constantes já embutidas e campos em ordem."""
+
+    __slots__ = ("nome", "campos", "_formato")
+
+    def __init__(self, nome: str, texto: str, constantes: Mapping[str, str]):
+        self.nome = nome
+        partes: List[str] = []
+        campos: List[str] = []
+        literal: List[str] = []
+        pos = 0
+        for m in _CAMPO.finditer(texto):
+            literal.append(texto[pos:m.start()])
+            campo = m.group(1)
+            if campo in constantes:
+                literal.append(constantes[campo])
+            else:
+                partes.append("".join(literal))
+                literal = []
+                campos.append(campo)
+            pos = m.end()
+        literal.append(texto[pos:])
+        partes.append("".join(literal))
+        self.campos: Tuple[str, ...] = tuple(campos)
+        self._formato = "%s".join(p.replace("%", "%%") for p in partes)
+
+    def renderizar(self, valores: Mapping[str, str]) -> str:
+        """Substitui os campos do paciente (KeyError se faltar algum)."""
+        return self._formato % tuple([valores[c] for c in self.campos])
+
+
+def _constantes_hospital() -> Dict[str, str]:
+    endereco = ", ".join(
+        p for p in (settings.hospital_address, settings.hospital_city) if p
+    )
+    if settings.hospital_state:
+        endereco = f"{endereco} - {settings.hospital_state}" if endereco else settings.hospital_state
+    return {
+        "hospital_nome": settings.hospital_name or "",
+        "hospital_telefone": settings.hospital_phone or settings.hospital_phone_padrao,
+        "hospital_endereco": endereco,
+    }
+
+
+@lru_cache(maxsize=None)
+def obter_template(nome: str) -> TemplateMensagem:
+    """Template `nome` compilado (uma vez por processo)."""
+    try:
+        texto = TEMPLATES[nome]
+    except KeyError:
+        raise ValueError(f"Template de mensagem desconhecido: {nome}") from None
+    return TemplateMensagem(nome, texto, _constantes_hospital())
+
+
+def limpar_cache_templates() -> None:
+    """Descarta os templates compilados (ex.: após alterar dados do hospital em settings)."""
+    obter_template.cache_clear()
+
+
+def campos_mensagem(
+    nome: Optional[str],
+    dt_consulta: Optional[datetime],
+    medico: Optional[str],
+    especialidade: Optional[str] = None,
+) -> Dict[str, str]:
+    """Campos do paciente usados pelos templates."""
+    if dt_consulta is not None:
+        data = f"{dt_consulta.day:02d}/{dt_consulta.month:02d}/{dt_consulta.year:04d}"
+        hora = f"{dt_consulta.hour:02d}:{dt_consulta.minute:02d}"
+    else:
+        data = hora = ""
+    return {
+        "nome": nome or "Paciente",
+        "data": data,
+        "hora": hora,
+        "medico": medico or "",
+        "medico_txt": f"Dr. {medico}" if medico else "médico",
+        "especialidade": especialidade or "",
+    }
+
+
+def renderizar_mensagem(nome_template: str, campos: Mapping[str, str]) -> str:
+    """Renderiza uma mensagem com o template `nome_template`."""
+    return obter_template(nome_template).renderizar(campos)
+
+
+def renderizar_lote(nome_template: str, lista_campos: Iterable[Mapping[str, str]]) -> List[str]:
+    """Renderiza as mensagens de uma rodada inteira com o mesmo template."""
+    renderizar = obter_template(nome_template).renderizar
+    return [renderizar(campos) for campos in lista_campos]
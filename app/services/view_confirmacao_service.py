@@ -1,55 +1,459 @@
 """
 Serviço para leitura da view de confirmação de consulta (janela 48h).
 
-Lê da view no banco principal (Oracle) e retorna linhas para comparação com SQLite.
+Lê da view no banco principal (Oracle) e entrega as linhas para comparação com SQLite.
+
+A leitura é feita em streaming: o SELECT projeta só as colunas do schema que
+a view realmente tem (lidas uma vez por processo com SELECT * ... WHERE 1=0;
+as ausentes vêm como None) ou settings.view_colunas, o cursor busca settings.view_fetch_lote linhas por
+vez e cada linha vira um LinhaViewConfirmacao (NamedTuple), sem dict intermediário.
+Assim o uso de memória não cresce com o tamanho da view.
+
+Os SELECTs são montados uma vez por processo (_sql_select_view, com lru_cache
+por view/colunas/filtro): cada poll reusa o mesmo TextClause e o mesmo texto
+SQL, aproveitando o cache de compilação do SQLAlchemy e o cache de statements
+do driver Oracle (settings.oracle_stmtcachesize).
+
+Modo incremental (settings.view_poll_modo_incremental):
+- A janela de 36–50h vai para o WHERE como bind parameters.
+- Um high-watermark (nr_sequencia / coluna de atualização) persistido no SQLite
+  faz cada poll trazer só linhas novas, alteradas ou que acabaram de entrar na janela.
+- A cada settings.view_resync_completo_minutos a janela inteira é relida
+  (cobre sequências fora de ordem).
+- Linhas cujo envio falhou seguram o watermark de nr_sequencia abaixo delas
+  (salvar_watermark_view com `falhas`), para voltarem no próximo poll incremental.
+
+As funções *_async fazem a mesma leitura com AsyncSession (engine assíncrono,
+settings.database_async_habilitado), em streaming pelo AsyncResult.
 """
 
-from typing import List
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from loguru import logger
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
 
 from app.config.config import settings
-from app.schemas.schemas import ViewConfirmacaoConsulta
+from app.database.sqlite_envios import ViewWatermark
+
+
+class LinhaViewConfirmacao(NamedTuple):
+    """
+    Uma linha da view TASY.AVA_CONFIRMACAO_CONSULTA (mesmos campos de ViewConfirmacaoConsulta).
+    """
+
+    nr_sequencia: int
+    cd_agenda: Optional[int] = None
+    dt_agenda: Optional[datetime] = None
+    dt_consulta: Optional[datetime] = None
+    nm_paciente: Optional[str] = None
+    nr_telefone: Optional[str] = None
+    nr_ddi: Optional[str] = None
+    ds_email: Optional[str] = None
+    nm_medico_externo: Optional[str] = None
+    cd_especialidade: Optional[int] = None
+    ds_observacao: Optional[str] = None
+    ie_status_agenda: Optional[str] = None
+
+
+# Colunas projetadas por padrão (nomes da view em maiúsculas)
+COLUNAS_VIEW: Tuple[str, ...] = tuple(c.upper() for c in LinhaViewConfirmacao._fields)
+
+_CAMPOS_INT = ("nr_sequencia", "cd_agenda", "cd_especialidade")
+_CAMPOS_STR = ("nr_telefone", "nr_ddi")
+
+
+class LeituraIncremental(NamedTuple):
+    """
+    Resultado de um poll incremental.
+
+    `linhas` é um iterador (assíncrono nas funções *_async); o `watermark` é atualizado à medida que as linhas são
+    consumidas e deve ser gravado (salvar_watermark_view) depois de processá-las.
+    """
+
+    linhas: Union[Iterator[LinhaViewConfirmacao], AsyncIterator[LinhaViewConfirmacao]]
+    watermark: ViewWatermark
+    completa: bool
+
+
+def _nome_view() -> str:
+    return getattr(settings, "view_confirmacao_nome", "TASY.AVA_CONFIRMACAO_CONSULTA")
+
+
+# Colunas de cada view (maiúsculas), lidas uma vez por processo
+_colunas_por_view: Dict[str, FrozenSet[str]] = {}
+
+
+@lru_cache(maxsize=8)
+def _sql_sonda_view(view_name: str) -> TextClause:
+    """SELECT sem linhas: só a descrição das colunas da view."""
+    return text(f"SELECT * FROM {view_name} WHERE 1=0")
+
+
+def _registrar_colunas_view(view_name: str, chaves: Iterable[Any]) -> FrozenSet[str]:
+    colunas = frozenset(str(k).upper() for k in chaves)
+    _colunas_por_view[view_name] = colunas
+    ausentes = [c for c in COLUNAS_VIEW if c not in colunas]
+    if ausentes:
+        logger.warning(
+            f"View {view_name} sem as colunas {', '.join(ausentes)} (lidas como vazias)"
+        )
+    return colunas
+
+
+def _colunas_da_view(db: Session, view_name: str) -> Optional[FrozenSet[str]]:
+    """Colunas existentes na view (None com settings.view_colunas: lista explícita)."""
+    if settings.view_colunas:
+        return None
+    colunas = _colunas_por_view.get(view_name)
+    if colunas is None:
+        result = db.execute(_sql_sonda_view(view_name))
+        colunas = _registrar_colunas_view(view_name, result.keys())
+        result.close()
+    return colunas
+
+
+async def _colunas_da_view_async(db: AsyncSession, view_name: str) -> Optional[FrozenSet[str]]:
+    """_colunas_da_view com AsyncSession."""
+    if settings.view_colunas:
+        return None
+    colunas = _colunas_por_view.get(view_name)
+    if colunas is None:
+        result = await db.execute(_sql_sonda_view(view_name))
+        colunas = _registrar_colunas_view(view_name, result.keys())
+        result.close()
+    return colunas
+
+
+def _colunas_projecao(
+    existentes: Optional[FrozenSet[str]] = None, extras: Tuple[str, ...] = ()
+) -> Tuple[str, ...]:
+    """
+    Colunas do SELECT: settings.view_colunas (se definido) ou as do schema que
+    existem na view (`existentes`), mais extras.
+    """
+    if settings.view_colunas:
+        colunas = [c.strip() for c in settings.view_colunas.split(",") if c.strip()]
+    else:
+        colunas = [c for c in COLUNAS_VIEW if existentes is None or c in existentes]
+    presentes = {c.upper() for c in colunas}
+    for extra in extras:
+        if extra and extra.upper() not in presentes:
+            colunas.append(extra)
+            presentes.add(extra.upper())
+    return tuple(colunas)
+
+
+@lru_cache(maxsize=32)
+def _sql_select_view(view_name: str, colunas: Tuple[str, ...], filtro: str = "") -> TextClause:
+    """SELECT da view montado uma vez por combinação de view, colunas e filtro."""
+    sql = f"SELECT {', '.join(colunas)} FROM {view_name}"
+    if filtro:
+        sql += f" WHERE {filtro}"
+    return text(sql)
+
+
+def _opcoes_streaming() -> Dict[str, Any]:
+    return {"stream_results": True, "yield_per": max(settings.view_fetch_lote, 1)}
+
+
+def _conversor_linhas(
+    chaves_resultado: Sequence[Any], coluna_extra: Optional[str] = None
+) -> Callable[[Any], Optional[Tuple[LinhaViewConfirmacao, Any]]]:
+    """
+    Monta a conversão de uma linha do resultado em (linha, valor de coluna_extra).
+
+    As posições de cada campo são resolvidas uma vez a partir das colunas do
+    resultado; por linha só há indexação e as conversões de tipo necessárias.
+    A função devolve None para linhas que não podem ser convertidas.
+    """
+    chaves = [str(k).lower() for k in chaves_resultado]
+    posicoes = [
+        chaves.index(campo) if campo in chaves else None
+        for campo in LinhaViewConfirmacao._fields
+    ]
+    extra = coluna_extra.lower() if coluna_extra else None
+    pos_extra = chaves.index(extra) if extra in chaves else None
+    idx_int = [LinhaViewConfirmacao._fields.index(c) for c in _CAMPOS_INT]
+    idx_str = [LinhaViewConfirmacao._fields.index(c) for c in _CAMPOS_STR]
+
+    def _converter(row) -> Optional[Tuple[LinhaViewConfirmacao, Any]]:
+        valores = [row[p] if p is not None else None for p in posicoes]
+        try:
+            for i in idx_int:
+                if valores[i] is not None:
+                    valores[i] = int(valores[i])
+            for i in idx_str:
+                if valores[i] is not None and not isinstance(valores[i], str):
+                    valores[i] = str(valores[i])
+            if valores[0] is None:
+                raise ValueError("nr_sequencia vazio")
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Ignorando linha da view (erro de parsing): {e}")
+            return None
+        return LinhaViewConfirmacao(*valores), (row[pos_extra] if pos_extra is not None else None)
+
+    return _converter
+
 
+def _iterar_linhas(
+    db: Session,
+    stmt: TextClause,
+    params: Dict[str, Any],
+    coluna_extra: Optional[str] = None,
+) -> Iterator[Tuple[LinhaViewConfirmacao, Any]]:
+    """Executa o SELECT em streaming e gera (linha, valor de coluna_extra)."""
+    result = db.execute(stmt, params, execution_options=_opcoes_streaming())
+    converter = _conversor_linhas(result.keys(), coluna_extra)
+    for row in result:
+        item = converter(row)
+        if item is not None:
+            yield item
 
-def _row_to_dict(row) -> dict:
-    """Converte linha do banco (colunas em maiúsculas) para dict em minúsculas."""
-    if hasattr(row, "_mapping"):
-        return {str(k).lower(): v for k, v in row._mapping.items()}
-    return {str(k).lower(): v for k, v in row.items()} if hasattr(row, "items") else dict(row)
 
+async def _iterar_linhas_async(
+    db: AsyncSession,
+    stmt: TextClause,
+    params: Dict[str, Any],
+    coluna_extra: Optional[str] = None,
+) -> AsyncIterator[Tuple[LinhaViewConfirmacao, Any]]:
+    """_iterar_linhas com AsyncSession (AsyncResult em streaming)."""
+    result = await db.stream(stmt, params, execution_options=_opcoes_streaming())
+    converter = _conversor_linhas(result.keys(), coluna_extra)
+    async for row in result:
+        item = converter(row)
+        if item is not None:
+            yield item
 
-def listar_view_confirmacao_48h(db: Session) -> List[ViewConfirmacaoConsulta]:
+
+def iterar_view_confirmacao_48h(db: Session) -> Iterator[LinhaViewConfirmacao]:
     """
-    Lê da view de confirmação (janela 48h) no banco principal.
+    Lê a view de confirmação (janela 48h) no banco principal, em streaming.
 
     A view deve retornar apenas registros na janela de 48h.
-    Retorna lista de ViewConfirmacaoConsulta para comparação com SQLite.
+    Gera LinhaViewConfirmacao para comparação com SQLite.
     """
-    view_name = getattr(settings, "view_confirmacao_nome", "TASY.AVA_CONFIRMACAO_CONSULTA")
-    query = text(f"SELECT * FROM {view_name}")
+    view_name = _nome_view()
+    total = 0
+    try:
+        stmt = _sql_select_view(view_name, _colunas_projecao(_colunas_da_view(db, view_name)))
+        for linha, _ in _iterar_linhas(db, stmt, {}):
+            total += 1
+            yield linha
+    except Exception as e:
+        logger.error(f"Erro ao ler view {view_name}: {e}")
+        raise
+    logger.info(f"View {view_name}: {total} registros (48h)")
+
+
+async def iterar_view_confirmacao_48h_async(db: AsyncSession) -> AsyncIterator[LinhaViewConfirmacao]:
+    """iterar_view_confirmacao_48h com AsyncSession."""
+    view_name = _nome_view()
+    total = 0
     try:
-        result = db.execute(query)
-        rows = result.fetchall()
-        out = []
-        for row in rows:
-            d = _row_to_dict(row)
-            # Só incluir campos que existem no schema
-            allowed = {
-                "nr_sequencia", "cd_agenda", "dt_agenda", "dt_consulta",
-                "nm_paciente", "nr_telefone", "nr_ddi", "ds_email",
-                "nm_medico_externo", "cd_especialidade", "ds_observacao", "ie_status_agenda",
-            }
-            filtered = {k: v for k, v in d.items() if k in allowed}
-            try:
-                out.append(ViewConfirmacaoConsulta(**filtered))
-            except Exception as e:
-                logger.warning(f"Ignorando linha da view (erro de parsing): {e}")
-                continue
-        logger.info(f"View {view_name}: {len(out)} registros (48h)")
-        return out
+        existentes = await _colunas_da_view_async(db, view_name)
+        stmt = _sql_select_view(view_name, _colunas_projecao(existentes))
+        async for linha, _ in _iterar_linhas_async(db, stmt, {}):
+            total += 1
+            yield linha
     except Exception as e:
         logger.error(f"Erro ao ler view {view_name}: {e}")
         raise
+    logger.info(f"View {view_name}: {total} registros (48h)")
+
+
+def listar_view_confirmacao_48h(db: Session) -> List[LinhaViewConfirmacao]:
+    """Lê a view de confirmação inteira em uma lista (prefira iterar_view_confirmacao_48h)."""
+    return list(iterar_view_confirmacao_48h(db))
+
+
+def _obter_watermark(sqlite_session: Session, view_name: str) -> ViewWatermark:
+    wm = sqlite_session.get(ViewWatermark, view_name)
+    if wm is None:
+        return ViewWatermark(nome_view=view_name)
+    # Desanexa: os commits dos registros de envio não devem gravar o watermark antes da hora
+    sqlite_session.expunge(wm)
+    return wm
+
+
+class _PlanoIncremental(NamedTuple):
+    """SELECT e watermark de um poll incremental (mesmos para a leitura síncrona e a async)."""
+
+    view_name: str
+    filtro: str
+    params: Dict[str, Any]
+    coluna_atualizacao: Optional[str]
+    watermark: ViewWatermark
+    completa: bool
+
+
+def _planejar_incremental(
+    sqlite_session: Session, horas_min: int, horas_max: int
+) -> _PlanoIncremental:
+    view_name = _nome_view()
+    col_data = settings.view_coluna_data
+    col_atu = settings.view_coluna_atualizacao or None
+
+    agora = datetime.now()
+    inicio = agora + timedelta(hours=horas_min)
+    fim = agora + timedelta(hours=horas_max)
+    wm = _obter_watermark(sqlite_session, view_name)
+    completa = (
+        wm.ultimo_nr_sequencia is None
+        or wm.fim_janela is None
+        or wm.ultimo_resync_completo is None
+        or wm.ultimo_resync_completo
+        <= agora - timedelta(minutes=settings.view_resync_completo_minutos)
+    )
+
+    filtro = f"{col_data} >= :inicio AND {col_data} <= :fim"
+    params = {"inicio": inicio, "fim": fim}
+    if not completa:
+        condicoes = [f"{col_data} > :fim_anterior", "NR_SEQUENCIA > :ultimo_nr_sequencia"]
+        params["fim_anterior"] = wm.fim_janela
+        params["ultimo_nr_sequencia"] = wm.ultimo_nr_sequencia
+        if col_atu and wm.ultima_atualizacao is not None:
+            condicoes.append(f"{col_atu} > :ultima_atualizacao")
+            params["ultima_atualizacao"] = wm.ultima_atualizacao
+        filtro += " AND (" + " OR ".join(condicoes) + ")"
+
+    if wm.ultimo_nr_sequencia is None:
+        wm.ultimo_nr_sequencia = 0
+    wm.fim_janela = fim
+    if completa:
+        wm.ultimo_resync_completo = agora
+    return _PlanoIncremental(view_name, filtro, params, col_atu, wm, completa)
+
+
+def _sql_select_incremental(
+    plano: _PlanoIncremental, existentes: Optional[FrozenSet[str]]
+) -> TextClause:
+    extras = (plano.coluna_atualizacao,) if plano.coluna_atualizacao else ()
+    return _sql_select_view(plano.view_name, _colunas_projecao(existentes, extras), plano.filtro)
+
+
+def _avancar_watermark(wm: ViewWatermark, linha: LinhaViewConfirmacao, atu: Any) -> None:
+    if linha.nr_sequencia > wm.ultimo_nr_sequencia:
+        wm.ultimo_nr_sequencia = linha.nr_sequencia
+    if isinstance(atu, datetime) and (
+        wm.ultima_atualizacao is None or atu > wm.ultima_atualizacao
+    ):
+        wm.ultima_atualizacao = atu
+
+
+def _log_incremental(plano: _PlanoIncremental, total: int) -> None:
+    logger.info(
+        f"View {plano.view_name}: {total} registros "
+        f"({'releitura completa da janela' if plano.completa else 'incremental'}, "
+        f"watermark nr_sequencia={plano.watermark.ultimo_nr_sequencia})"
+    )
+
+
+def listar_view_confirmacao_48h_incremental(
+    db: Session,
+    sqlite_session: Session,
+    horas_min: int = 36,
+    horas_max: int = 50,
+) -> LeituraIncremental:
+    """
+    Lê da view só o que mudou desde o último poll, dentro da janela [agora+horas_min, agora+horas_max].
+
+    Traz linhas com nr_sequencia (ou coluna de atualização) acima do watermark e linhas
+    cuja data passou a estar na janela desde o poll anterior. O watermark retornado
+    deve ser gravado com salvar_watermark_view depois que as linhas forem processadas.
+    """
+    plano = _planejar_incremental(sqlite_session, horas_min, horas_max)
+
+    def _gerar() -> Iterator[LinhaViewConfirmacao]:
+        total = 0
+        try:
+            stmt = _sql_select_incremental(plano, _colunas_da_view(db, plano.view_name))
+            for linha, atu in _iterar_linhas(db, stmt, plano.params, plano.coluna_atualizacao):
+                total += 1
+                _avancar_watermark(plano.watermark, linha, atu)
+                yield linha
+        except Exception as e:
+            logger.error(f"Erro ao ler view {plano.view_name} (incremental): {e}")
+            raise
+        _log_incremental(plano, total)
+
+    return LeituraIncremental(linhas=_gerar(), watermark=plano.watermark, completa=plano.completa)
+
+
+def listar_view_confirmacao_48h_incremental_async(
+    db: AsyncSession,
+    sqlite_session: Session,
+    horas_min: int = 36,
+    horas_max: int = 50,
+) -> LeituraIncremental:
+    """
+    listar_view_confirmacao_48h_incremental com AsyncSession.
+
+    O watermark é lido do SQLite na chamada (thread do chamador); `linhas` é um
+    iterador assíncrono, consumido no event loop do engine assíncrono.
+    """
+    plano = _planejar_incremental(sqlite_session, horas_min, horas_max)
+
+    async def _gerar() -> AsyncIterator[LinhaViewConfirmacao]:
+        total = 0
+        try:
+            existentes = await _colunas_da_view_async(db, plano.view_name)
+            stmt = _sql_select_incremental(plano, existentes)
+            async for linha, atu in _iterar_linhas_async(
+                db, stmt, plano.params, plano.coluna_atualizacao
+            ):
+                total += 1
+                _avancar_watermark(plano.watermark, linha, atu)
+                yield linha
+        except Exception as e:
+            logger.error(f"Erro ao ler view {plano.view_name} (incremental): {e}")
+            raise
+        _log_incremental(plano, total)
+
+    return LeituraIncremental(linhas=_gerar(), watermark=plano.watermark, completa=plano.completa)
+
+
+def salvar_watermark_view(
+    sqlite_session: Session,
+    watermark: ViewWatermark,
+    falhas: Iterable[int] = (),
+) -> None:
+    """
+    Grava o watermark do poll incremental (chamar após processar as linhas lidas).
+
+    `falhas`: nr_sequencia das linhas lidas cujo processamento falhou. O watermark
+    de nr_sequencia fica abaixo da menor delas, então o próximo poll incremental
+    relê essas linhas (as já enviadas são descartadas pelo diff com o SQLite).
+    """
+    menor_falha = min(falhas, default=None)
+    if menor_falha is not None and watermark.ultimo_nr_sequencia is not None:
+        watermark.ultimo_nr_sequencia = min(watermark.ultimo_nr_sequencia, menor_falha - 1)
+        logger.warning(
+            f"View {watermark.nome_view}: watermark mantido em nr_sequencia="
+            f"{watermark.ultimo_nr_sequencia} (linhas com falha serão relidas)"
+        )
+    try:
+        watermark.atualizado_em = datetime.utcnow()
+        sqlite_session.merge(watermark)
+        sqlite_session.commit()
+    except Exception as e:
+        logger.error(f"Erro ao gravar watermark da view {watermark.nome_view}: {e}")
+        sqlite_session.rollback()
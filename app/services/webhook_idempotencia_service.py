@@ -0,0 +1,176 @@
+"""
+Idempotência do processamento de webhooks (SQLite).
+
+N8N e Botconversa reentregam webhooks; sem controle, cada reentrega repete o
+UPDATE em agenda_consulta e o registro da resposta no SQLite. Antes de
+processar, iniciar_processamento() reserva a chave do webhook:
+
+- chave nova (ou expirada pelo TTL): reservada, o chamador processa e depois
+  chama concluir_processamento() (sucesso) ou cancelar_processamento() (falha);
+- chave já concluída: devolve o resultado gravado, sem tocar no banco principal;
+- chave em processamento por outro worker: devolve falha com em_processamento,
+  para a reentrega ser tentada de novo (o primeiro processamento pode falhar).
+
+A chave só existe quando o provedor informa o id da mensagem/entrega: sem ele,
+duas respostas diferentes com o mesmo conteúdo (ex.: "sim" hoje e "sim" para
+outra consulta amanhã) não podem ser distinguidas de uma reentrega, e o webhook
+é sempre processado.
+
+Só resultados de sucesso ficam gravados; falhas podem ser reprocessadas.
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from loguru import logger
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.config.config import settings
+from app.database.sqlite_envios import WebhookIdempotencia, get_sqlite_session
+
+# Reserva sem conclusão por mais que isso é considerada abandonada (queda do worker)
+_RESERVA_EXPIRA = timedelta(minutes=5)
+# Intervalo mínimo (segundos) entre remoções de chaves expiradas
+_INTERVALO_LIMPEZA = 3600
+_ultima_limpeza = 0.0
+
+
+def chave_idempotencia(webhook_data: Dict[str, Any]) -> Optional[str]:
+    """
+    Chave do webhook a partir do id da mensagem/entrega do provedor.
+
+    Quando o payload identifica a consulta (nr_sequencia_agenda/cd_agenda e
+    nr_sequencia), ela entra na chave junto com o id.
+
+    Returns:
+        A chave, ou None se o payload não traz id do provedor (não deduplicar)
+    """
+    message = webhook_data.get("message")
+    message_id = (
+        webhook_data.get("message_id")
+        or webhook_data.get("delivery_id")
+        or (message.get("id") if isinstance(message, dict) else None)
+    )
+    if not message_id:
+        return None
+    cd_agenda = webhook_data.get("nr_sequencia_agenda") or webhook_data.get("cd_agenda")
+    nr_sequencia = webhook_data.get("nr_sequencia")
+    consulta = ":".join(str(v) for v in (cd_agenda, nr_sequencia) if v)
+    return (f"msg:{consulta}:{message_id}" if consulta else f"msg:{message_id}")[:80]
+
+
+def iniciar_processamento(chave: str) -> Optional[Dict[str, Any]]:
+    """
+    Reserva a chave para processamento.
+
+    Returns:
+        None se o chamador deve processar o webhook; senão o resultado a devolver
+        para a reentrega (resultado gravado ou aviso de processamento em andamento)
+    """
+    agora = datetime.utcnow()
+    _limpar_expiradas(agora)
+    session = get_sqlite_session()
+    try:
+        stmt = sqlite_insert(WebhookIdempotencia).values(
+            chave=chave, resultado=None, atualizado_em=agora
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[WebhookIdempotencia.chave],
+            set_={"resultado": None, "atualizado_em": agora},
+            where=or_(
+                and_(
+                    WebhookIdempotencia.resultado.isnot(None),
+                    WebhookIdempotencia.atualizado_em < agora - _ttl(),
+                ),
+                and_(
+                    WebhookIdempotencia.resultado.is_(None),
+                    WebhookIdempotencia.atualizado_em < agora - _RESERVA_EXPIRA,
+                ),
+            ),
+        )
+        reservada = session.execute(stmt).rowcount == 1
+        session.commit()
+        if reservada:
+            return None
+        resultado = session.execute(
+            select(WebhookIdempotencia.resultado).where(WebhookIdempotencia.chave == chave)
+        ).scalar_one_or_none()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    if resultado is None:
+        return {
+            "success": False,
+            "duplicado": True,
+            "em_processamento": True,
+            "error": "Webhook já está em processamento",
+        }
+    return {**json.loads(resultado), "duplicado": True}
+
+
+def concluir_processamento(chave: str, resultado: Dict[str, Any]) -> None:
+    """Grava o resultado de sucesso da chave (respondido às reentregas até o TTL)."""
+    _gravar(chave, json.dumps(resultado, default=str))
+
+
+def cancelar_processamento(chave: str) -> None:
+    """Libera a chave após falha, para que uma reentrega seja processada de novo."""
+    _gravar(chave, None)
+
+
+def _ttl() -> timedelta:
+    return timedelta(hours=settings.webhook_idempotencia_ttl_horas)
+
+
+def _gravar(chave: str, resultado: Optional[str]) -> None:
+    session = get_sqlite_session()
+    try:
+        if resultado is None:
+            session.execute(
+                delete(WebhookIdempotencia).where(
+                    WebhookIdempotencia.chave == chave,
+                    WebhookIdempotencia.resultado.is_(None),
+                )
+            )
+        else:
+            session.merge(
+                WebhookIdempotencia(
+                    chave=chave, resultado=resultado, atualizado_em=datetime.utcnow()
+                )
+            )
+        session.commit()
+    except Exception as e:
+        logger.warning(f"Erro ao gravar idempotência do webhook {chave}: {e}")
+        session.rollback()
+    finally:
+        session.close()
+
+
+def _limpar_expiradas(agora: datetime) -> None:
+    """Remove chaves concluídas fora do TTL (no máximo uma vez por _INTERVALO_LIMPEZA)."""
+    global _ultima_limpeza
+    if time.monotonic() - _ultima_limpeza < _INTERVALO_LIMPEZA:
+        return
+    _ultima_limpeza = time.monotonic()
+    session = get_sqlite_session()
+    try:
+        result = session.execute(
+            delete(WebhookIdempotencia).where(
+                WebhookIdempotencia.resultado.isnot(None),
+                WebhookIdempotencia.atualizado_em < agora - _ttl(),
+            )
+        )
+        session.commit()
+        if result.rowcount:
+            logger.info(f"Idempotência de webhooks: {result.rowcount} chaves expiradas removidas")
+    except Exception as e:
+        logger.warning(f"Erro ao limpar idempotência de webhooks: {e}")
+        session.rollback()
+    finally:
+        session.close()
@@ -0,0 +1,193 @@
+"""
+Inbox persistente (SQLite) dos webhooks do Botconversa/N8N.
+
+Com settings.webhook_inbox_habilitada o endpoint só valida a assinatura, grava
+o body bruto com registrar_webhook() e responde 202. PoolWebhookInbox
+(settings.webhook_inbox_workers threads) processa cada payload com
+processar_payload_webhook() em uma sessão própria do banco principal, fora do
+event loop do FastAPI.
+
+Webhooks do mesmo paciente (chave_ordem_webhook: telefone ou subscriber_id)
+são processados um por vez e na ordem de chegada, mesmo com vários workers:
+um "sim" seguido de "não" nunca é aplicado fora de ordem.
+
+O item só é concluído depois que o UPDATE de agenda_consulta foi gravado
+(inclusive no modo em lote): até lá o payload fica na inbox, e a confirmação
+usa criado_em (recebimento), não a hora do processamento.
+
+Falhas voltam para PENDENTE com espera exponencial, até
+webhook_inbox_max_tentativas; depois ficam FALHOU (dead-letter) para análise.
+"""
+
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from app.config.config import settings
+from app.database import fila_sqlite
+from app.database.fila_sqlite import FALHOU, PENDENTE, espera_retentativa
+from app.database.sqlite_envios import WebhookInbox, get_sqlite_session
+from app.utils.telefone import telefone_para_envio
+from app.utils.worker_pool import PoolWorkers
+
+PROCESSADO = "PROCESSADO"
+
+# Webhooks PROCESSADO são mantidos por este período (auditoria) e depois removidos
+_RETENCAO_PROCESSADOS = timedelta(days=7)
+# Intervalo mínimo (segundos) entre limpezas feitas pelos workers
+_INTERVALO_LIMPEZA = 3600
+
+
+def _hora_local(utc: Optional[datetime]) -> Optional[datetime]:
+    """criado_em (UTC no SQLite) na hora local usada no banco principal."""
+    if utc is None:
+        return None
+    return utc.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def chave_ordem_webhook(webhook_data: Any) -> Optional[str]:
+    """Chave do paciente do webhook (telefone normalizado ou subscriber_id), ou None."""
+    if not isinstance(webhook_data, dict):
+        return None
+    contato = webhook_data.get("contact")
+    telefone = webhook_data.get("telefone") or (
+        contato.get("phone") if isinstance(contato, dict) else None
+    )
+    telefone = telefone_para_envio(telefone)
+    if telefone:
+        return f"tel:{telefone}"[:80]
+    subscriber_id = webhook_data.get("subscriber_id")
+    if subscriber_id:
+        return f"sub:{subscriber_id}"[:80]
+    return None
+
+
+def registrar_webhook(payload: str, chave_ordem: Optional[str] = None) -> int:
+    """Grava o body bruto na inbox. Retorna o id do registro."""
+    session = get_sqlite_session()
+    try:
+        item = WebhookInbox(payload=payload, status=PENDENTE, chave_ordem=chave_ordem)
+        session.add(item)
+        session.commit()
+        return item.id
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def reservar_proximo_webhook() -> Optional[WebhookInbox]:
+    """Reserva atomicamente o próximo webhook visível (ou None se a inbox estiver vazia)."""
+    return fila_sqlite.reservar_proximo(
+        WebhookInbox, settings.webhook_inbox_visibilidade_segundos, coluna_ordem="chave_ordem"
+    )
+
+
+def concluir_webhook(item: WebhookInbox, resultado: Dict[str, Any]) -> None:
+    """Marca o webhook como PROCESSADO guardando o resultado."""
+    fila_sqlite.finalizar(
+        WebhookInbox,
+        item,
+        status=PROCESSADO,
+        reservado_por=None,
+        ultimo_erro=None,
+        resultado=json.dumps(resultado, default=str),
+    )
+
+
+def falhar_webhook(item: WebhookInbox, erro: str) -> None:
+    """Devolve o webhook à inbox com espera exponencial ou marca FALHOU após o limite."""
+    if item.tentativas >= settings.webhook_inbox_max_tentativas:
+        logger.error(
+            f"Inbox de webhooks: {item.id} falhou {item.tentativas} vezes, desistindo ({erro})"
+        )
+        fila_sqlite.finalizar(
+            WebhookInbox, item, status=FALHOU, reservado_por=None, ultimo_erro=erro
+        )
+        return
+    espera = espera_retentativa(item.tentativas)
+    logger.warning(
+        f"Inbox de webhooks: {item.id} falhou (tentativa {item.tentativas}), "
+        f"nova tentativa em {int(espera.total_seconds())}s ({erro})"
+    )
+    fila_sqlite.finalizar(
+        WebhookInbox,
+        item,
+        status=PENDENTE,
+        reservado_por=None,
+        ultimo_erro=erro,
+        visivel_em=datetime.utcnow() + espera,
+    )
+
+
+def limpar_webhooks_processados() -> int:
+    """Remove webhooks PROCESSADO mais antigos que a retenção. Retorna quantos foram removidos."""
+    try:
+        return fila_sqlite.limpar_concluidos(WebhookInbox, PROCESSADO, _RETENCAO_PROCESSADOS)
+    except Exception as e:
+        logger.warning(f"Erro ao limpar inbox de webhooks: {e}")
+        return 0
+
+
+class PoolWebhookInbox(PoolWorkers):
+    """Workers que processam os webhooks da inbox no banco principal."""
+
+    _ultima_limpeza = 0.0
+
+    def reservar(self) -> Optional[WebhookInbox]:
+        item = reservar_proximo_webhook()
+        if item is None and time.monotonic() - self._ultima_limpeza > _INTERVALO_LIMPEZA:
+            # Inbox ociosa: aproveita para remover os processados antigos
+            self._ultima_limpeza = time.monotonic()
+            limpar_webhooks_processados()
+        return item
+
+    def processar(self, item: WebhookInbox) -> None:
+        from app.database.manager import db_manager
+        from app.services.webhook_service import processar_payload_webhook
+
+        try:
+            webhook_data = json.loads(item.payload) if item.payload else {}
+        except json.JSONDecodeError as e:
+            # Payload inválido não melhora com nova tentativa
+            fila_sqlite.finalizar(
+                WebhookInbox,
+                item,
+                status=FALHOU,
+                reservado_por=None,
+                ultimo_erro=f"Body JSON inválido: {e}",
+            )
+            return
+
+        db = db_manager.get_session()
+        try:
+            resultado = processar_payload_webhook(
+                db, webhook_data, _hora_local(item.criado_em)
+            )
+        except Exception as e:
+            falhar_webhook(item, str(e))
+            raise
+        finally:
+            db.close()
+        if not resultado.get("success"):
+            falhar_webhook(item, str(resultado.get("error", "Erro desconhecido")))
+            return
+        concluir_webhook(item, resultado)
+
+    def snapshot(self) -> Dict[str, Any]:
+        dados = super().snapshot()
+        try:
+            dados["inbox"] = fila_sqlite.contar_por_status(WebhookInbox)
+        except Exception as e:
+            dados["inbox"] = {"erro": str(e)}
+        return dados
+
+
+pool_webhook = PoolWebhookInbox(
+    "webhook-inbox",
+    num_workers=settings.webhook_inbox_workers,
+)
@@ -22,12 +22,19 @@ from app.database.models import (
     Paciente,
     StatusConfirmacao,
 )
+from app.config.config import settings
 from app.database.sqlite_envios import get_sqlite_session
-from app.services.agenda_consulta_update_service import atualizar_confirmacao_agenda_consulta
+from app.services.agenda_consulta_update_service import registrar_confirmacao_agenda
 from app.services.envios_lembrete_service import (
     buscar_ultimo_envio_sem_resposta_por_telefone,
     registrar_resposta_envio,
 )
+from app.services.webhook_idempotencia_service import (
+    cancelar_processamento,
+    chave_idempotencia,
+    concluir_processamento,
+    iniciar_processamento,
+)
 
 from .botconversa_service import BotconversaService
 
@@ -35,8 +42,10 @@ from .botconversa_service import BotconversaService
 class WebhookService:
     """Serviço para processar webhooks do Botconversa"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, recebido_em: Optional[datetime] = None):
         self.db = db
+        # Recebimento do webhook (DT_CONFIRMACAO); None = momento do processamento
+        self.recebido_em = recebido_em
         self.botconversa_service = BotconversaService(db)
 
     def processar_webhook(self, webhook_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -309,8 +318,8 @@ class WebhookService:
 
             # Atualizar agenda_consulta no banco principal (por cd_agenda para não alterar agenda errada)
             if cd_agenda is not None:
-                atualizar_confirmacao_agenda_consulta(
-                    self.db, cd_agenda, confirmado
+                registrar_confirmacao_agenda(
+                    self.db, cd_agenda, confirmado, self.recebido_em
                 )
             else:
                 logger.warning(
@@ -488,3 +497,76 @@ class WebhookService:
             
 >>>>>>> d68998a574fb5f1a3f9edc3be084d95b00ad7be4
             return {"success": False, "error": str(e)}
+
+
+def processar_payload_webhook(
+    db: Session, webhook_data: Dict[str, Any], recebido_em: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Processa um payload de webhook (N8N ou tradicional) e finaliza a transação.
+
+    Usado pelo endpoint (modo síncrono) e pelos workers da inbox (modo ACK rápido).
+    Faz commit se o resultado for sucesso e rollback caso contrário. Reentregas
+    de um webhook já processado devolvem o resultado gravado sem acessar o banco
+    (settings.webhook_idempotencia_habilitada; só para payloads com id do provedor).
+
+    Args:
+        recebido_em: Quando o webhook chegou (hora local); é a data gravada
+            como confirmação da agenda, mesmo que o processamento seja depois.
+
+    Returns:
+        Resultado do WebhookService (com 'success' e, em caso de falha, 'error').
+        Reentrega de um webhook ainda em processamento volta com success False e
+        em_processamento True: deve ser tentada de novo.
+    """
+    chave = None
+    if settings.webhook_idempotencia_habilitada:
+        chave = chave_idempotencia(webhook_data)
+    if chave:
+        anterior = iniciar_processamento(chave)
+        if anterior is not None:
+            logger.info(f"Webhook duplicado ({chave}): devolvendo resultado anterior")
+            return anterior
+
+    try:
+        resultado = _processar_payload(db, webhook_data, recebido_em)
+    except Exception:
+        if chave:
+            cancelar_processamento(chave)
+        raise
+
+    if chave:
+        if resultado.get("success"):
+            concluir_processamento(chave, resultado)
+        else:
+            cancelar_processamento(chave)
+    return resultado
+
+
+def _processar_payload(
+    db: Session, webhook_data: Dict[str, Any], recebido_em: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Despacha o payload para o WebhookService e faz commit/rollback."""
+    webhook_service = WebhookService(db, recebido_em=recebido_em)
+
+    # Dados do N8N têm: telefone, subscriber_id, resposta
+    if all(key in webhook_data for key in ["telefone", "subscriber_id", "resposta"]):
+        logger.info("Detectados dados do N8N - processando com processar_n8n_webhook")
+        resultado = webhook_service.processar_n8n_webhook(webhook_data)
+    else:
+        logger.info("Dados tradicionais de webhook - processando com processar_webhook")
+        resultado = webhook_service.processar_webhook(webhook_data)
+    logger.info(f"Resultado do processamento do webhook: {resultado}")
+
+    if resultado and resultado.get("success"):
+        # Força o commit final para garantir que não haja rollback
+        db.commit()
+        logger.info("Commit final realizado com sucesso no webhook!")
+        return resultado
+
+    try:
+        db.rollback()
+        logger.info("Rollback realizado devido a erro no processamento")
+    except Exception as rollback_error:
+        logger.error(f"Erro no rollback: {str(rollback_error)}")
+    return resultado or {"success": False, "error": "Resultado vazio ou None"}
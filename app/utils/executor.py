@@ -0,0 +1,137 @@
+"""
+Executores dimensionados para rodar código bloqueante a partir de rotas async.
+
+SQLAlchemy (sessão síncrona) e requests bloqueiam a thread; chamados direto
+em uma rota `async def`, seguram o event loop e serializam o worker do
+uvicorn. executar_bloqueante() roda a chamada em um ThreadPoolExecutor
+nomeado e espera o resultado sem bloquear o loop:
+
+    resultado = await executar_bloqueante("api", service.testar_conexao)
+
+Cada pool tem tamanho próprio (settings.executor_<nome>_workers) para que uma
+rajada em um tipo de rota não ocupe as threads do outro, e expõe métricas
+(fila, em execução, tempo de espera/execução) em metricas_executores().
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from loguru import logger
+
+from app.config.config import settings
+
+T = TypeVar("T")
+
+# Tamanho usado para pools sem settings.executor_<nome>_workers
+_WORKERS_PADRAO = 8
+
+
+class ExecutorBloqueante:
+    """ThreadPoolExecutor com métricas de fila e de tempo de espera."""
+
+    def __init__(self, nome: str, max_workers: int):
+        self.nome = nome
+        self.max_workers = max(max_workers, 1)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=f"executor-{nome}"
+        )
+        self._lock = threading.Lock()
+        self.na_fila = 0
+        self.em_execucao = 0
+        self.concluidas = 0
+        self.erros = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.execucao_total = 0.0
+
+    async def executar(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Roda func(*args, **kwargs) no pool e aguarda o resultado."""
+        enviado_em = time.perf_counter()
+        with self._lock:
+            self.na_fila += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(self._medir, enviado_em, func, *args, **kwargs),
+        )
+
+    def _medir(self, enviado_em: float, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        inicio = time.perf_counter()
+        espera = inicio - enviado_em
+        with self._lock:
+            self.na_fila -= 1
+            self.em_execucao += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+        erro = False
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            erro = True
+            raise
+        finally:
+            with self._lock:
+                self.em_execucao -= 1
+                self.concluidas += 1
+                self.erros += int(erro)
+                self.execucao_total += time.perf_counter() - inicio
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            concluidas = self.concluidas
+            return {
+                "workers": self.max_workers,
+                "na_fila": self.na_fila,
+                "em_execucao": self.em_execucao,
+                "concluidas": concluidas,
+                "erros": self.erros,
+                "espera_media_ms": round(self.espera_total / concluidas * 1000, 2) if concluidas else 0.0,
+                "espera_max_ms": round(self.espera_max * 1000, 2),
+                "execucao_media_ms": round(self.execucao_total / concluidas * 1000, 2) if concluidas else 0.0,
+            }
+
+    def fechar(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+_executores: Dict[str, ExecutorBloqueante] = {}
+_executores_lock = threading.Lock()
+
+
+def obter_executor(nome: str) -> ExecutorBloqueante:
+    """Retorna (criando na primeira vez) o executor `nome`."""
+    executor = _executores.get(nome)
+    if executor is None:
+        with _executores_lock:
+            executor = _executores.get(nome)
+            if executor is None:
+                workers = getattr(settings, f"executor_{nome}_workers", _WORKERS_PADRAO)
+                executor = ExecutorBloqueante(nome, workers)
+                _executores[nome] = executor
+                logger.info(f"Executor {nome}: {executor.max_workers} threads")
+    return executor
+
+
+async def executar_bloqueante(nome: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Roda uma chamada bloqueante no executor `nome` sem bloquear o event loop."""
+    return await obter_executor(nome).executar(func, *args, **kwargs)
+
+
+def metricas_executores() -> Dict[str, Dict[str, Any]]:
+    """Métricas de todos os executores criados no processo."""
+    with _executores_lock:
+        executores = list(_executores.values())
+    return {executor.nome: executor.snapshot() for executor in executores}
+
+
+def fechar_executores() -> None:
+    """Aguarda as chamadas em andamento e encerra os executores. Chamar no shutdown."""
+    with _executores_lock:
+        executores = list(_executores.values())
+        _executores.clear()
+    for executor in executores:
+        executor.fechar()
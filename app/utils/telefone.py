@@ -3,9 +3,36 @@ Utilitários para normalização e formatação de telefone.
 
 Padrão usado para envio (Botconversa/N8N): apenas dígitos, com DDI no início.
 Ex.: 5531999999999 (Brasil 55 + DDD 31 + número).
+
+- normalizar_telefone / telefone_para_envio: um número, com cache LRU (o mesmo
+  telefone aparece na view, no 12h e nas respostas do webhook).
+- normalizar_telefones / telefones_para_envio: uma coluna inteira (linhas da
+  view, envios do SQLite) em uma passada: os números são unidos em um único
+  bytes e os não dígitos removidos com bytes.translate.
+  Benchmark: scripts/benchmark_telefone.py.
 """
 
-from typing import Optional
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+# Telefones distintos mantidos no cache do caminho unitário
+_TAMANHO_CACHE = 8192
+
+# Separador entre números no caminho em lote (não pode ser dígito)
+_SEPARADOR = "\n"
+# Bytes removidos por translate: tudo exceto 0-9 (no lote, também mantém o separador).
+# Caracteres não ASCII viram bytes >= 0x80 em UTF-8 e também são removidos.
+_NAO_DIGITOS = bytes(b for b in range(256) if not 48 <= b <= 57)
+_NAO_DIGITOS_LOTE = bytes(b for b in _NAO_DIGITOS if b != ord(_SEPARADOR))
+
+
+def _somente_digitos(texto: str, tabela: bytes = _NAO_DIGITOS) -> str:
+    return texto.encode("utf-8").translate(None, tabela).decode("ascii")
+
+
+@lru_cache(maxsize=_TAMANHO_CACHE)
+def _normalizar(telefone: str) -> str:
+    return _somente_digitos(telefone)
 
 
 def normalizar_telefone(telefone: Optional[str]) -> str:
@@ -17,7 +44,50 @@ def normalizar_telefone(telefone: Optional[str]) -> str:
     """
     if not telefone:
         return ""
-    return "".join(c for c in str(telefone).strip() if c.isdigit())
+    return _normalizar(str(telefone))
+
+
+def normalizar_telefones(telefones: Iterable[Optional[str]]) -> List[str]:
+    """
+    Normaliza uma coluna de telefones de uma vez (mesmo resultado de normalizar_telefone).
+
+    Vazios/None viram "". Usar nos caminhos em lote (linhas da view, envios do SQLite).
+    """
+    textos = telefones if isinstance(telefones, list) else list(telefones)
+    if not textos:
+        return []
+    try:
+        unidos = _SEPARADOR.join(textos)
+    except TypeError:
+        # None ou valores não texto (ex.: NUMBER do Oracle)
+        textos = [str(t) if t else "" for t in textos]
+        unidos = _SEPARADOR.join(textos)
+    resultado = _somente_digitos(unidos, _NAO_DIGITOS_LOTE).split(_SEPARADOR)
+    if len(resultado) != len(textos):
+        # Algum número contém o separador (não é dígito): remove antes de unir
+        unidos = _SEPARADOR.join(t.replace(_SEPARADOR, "") for t in textos)
+        resultado = _somente_digitos(unidos, _NAO_DIGITOS_LOTE).split(_SEPARADOR)
+    return resultado
+
+
+def _com_ddi(tel: str, ddi_digitos: str) -> str:
+    # Já tem DDI no início (ex.: 5531999999999)
+    if not tel or tel.startswith(ddi_digitos):
+        return tel
+    return f"{ddi_digitos}{tel}"
+
+
+def _ddi_digitos(nr_ddi: Optional[str], ddi_padrao: str) -> str:
+    ddi = (str(nr_ddi) if nr_ddi else "").strip() or ddi_padrao
+    return normalizar_telefone(ddi) or ddi_padrao
+
+
+@lru_cache(maxsize=_TAMANHO_CACHE)
+def _telefone_para_envio(nr_telefone: str, nr_ddi: Optional[str], ddi_padrao: str) -> str:
+    tel = normalizar_telefone(nr_telefone)
+    if not tel:
+        return ""
+    return _com_ddi(tel, _ddi_digitos(nr_ddi, ddi_padrao))
 
 
 def telefone_para_envio(
@@ -35,16 +105,31 @@ def telefone_para_envio(
     Returns:
         String só com dígitos, ex.: 5531999999999
     """
-    tel = normalizar_telefone(nr_telefone)
-    if not tel:
+    if not nr_telefone:
         return ""
+    return _telefone_para_envio(
+        str(nr_telefone), str(nr_ddi) if nr_ddi else None, ddi_padrao
+    )
 
-    ddi = (nr_ddi or "").strip() or ddi_padrao
-    ddi_digitos = "".join(c for c in ddi if c.isdigit()) or ddi_padrao
 
-    # Já tem DDI no início (ex.: 5531999999999)
-    if ddi_digitos and tel.startswith(ddi_digitos):
-        return tel
-    if ddi_digitos:
-        return f"{ddi_digitos}{tel}"
-    return tel
+def telefones_para_envio(
+    nr_telefones: Iterable[Optional[str]],
+    nr_ddis: Optional[Iterable[Optional[str]]] = None,
+    ddi_padrao: str = "55",
+) -> List[str]:
+    """
+    telefone_para_envio para uma coluna inteira (nr_ddis, se informado, na mesma ordem).
+
+    Números sem dígitos viram "".
+    """
+    tels = normalizar_telefones(nr_telefones)
+    if nr_ddis is None:
+        ddi = _ddi_digitos(None, ddi_padrao)
+        return [t if not t or t.startswith(ddi) else ddi + t for t in tels]
+    # Poucos DDIs distintos: cada valor é tratado uma vez
+    nr_ddis = nr_ddis if isinstance(nr_ddis, list) else list(nr_ddis)
+    por_ddi = {d: _ddi_digitos(d, ddi_padrao) for d in set(nr_ddis)}
+    ddis = list(map(por_ddi.__getitem__, nr_ddis))
+    if len(ddis) != len(tels):
+        raise ValueError("nr_telefones e nr_ddis devem ter o mesmo tamanho")
+    return [t if not t or t.startswith(d) else d + t for t, d in zip(tels, ddis)]
@@ -0,0 +1,112 @@
+"""
+Pool de workers (threads) que drenam uma fila.
+
+Classe base reutilizável: a subclasse implementa reservar() (pega o próximo
+item ou None se a fila estiver vazia) e processar(item). Cada worker repete
+reservar → processar; com a fila vazia, dorme até `intervalo_ocioso` segundos
+ou até notificar() ser chamado (ex.: logo após enfileirar).
+
+Uso:
+    class MeuPool(PoolWorkers):
+        def reservar(self): ...
+        def processar(self, item): ...
+
+    pool = MeuPool("minha-fila", num_workers=4)
+    pool.iniciar()
+    ...
+    pool.parar()
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+
+class PoolWorkers(ABC):
+    """Threads que consomem itens de uma fila via reservar()/processar()."""
+
+    def __init__(self, nome: str, num_workers: int = 4, intervalo_ocioso: float = 2.0):
+        self.nome = nome
+        self.num_workers = max(num_workers, 1)
+        self.intervalo_ocioso = max(intervalo_ocioso, 0.05)
+        self._threads: List[threading.Thread] = []
+        self._parar = threading.Event()
+        self._acordar = threading.Condition()
+        self._lock = threading.Lock()
+        self.processados = 0
+        self.erros = 0
+
+    # --- A implementar na subclasse ---
+
+    @abstractmethod
+    def reservar(self) -> Optional[Any]:
+        """Reserva o próximo item da fila (None se não houver nada disponível)."""
+
+    @abstractmethod
+    def processar(self, item: Any) -> None:
+        """Processa um item reservado. Exceções são logadas e contadas como erro."""
+
+    # --- Ciclo de vida ---
+
+    @property
+    def ativo(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def iniciar(self) -> None:
+        """Sobe os workers (não faz nada se já estiverem rodando)."""
+        if self.ativo:
+            return
+        self._parar.clear()
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"{self.nome}-{i}", daemon=True)
+            for i in range(self.num_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Pool {self.nome}: {self.num_workers} workers iniciados")
+
+    def parar(self, timeout: float = 30.0) -> None:
+        """Sinaliza parada e aguarda os workers terminarem o item em andamento."""
+        self._parar.set()
+        self.notificar()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        logger.info(f"Pool {self.nome}: workers parados")
+
+    def notificar(self) -> None:
+        """Acorda workers ociosos (ex.: após enfileirar novos itens)."""
+        with self._acordar:
+            self._acordar.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "ativo": self.ativo,
+                "processados": self.processados,
+                "erros": self.erros,
+            }
+
+    def _loop(self) -> None:
+        while not self._parar.is_set():
+            try:
+                item = self.reservar()
+            except Exception as e:
+                logger.error(f"Pool {self.nome}: erro ao reservar item: {e}")
+                item = None
+            if item is None:
+                with self._acordar:
+                    if not self._parar.is_set():
+                        self._acordar.wait(self.intervalo_ocioso)
+                continue
+            try:
+                self.processar(item)
+                with self._lock:
+                    self.processados += 1
+            except Exception as e:
+                logger.error(f"Pool {self.nome}: erro ao processar item: {e}")
+                with self._lock:
+                    self.erros += 1
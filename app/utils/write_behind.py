@@ -0,0 +1,138 @@
+"""
+Buffer write-behind genérico: acumula registros e grava em lote.
+
+O lote é gravado pela thread de fundo a cada `intervalo_ms` ou assim que
+atinge `max_itens` (adicionar() só acorda a thread: quem adiciona, inclusive
+código rodando em event loop, nunca grava), ou quando flush()/fechar() são
+chamados explicitamente (fim de job, shutdown). Uma gravação que falha devolve os itens ao início do buffer para
+a próxima tentativa; flush(levantar_erro=True) também levanta ErroWriteBehind,
+para o chamador saber que os itens ainda não estão gravados.
+
+Uso:
+    buffer = BufferWriteBehind("envios", gravar_lote, max_itens=200, intervalo_ms=500)
+    buffer.adicionar(registro)
+    ...
+    buffer.flush(levantar_erro=True)  # fim do job: falha interrompe o job
+"""
+
+import threading
+from typing import Callable, Generic, List, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+# Buffers criados no processo (fechados juntos no shutdown)
+_buffers: List["BufferWriteBehind"] = []
+_buffers_lock = threading.Lock()
+
+
+class ErroWriteBehind(Exception):
+    """O flush não conseguiu gravar os itens (continuam no buffer)."""
+
+
+class BufferWriteBehind(Generic[T]):
+    """Acumula itens e chama `gravar_lote(itens)` por tamanho, por tempo ou sob demanda."""
+
+    def __init__(
+        self,
+        nome: str,
+        gravar_lote: Callable[[List[T]], None],
+        max_itens: int = 200,
+        intervalo_ms: int = 500,
+    ):
+        self.nome = nome
+        self._gravar_lote = gravar_lote
+        self.max_itens = max(max_itens, 1)
+        self.intervalo = max(intervalo_ms, 1) / 1000
+        self._itens: List[T] = []
+        self._lock = threading.Lock()  # protege _itens
+        self._flush_lock = threading.Lock()  # serializa gravações
+        self._parar = threading.Event()
+        self._acordar = threading.Event()  # buffer cheio ou fechamento: grava sem esperar o intervalo
+        self._thread = None
+        self.total_gravados = 0
+        self.total_lotes = 0
+        with _buffers_lock:
+            _buffers.append(self)
+
+    def _garantir_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._parar.clear()
+            self._thread = threading.Thread(
+                target=self._loop, name=f"write-behind-{self.nome}", daemon=True
+            )
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._parar.is_set():
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            if self._parar.is_set():
+                break
+            if self._itens:
+                self.flush()
+
+    def adicionar(self, item: T) -> None:
+        """Enfileira um item; ao atingir max_itens acorda a thread de fundo para gravar o lote."""
+        with self._lock:
+            self._itens.append(item)
+            cheio = len(self._itens) >= self.max_itens
+            self._garantir_thread()
+        if cheio:
+            self._acordar.set()
+
+    def flush(self, levantar_erro: bool = False) -> int:
+        """
+        Grava tudo o que está no buffer. Retorna quantos itens foram gravados.
+
+        Com levantar_erro=True, uma falha levanta ErroWriteBehind (os itens voltam
+        ao buffer do mesmo jeito); senão só é logada e o retorno é 0.
+        """
+        with self._flush_lock:
+            with self._lock:
+                itens, self._itens = self._itens, []
+            if not itens:
+                return 0
+            try:
+                self._gravar_lote(itens)
+            except Exception as e:
+                logger.error(
+                    f"Write-behind {self.nome}: erro ao gravar lote de {len(itens)} itens "
+                    f"(mantidos para nova tentativa): {e}"
+                )
+                with self._lock:
+                    self._itens[:0] = itens
+                if levantar_erro:
+                    raise ErroWriteBehind(
+                        f"Write-behind {self.nome}: {len(itens)} itens não gravados: {e}"
+                    ) from e
+                return 0
+            self.total_gravados += len(itens)
+            self.total_lotes += 1
+            logger.debug(f"Write-behind {self.nome}: lote de {len(itens)} itens gravado")
+            return len(itens)
+
+    def fechar(self) -> None:
+        """Para a thread de fundo e grava o que restou."""
+        self._parar.set()
+        self._acordar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.intervalo * 2 + 1)
+            self._thread = None
+        self.flush()
+
+    def pendentes(self) -> int:
+        with self._lock:
+            return len(self._itens)
+
+
+def fechar_buffers_write_behind() -> None:
+    """Fecha (com flush final) todos os buffers do processo. Chamar no shutdown."""
+    with _buffers_lock:
+        buffers = list(_buffers)
+    for buffer in buffers:
+        try:
+            buffer.fechar()
+        except Exception as e:
+            logger.error(f"Write-behind {buffer.nome}: erro ao fechar: {e}")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark da normalização de telefones (app/utils/telefone.py).
+
+Compara, para N números distintos em formatos variados:
+- referência: normalização caractere a caractere (implementação anterior);
+- normalizar_telefone / telefone_para_envio chamados um a um (cache LRU frio);
+- normalizar_telefones / telefones_para_envio (lote, bytes.translate).
+
+Uso:
+    python scripts/benchmark_telefone.py [--n 100000] [--repeticoes 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+from typing import List, Optional
+
+# Adiciona o diretório raiz ao path (sobe um nível da pasta scripts)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.telefone import (  # noqa: E402
+    _normalizar,
+    _telefone_para_envio,
+    normalizar_telefone,
+    normalizar_telefones,
+    telefone_para_envio,
+    telefones_para_envio,
+)
+
+_FORMATOS = (
+    "({ddd}) 9{a}-{b}",
+    "+55 {ddd} 9{a}-{b}",
+    "55{ddd}9{a}{b}",
+    "{ddd} 9{a} {b}",
+    " {ddd}.9{a}.{b} ",
+)
+
+
+def _referencia_normalizar(telefone: Optional[str]) -> str:
+    if not telefone:
+        return ""
+    return "".join(c for c in str(telefone).strip() if c.isdigit())
+
+
+def _referencia_para_envio(nr_telefone, nr_ddi=None, ddi_padrao="55") -> str:
+    tel = _referencia_normalizar(nr_telefone)
+    if not tel:
+        return ""
+    ddi = (nr_ddi or "").strip() or ddi_padrao
+    ddi_digitos = "".join(c for c in ddi if c.isdigit()) or ddi_padrao
+    if ddi_digitos and tel.startswith(ddi_digitos):
+        return tel
+    if ddi_digitos:
+        return f"{ddi_digitos}{tel}"
+    return tel
+
+
+def gerar_telefones(n: int) -> List[str]:
+    rnd = random.Random(42)
+    telefones = set()
+    while len(telefones) < n:
+        telefones.add(
+            rnd.choice(_FORMATOS).format(
+                ddd=rnd.randint(11, 99), a=rnd.randint(1000, 9999), b=rnd.randint(1000, 9999)
+            )
+        )
+    return list(telefones)
+
+
+def _medir(func, repeticoes: int) -> float:
+    """Menor tempo (segundos) entre as repetições; o cache LRU é limpo antes de cada uma."""
+
+    def _rodada():
+        _normalizar.cache_clear()
+        _telefone_para_envio.cache_clear()
+        func()
+
+    return min(timeit.repeat(_rodada, number=1, repeat=repeticoes))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--n", type=int, default=100_000, help="Quantidade de telefones")
+    parser.add_argument("--repeticoes", type=int, default=5, help="Repetições (vale a menor)")
+    args = parser.parse_args()
+
+    telefones = gerar_telefones(args.n)
+    ddis = [random.Random(i).choice((None, "55", " 55 ", "")) for i in range(args.n)]
+
+    # Os caminhos novos devem dar o mesmo resultado da referência
+    esperado = [_referencia_normalizar(t) for t in telefones]
+    assert normalizar_telefones(telefones) == esperado
+    assert [normalizar_telefone(t) for t in telefones] == esperado
+    esperado_envio = [_referencia_para_envio(t, d) for t, d in zip(telefones, ddis)]
+    assert telefones_para_envio(telefones, ddis) == esperado_envio
+    assert [telefone_para_envio(t, d) for t, d in zip(telefones, ddis)] == esperado_envio
+
+    casos = [
+        ("normalizar", [
+            ("referência (caractere a caractere)", lambda: [_referencia_normalizar(t) for t in telefones]),
+            ("normalizar_telefone (um a um)", lambda: [normalizar_telefone(t) for t in telefones]),
+            ("normalizar_telefones (lote)", lambda: normalizar_telefones(telefones)),
+        ]),
+        ("para envio (DDI)", [
+            ("referência (caractere a caractere)", lambda: [_referencia_para_envio(t, d) for t, d in zip(telefones, ddis)]),
+            ("telefone_para_envio (um a um)", lambda: [telefone_para_envio(t, d) for t, d in zip(telefones, ddis)]),
+            ("telefones_para_envio (lote)", lambda: telefones_para_envio(telefones, ddis)),
+        ]),
+    ]
+
+    print(f"{args.n} telefones distintos, menor tempo de {args.repeticoes} repetições")
+    for titulo, medicoes in casos:
+        print(f"\n{titulo}:")
+        referencia = None
+        for nome, func in medicoes:
+            tempo = _medir(func, args.repeticoes)
+            referencia = referencia or tempo
+            print(f"  {nome:<38} {tempo * 1000:9.1f} ms  {referencia / tempo:6.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())